@@ -42,6 +42,7 @@ For help, type::
 
 from itertools import imap
 import sys
+import time
 
 from ClusterShell.MsgTree import MsgTree, MODE_DEFER, MODE_TRACE
 from ClusterShell.NodeSet import STD_GROUP_RESOLVER
@@ -94,6 +95,27 @@ def display(tree, disp, gather, trace_mode):
     finally:
         out.flush()
 
+def display_completed(tree, keys, disp, gather):
+    """display and remove from MsgTree `tree' the messages of completed
+    `keys' (clubak --stream)"""
+    out = sys.stdout
+    try:
+        evicted = tree.evict(keys)
+        if gather:
+            for nodeset, msg in sorted([(NodeSet.fromlist(ekeys), msg) \
+                                        for msg, ekeys in evicted],
+                                       cmp=nodeset_cmp,
+                                       key=lambda x: x[0]):
+                disp.print_gather(nodeset, msg)
+        else:
+            msgs = {}
+            for msg, ekeys in evicted:
+                msgs.update(dict.fromkeys(ekeys, msg))
+            for node in NodeSet.fromlist(msgs.keys()):
+                disp.print_gather(node, msgs[str(node)])
+    finally:
+        out.flush()
+
 def clubak():
     """script subroutine"""
 
@@ -116,15 +138,42 @@ def clubak():
             parser.error("incompatible tree options")
         preload_msgs = {}
 
+    disp = Display(options)
+    gather = options.gather or disp.regroup
+
+    # Streaming mode: input is expected to be grouped by node, so that a
+    # node is completed as soon as a line from another node is read
+    stream = options.stream_interval
+    if stream is not None:
+        if tree_mode != MODE_DEFER or fast_mode:
+            parser.error("incompatible tree options")
+        lastnode = None
+        completed = []
+        deadline = time.time() + stream
+        # avoid file iterator read-ahead buffering
+        lines = iter(sys.stdin.readline, '')
+    else:
+        lines = sys.stdin
+
     # Feed the tree from standard input lines
-    for line in sys.stdin:
+    for line in lines:
         try:
             linestripped = line.rstrip('\r\n')
             node, content = linestripped.split(options.separator, 1)
             node = node.strip()
             if not node:
                 raise ValueError("no node found")
-            if fast_mode:
+            if stream is not None:
+                if node != lastnode:
+                    if lastnode is not None:
+                        completed.append(lastnode)
+                    lastnode = node
+                    if completed and time.time() >= deadline:
+                        display_completed(tree, completed, disp, gather)
+                        completed = []
+                        deadline = time.time() + stream
+                tree.add(node, content)
+            elif fast_mode:
                 preload_msgs.setdefault(node, []).append(content)
             else:
                 tree.add(node, content)
@@ -143,8 +192,7 @@ def clubak():
             (bool(options.line_mode), bool(options.gather), tree._depth())
 
     # Display results
-    disp = Display(options)
-    display(tree, disp, options.gather or disp.regroup, options.trace_mode)
+    display(tree, disp, gather, options.trace_mode)
 
 def main():
     """main script function"""
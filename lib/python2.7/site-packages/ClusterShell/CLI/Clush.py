@@ -234,6 +234,58 @@ class GatherOutputHandler(OutputHandler):
             self._display.vprint_err(verbexit, "clush: %s: command timeout" % \
                 NodeSet.fromlist(worker.iter_keys_timeout()))
 
+class StreamGatherOutputHandler(GatherOutputHandler):
+    """Streamed gathered output event handler class: gathered output of
+    completed nodes is periodically displayed and removed from the task
+    buffers, so that memory usage stays bounded."""
+
+    def __init__(self, display):
+        GatherOutputHandler.__init__(self, display)
+        self._streamtimer = None
+        self._worker = None
+        self._completed = {}
+
+    def streamtimer_init(self, task, interval):
+        """Init timer for periodic display of completed nodes."""
+        self._streamtimer = task.timer(interval, self, interval=interval,
+                                       autoclose=True)
+
+    def ev_hup(self, worker):
+        self._worker = worker
+        self._completed.setdefault(worker.current_rc,
+                                   []).append(worker.current_node)
+
+    def ev_timer(self, timer):
+        if self._worker is not None and self._completed:
+            self._flush_completed(self._worker)
+
+    def _flush_completed(self, worker):
+        """Display and forget gathered output of completed nodes."""
+        completed = self._completed
+        self._completed = {}
+        nodesetify = lambda v: (v[0], NodeSet.fromlist(v[1]))
+        cleaned = False
+        for rc in sorted(completed):
+            nodes = completed[rc]
+            for buf, nodeset in sorted(map(nodesetify,
+                                           worker.pop_buffers(nodes)),
+                                       cmp=bufnodeset_cmp):
+                if not cleaned:
+                    self._runtimer_clean()
+                    cleaned = True
+                self._display.print_gather(nodeset, buf)
+            if worker.task.default("stderr_msgtree"):
+                # errors are already displayed as they come
+                worker.pop_errors(nodes)
+        if cleaned:
+            self._runtimer_set_dirty()
+
+    def ev_close(self, worker):
+        if self._streamtimer:
+            self._streamtimer.invalidate()
+        # remaining output is displayed gathered by rc as usual
+        GatherOutputHandler.ev_close(self, worker)
+
 class LiveGatherOutputHandler(GatherOutputHandler):
     """Live line-gathered output event handler class."""
 
@@ -531,6 +583,9 @@ def run_command(task, cmd, ns, timeout, display):
     if (display.gather or display.line_mode) and ns is not None:
         if display.gather and display.line_mode:
             handler = LiveGatherOutputHandler(display, ns)
+        elif display.gather and display.stream_interval:
+            handler = StreamGatherOutputHandler(display)
+            handler.streamtimer_init(task, display.stream_interval)
         else:
             handler = GatherOutputHandler(display)
 
@@ -73,6 +73,8 @@ class Display(object):
         self.noprefix = options.groupbase
         # display may change when 'max return code' option is set
         self.maxrc = getattr(options, 'maxrc', False)
+        # gathered output of completed nodes may be streamed periodically
+        self.stream_interval = getattr(options, 'stream_interval', None)
 
         if color is None:
             # Should we use ANSI colors?
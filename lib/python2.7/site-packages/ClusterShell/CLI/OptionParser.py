@@ -139,6 +139,10 @@ class OptionParser(optparse.OptionParser):
         optgrp.add_option("-r", "--regroup", action="store_true",
                           dest="regroup", default=False,
                           help="fold nodeset using node groups")
+        optgrp.add_option("--stream", action="store", type="float",
+                          dest="stream_interval", metavar="SECONDS",
+                          help="with -b/-B, display gathered output of " \
+                               "completed nodes every SECONDS")
 
         if separator_option:
             optgrp.add_option("-S", "--separator", action="store",
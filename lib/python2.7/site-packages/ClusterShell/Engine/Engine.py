@@ -42,6 +42,8 @@ in response to incoming events (from workers, timers, etc.).
 import copy
 import errno
 import heapq
+import os
+import resource
 import time
 
 
@@ -334,6 +336,207 @@ class _EngineTimerQ:
         self.armed_count = 0
 
 
+class EngineScheduler:
+    """
+    Engine clients scheduler, in charge of the effective fanout.
+
+    By default, the effective fanout is the task "fanout" info value.
+    When the "fanout_adaptive" info is set, the effective fanout starts
+    at "fanout_min" and grows by one each time a started client responds
+    without any sign of pressure (slow start, like TCP congestion
+    control), up to "fanout". It is halved, not below "fanout_min", when
+    the observed response latency (time between client start and its
+    first event, typically the ssh connection time) degrades, when the
+    load average per CPU exceeds 1, or when registered file descriptors
+    reach 80% of the process limit.
+
+    The "fanout_groups" info may be set to a dict of nodeset strings
+    (eg. "@rack1" or "node[1-40]") to max number of concurrent clients
+    for these nodes. Clients whose key is in a full group are deferred
+    until a slot of this group is released, without blocking others.
+
+    Counters are available as attributes: started, completed, deferred
+    (by group limits), increased and decreased (adaptive fanout changes),
+    max_fanout (highest effective fanout reached) and latency (moving
+    average of response latency in seconds).
+    """
+    # moving average weights of response latency (short and long term)
+    LATENCY_ALPHA = 0.25
+    BASELINE_ALPHA = 0.02
+    # latency degradation factor considered as pressure
+    LATENCY_FACTOR = 2.0
+    # min delay between two load average samples
+    LOADAVG_DELAY = 1.0
+    # fraction of RLIMIT_NOFILE considered as pressure
+    FD_PRESSURE = 0.8
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.info = engine.info
+        self.fanout = None
+        # per client (start time, groups list) for registered clients
+        self._running = {}
+        self._group_limits = None
+        self._groups_src = None
+        self._key_groups = {}
+        self._group_count = {}
+        self._group_deferred = {}
+        self._baseline = None
+        self._loadavg = 0.0
+        self._loadavg_time = 0.0
+        self._last_decrease = 0.0
+        try:
+            self._ncpus = os.sysconf("SC_NPROCESSORS_ONLN")
+        except (AttributeError, ValueError, OSError):
+            self._ncpus = 1
+        self._fdmax = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Reset scheduler counters."""
+        self.started = 0
+        self.completed = 0
+        self.deferred = 0
+        self.increased = 0
+        self.decreased = 0
+        self.max_fanout = 0
+        self.latency = None
+
+    def limit(self):
+        """Return the current effective fanout."""
+        fanout = self.info["fanout"]
+        if not self.info.get("fanout_adaptive"):
+            return fanout
+        fanout_min = min(self.info.get("fanout_min", 1), fanout)
+        if self.fanout is None:
+            self.fanout = fanout_min
+        else:
+            self.fanout = max(fanout_min, min(self.fanout, fanout))
+        return self.fanout
+
+    def _groups(self, client):
+        """Get list of limited groups of a client."""
+        groups_src = self.info.get("fanout_groups")
+        if not groups_src:
+            return ()
+        if groups_src is not self._groups_src:
+            # (re)build groups from task info
+            from ClusterShell.NodeSet import NodeSet
+            self._groups_src = groups_src
+            self._group_limits = [(name, NodeSet(name), limit) \
+                                  for name, limit in groups_src.iteritems()]
+            self._key_groups.clear()
+        key = getattr(client, "key", None)
+        if key is None:
+            return ()
+        try:
+            return self._key_groups[key]
+        except KeyError:
+            groups = self._key_groups[key] = \
+                [name for name, nodes, limit in self._group_limits \
+                    if key in nodes]
+            return groups
+
+    def admit(self, client):
+        """
+        Check group limits before starting a client. Return False if
+        the client has been deferred.
+        """
+        groups = self._groups(client)
+        for name, nodes, limit in self._group_limits or ():
+            if name in groups and self._group_count.get(name, 0) >= limit:
+                self._group_deferred.setdefault(name, []).append(client)
+                self.deferred += 1
+                return False
+        return True
+
+    def client_started(self, client):
+        """Client has been registered."""
+        groups = self._groups(client)
+        for name in groups:
+            self._group_count[name] = self._group_count.get(name, 0) + 1
+        self._running[client] = [time.time(), groups]
+        self.started += 1
+        self.max_fanout = max(self.max_fanout, self._engine.reg_clients)
+
+    def client_responded(self, client):
+        """First event received from a registered client."""
+        running = self._running.get(client)
+        if running is not None and running[0] is not None:
+            self._sample(running)
+
+    def _sample(self, running):
+        """Update response latency of a running client and adapt."""
+        now = time.time()
+        delay = now - running[0]
+        running[0] = None
+        if self.latency is None:
+            self.latency = self._baseline = delay
+        else:
+            self.latency += self.LATENCY_ALPHA * (delay - self.latency)
+            self._baseline += self.BASELINE_ALPHA * (delay - self._baseline)
+        if self.fanout is not None and self.info.get("fanout_adaptive"):
+            self._adapt(now)
+
+    def _pressure(self, now):
+        """Return True if any sign of pressure has been observed."""
+        if self.latency > self.LATENCY_FACTOR * self._baseline and \
+                self.latency > 1e-2:
+            return True
+        if len(self._engine.reg_clifds) >= self.FD_PRESSURE * self._fdmax:
+            return True
+        if now - self._loadavg_time >= self.LOADAVG_DELAY:
+            self._loadavg_time = now
+            try:
+                self._loadavg = os.getloadavg()[0]
+            except OSError:
+                self._loadavg = 0.0
+        return self._loadavg > self._ncpus
+
+    def _adapt(self, now):
+        """Grow or shrink the effective fanout."""
+        fanout = self.info["fanout"]
+        fanout_min = min(self.info.get("fanout_min", 1), fanout)
+        if self._pressure(now):
+            # decrease at most once per observed latency period
+            if self.fanout > fanout_min and \
+                    now - self._last_decrease >= self.latency:
+                self.fanout = max(fanout_min, self.fanout // 2)
+                self._last_decrease = now
+                self.decreased += 1
+        elif self.fanout < fanout and \
+                self._engine.reg_clients >= self.fanout:
+            self.fanout += 1
+            self.increased += 1
+            self._engine.start_all()
+
+    def client_finished(self, client):
+        """
+        Client has been unregistered. Return the list of deferred
+        clients that may be started again.
+        """
+        running = self._running.pop(client, None)
+        if running is None:
+            return []
+        if running[0] is not None:
+            # closed before any other event
+            self._sample(running)
+        self.completed += 1
+        requeue = []
+        for name in running[1]:
+            self._group_count[name] -= 1
+            deferred = self._group_deferred.get(name)
+            if deferred:
+                requeue.append(deferred.pop(0))
+        return requeue
+
+    def clear(self):
+        """Forget running and deferred clients."""
+        self._running.clear()
+        self._group_count.clear()
+        self._group_deferred.clear()
+
+
 class Engine:
     """
     Interface for ClusterShell engine. Subclasses have to implement a runloop
@@ -393,6 +596,9 @@ class Engine:
         # runloop-has-exited flag
         self._exited = False
 
+        # clients scheduler (effective fanout)
+        self.scheduler = EngineScheduler(self)
+
     def clients(self):
         """
         Get a copy of clients set.
@@ -441,8 +647,10 @@ class Engine:
             if not client.delayable:
                 self.register(client)
                 return
-            elif self.info["fanout"] > self.reg_clients:
-                self.register(client._start())
+            elif self.scheduler.limit() > self.reg_clients:
+                if self.scheduler.admit(client):
+                    self.register(client._start())
+                # else deferred by scheduler
                 return
 
         if client.delayable:
@@ -485,6 +693,8 @@ class Engine:
                 client = clients.pop()
                 self._remove(client, True, did_timeout, force=True)
 
+        self.scheduler.clear()
+
     def register(self, client):
         """
         Register an engine client. Subclasses that override this method
@@ -507,6 +717,7 @@ class Engine:
 
         if client.delayable:
             self.reg_clients += 1
+            self.scheduler.client_started(client)
 
         if client.autoclose:
             refcnt_inc = 0
@@ -594,6 +805,8 @@ class Engine:
         client.registered = False
         if client.delayable:
             self.reg_clients -= 1
+            # deferred clients may be started again
+            self._pending_clients[0:0] = self.scheduler.client_finished(client)
 
     def modify(self, client, setmask, clearmask):
         """
@@ -604,7 +817,11 @@ class Engine:
         client._new_events &= ~clearmask
         client._new_events |= setmask
 
-        if self._current_client is not client:
+        if self._current_client is client:
+            if clearmask & (Engine.E_READ | Engine.E_ERROR):
+                # processing a read event of this client
+                self.scheduler.client_responded(client)
+        else:
             # modifying a non processing client, apply new_events now
             self.set_events(client, client._new_events)
 
@@ -719,8 +936,8 @@ class Engine:
         """
         Start and register all other possible clients, in respect of task fanout.
         """
-        # Get current fanout value
-        fanout = self.info["fanout"]
+        # Get current effective fanout value
+        fanout = self.scheduler.limit()
         assert fanout > 0
 
         # Register regular engine clients within the fanout limit
@@ -729,7 +946,8 @@ class Engine:
             self._debug("START CLIENT %s" % client.__class__.__name__)
             # Check if pending client has not been removed since add()
             if client in self._clients or client in self._ports:
-                self.register(client._start())
+                if self.scheduler.admit(client):
+                    self.register(client._start())
     
     def run(self, timeout):
         """
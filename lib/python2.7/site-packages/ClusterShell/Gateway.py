@@ -0,0 +1,190 @@
+#
+# Copyright CEA/DAM/DIF (2011)
+#  Contributor: Stephane THIELL <stephane.thiell@cea.fr>
+#
+# This file is part of the ClusterShell library.
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+
+"""
+ClusterShell gateway agent (tree mode)
+
+A gateway agent is started by WorkerTree on a gateway node, usually
+through ssh with "python -m ClusterShell.Gateway". It reads a command
+request on its standard input, runs the command on the target nodes
+it is in charge of with a local task (and thus its own fanout), and
+streams pre-gathered results back on its standard output, as records
+of identical messages with associated nodesets, return codes and
+timeouts.
+
+Each line sent upstream is a base64 encoded, zlib compressed JSON
+list of records, one line being emitted every "tree_flush_interval"
+seconds while nodes complete, and at the end of the command:
+  - ["o", message, nodeset]: standard output of nodes
+  - ["e", message, nodeset]: standard error of nodes
+  - ["r", rc, nodeset]: return code of nodes
+  - ["t", nodeset]: nodes that timed out
+  - ["x", error]: gateway failure
+"""
+
+import base64
+import sys
+import zlib
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from ClusterShell.Event import EventHandler
+from ClusterShell.NodeSet import NodeSet
+
+
+# Task info keys forwarded to gateways
+GATEWAY_INFO_KEYS = ("fanout", "connect_timeout", "command_timeout",
+                     "ssh_user", "ssh_path", "ssh_options",
+                     "ssh_multiplex", "tree_flush_interval")
+
+def _unicode(value):
+    """Make byte strings JSON safe (latin-1 is a lossless mapping)."""
+    if type(value) is str:
+        return value.decode('latin-1')
+    return value
+
+def _bytes(value):
+    """Restore byte strings encoded by _unicode()."""
+    if type(value) is unicode:
+        return value.encode('latin-1')
+    return value
+
+def encode_request(command, nodes, timeout, stderr, info):
+    """Encode a gateway command request as a single line."""
+    return json.dumps({"command": _unicode(command),
+                       "nodes": str(nodes),
+                       "timeout": timeout,
+                       "stderr": stderr,
+                       "info": dict((key, _unicode(value)) \
+                                    for key, value in info.iteritems())})
+
+def decode_request(line):
+    """Decode a gateway command request line."""
+    request = json.loads(line)
+    request["command"] = _bytes(request["command"])
+    request["nodes"] = str(request["nodes"])
+    request["info"] = dict((str(key), _bytes(value)) \
+                           for key, value in request["info"].iteritems())
+    return request
+
+def encode_record(records):
+    """Encode a list of records as a single line."""
+    records = [[_unicode(item) for item in record] for record in records]
+    return base64.b64encode(zlib.compress(json.dumps(records)))
+
+def decode_record(line):
+    """Decode a line of records, restoring byte strings. Raises ValueError
+    if the line is not a records line."""
+    try:
+        data = zlib.decompress(base64.b64decode(line))
+    except (TypeError, zlib.error), exc:
+        raise ValueError("invalid records line: %s" % exc)
+    records = json.loads(data)
+    return [[_bytes(item) for item in record] for record in records]
+
+
+class GatewayHandler(EventHandler):
+    """Gateway command event handler, streaming results upstream."""
+
+    def __init__(self, out, stderr):
+        EventHandler.__init__(self)
+        self.out = out
+        self.stderr = stderr
+        self.worker = None
+        self._completed = []
+
+    def ev_hup(self, worker):
+        self.worker = worker
+        self._completed.append(worker.current_node)
+
+    def ev_timer(self, timer):
+        if self.worker is not None and self._completed:
+            self.flush(self.worker, self._completed)
+            self._completed = []
+
+    def flush(self, worker, nodes):
+        """Send gathered results of completed nodes upstream."""
+        records = [["o", str(msg), str(nodeset)] \
+                   for msg, nodeset in worker.pop_buffers(nodes)]
+        if self.stderr:
+            records += [["e", str(msg), str(nodeset)] \
+                        for msg, nodeset in worker.pop_errors(nodes)]
+        for rc, nodeset in worker.iter_retcodes(nodes):
+            if len(nodeset):
+                records.append(["r", rc, str(nodeset)])
+        self.send(records)
+
+    def send(self, records):
+        """Write records line."""
+        if records:
+            self.out.write(encode_record(records) + '\n')
+            self.out.flush()
+
+    def ev_close(self, worker):
+        # flush remaining nodes, including output of timed out nodes
+        timedout = list(worker.iter_keys_timeout())
+        self.flush(worker, self._completed + timedout)
+        self._completed = []
+        if timedout:
+            self.send([["t", str(NodeSet.fromlist(timedout))]])
+
+
+def gateway_main(stdin=sys.stdin, stdout=sys.stdout):
+    """Gateway agent main function: serve one command request."""
+    # imported here as Task depends on this module through WorkerTree
+    from ClusterShell.Task import task_self
+    try:
+        request = decode_request(stdin.readline())
+        task = task_self()
+        for key, value in request["info"].iteritems():
+            task.set_info(key, value)
+        stderr = request["stderr"]
+        handler = GatewayHandler(stdout, stderr)
+        task.shell(request["command"], nodes=request["nodes"],
+                   handler=handler, stderr=stderr, timeout=request["timeout"],
+                   tree=False)
+        interval = task.info("tree_flush_interval", 0.5)
+        task.timer(interval, handler, interval=interval, autoclose=True)
+        task.resume()
+    except Exception, exc:
+        stdout.write(encode_record([["x", str(exc)]]) + '\n')
+        stdout.flush()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(gateway_main())
@@ -57,22 +57,35 @@ class MsgTreeElem(object):
     message. Object of this class are returned by the various MsgTree
     methods like messages() or walk(). The object can then be used as
     an iterator over the message lines or casted into a string.
+
+    As there is one element per message line and per different message,
+    elements are kept small: no instance dict, children are None, a
+    single MsgTreeElem or a dict of msgline -> MsgTreeElem, and message
+    lines are interned so that identical lines found in different
+    branches share the same string.
     """
-    def __init__(self, msgline=None, parent=None, trace=False):
+    __slots__ = ('parent', 'children', 'msgline', 'keys')
+
+    def __init__(self, msgline=None, parent=None):
         """
         Initialize message tree element.
         """
         # structure
         self.parent = parent
-        self.children = {}
-        if trace:  # special behavior for trace mode
-            self._shift = self._shift_trace
-        else:
-            self._shift = self._shift_notrace
+        self.children = None
         # content
         self.msgline = msgline
         self.keys = None
-   
+
+    def _children(self):
+        """Get the list of children elements."""
+        children = self.children
+        if children is None:
+            return []
+        if type(children) is dict:
+            return children.values()
+        return [children]
+
     def __len__(self):
         """Length of whole message string."""
         return len(str(self))
@@ -88,7 +101,7 @@ class MsgTreeElem(object):
         else:
             self.keys.add(key)
 
-    def _shift_notrace(self, key, target_elem):
+    def _shift(self, key, target_elem):
         """Shift one of our key to specified target element."""
         if self.keys and len(self.keys) == 1:
             shifting = self.keys
@@ -105,15 +118,6 @@ class MsgTreeElem(object):
 
         return target_elem
 
-    def _shift_trace(self, key, target_elem):
-        """Shift one of our key to specified target element (trace
-        mode: keep backtrace of keys)."""
-        if not target_elem.keys:
-            target_elem.keys = set([ key ])
-        else:
-            target_elem.keys.add(key)
-        return target_elem
-
     def __getitem__(self, i):
         return list(self.lines())[i]
 
@@ -155,15 +159,63 @@ class MsgTreeElem(object):
         optional associated source key. Called by MsgTree.add().
         Return corresponding MsgTreeElem (possibly newly created).
         """
+        # get/create child element
+        children = self.children
+        if children is None:
+            elem = self.children = self._new_child(msgline)
+        elif type(children) is dict:
+            elem = children.get(msgline)
+            if elem is None:
+                elem = children[msgline] = self._new_child(msgline)
+        elif children.msgline == msgline:
+            elem = children
+        else:
+            # second child: switch to a dict of children
+            elem = self._new_child(msgline)
+            self.children = { children.msgline: children, msgline: elem }
+
         if key is None:
             # No key association, MsgTree is in MODE_DEFER
-            return self.children.setdefault(msgline, \
-                self.__class__(msgline, self, self._shift == self._shift_trace))
+            return elem
+        else:
+            # key given: shift down the key
+            return self._shift(key, elem)
+
+    def _remove_child(self, elem):
+        """Detach the given child element. Return False if elem was not
+        a child of this element (ie. already detached)."""
+        children = self.children
+        if children is elem:
+            self.children = None
+        elif type(children) is dict and children.get(elem.msgline) is elem:
+            del children[elem.msgline]
+            if len(children) == 1:
+                self.children = children.values()[0]
         else:
-            # key given: get/create new child element and shift down the key
-            return self._shift(key, self.children.setdefault(msgline, \
-                self.__class__(msgline, self,
-                               self._shift == self._shift_trace)))
+            return False
+        return True
+
+    def _new_child(self, msgline):
+        """Create a new child element with interned message line."""
+        if type(msgline) is str:
+            msgline = intern(msgline)
+        return self.__class__(msgline, self)
+
+
+class MsgTreeTraceElem(MsgTreeElem):
+    """
+    MsgTreeElem used in MODE_TRACE, which keeps the backtrace of keys.
+    """
+    __slots__ = ()
+
+    def _shift(self, key, target_elem):
+        """Shift one of our key to specified target element (trace
+        mode: keep backtrace of keys)."""
+        if not target_elem.keys:
+            target_elem.keys = set([ key ])
+        else:
+            target_elem.keys.add(key)
+        return target_elem
 
 
 class MsgTree(object):
@@ -194,15 +246,21 @@ class MsgTree(object):
         """
         self.mode = mode
         # root element of MsgTree
-        self._root = MsgTreeElem(trace=(mode == MODE_TRACE))
+        self._root = self._new_root()
         # dict of keys to MsgTreeElem
         self._keys = {}
 
     def clear(self):
         """Remove all items from the MsgTree."""
-        self._root = MsgTreeElem(trace=(self.mode == MODE_TRACE))
+        self._root = self._new_root()
         self._keys.clear()
 
+    def _new_root(self):
+        """Create root element according to MsgTree mode."""
+        if self.mode == MODE_TRACE:
+            return MsgTreeTraceElem()
+        return MsgTreeElem()
+
     def __len__(self):
         """Return the number of keys contained in the MsgTree."""
         return len(self._keys)
@@ -271,8 +329,7 @@ class MsgTree(object):
 
         while estack:
             elem, edepth = estack.pop()
-            if len(elem.children) > 0:
-                estack += [(v, edepth + 1) for v in elem.children.values()]
+            estack += [(v, edepth + 1) for v in elem._children()]
             depth = max(depth, edepth)
         
         return depth
@@ -290,9 +347,7 @@ class MsgTree(object):
         estack = [ self._root ]
         while estack:
             elem = estack.pop()
-            children = elem.children
-            if len(children) > 0:
-                estack += children.values()
+            estack += elem._children()
             if elem.keys: # has some keys
                 mkeys = filter(match, elem.keys)
                 if len(mkeys):
@@ -312,33 +367,83 @@ class MsgTree(object):
         estack = [ (self._root, 0) ]
         while estack:
             elem, edepth = estack.pop()
-            children = elem.children
+            children = elem._children()
             nchildren = len(children)
             if nchildren > 0:
-                estack += [(v, edepth + 1) for v in children.values()]
+                estack += [(v, edepth + 1) for v in children]
             if elem.keys:
                 mkeys = filter(match, elem.keys)
                 if len(mkeys):
                     yield elem.msgline, map(mapper, mkeys), edepth, nchildren
 
+    def _prune(self, elem, referenced):
+        """Detach unreferenced branch ending at elem from the tree."""
+        while elem.parent is not None and elem.children is None and \
+                not elem.keys and id(elem) not in referenced:
+            if not elem.parent._remove_child(elem):
+                break
+            elem = elem.parent
+
     def remove(self, match=None):
         """
         Modify the tree by removing any matching key references from the
-        messages tree.
+        messages tree. Message lines that are no longer referenced by any
+        key are dropped.
 
         Example of use:
             >>> msgtree.remove(lambda k: k > 3)
         """
         estack = [ self._root ]
+        elems = []
 
         # walk the tree to keep only matching keys
         while estack:
             elem = estack.pop()
-            if len(elem.children) > 0:
-                estack += elem.children.values()
+            elems.append(elem)
+            estack += elem._children()
             if elem.keys: # has some keys
                 elem.keys = set(ifilterfalse(match, elem.keys))
 
         # also remove key(s) from known keys dict
         for key in filter(match, self._keys.keys()):
             del self._keys[key]
+
+        # prune unreferenced branches, children first
+        referenced = set(imap(id, self._keys.itervalues()))
+        for elem in reversed(elems):
+            self._prune(elem, referenced)
+
+    def evict(self, keys, mapper=None):
+        """
+        Remove the given keys from the tree, dropping message lines no
+        longer referenced, and return a list of (message, keys) tuples
+        for the removed keys, gathered by message like walk() does.
+        Unknown keys are ignored. Pruning needs one pass over the
+        remaining keys to find the elements they still reference, so
+        evict keys in batches rather than one at a time.
+        """
+        gathered = {}
+        for key in keys:
+            elem = self._keys.pop(key, None)
+            if elem is not None:
+                if id(elem) in gathered:
+                    gathered[id(elem)][1].append(key)
+                else:
+                    gathered[id(elem)] = (elem, [key])
+        if not gathered:
+            return []
+
+        for elem, ekeys in gathered.itervalues():
+            # drop keys from elements (trace mode or after a walk)
+            parent = elem
+            while parent is not None:
+                if parent.keys:
+                    parent.keys.difference_update(ekeys)
+                parent = parent.parent
+
+        referenced = set(imap(id, self._keys.itervalues()))
+        for elem, ekeys in gathered.itervalues():
+            self._prune(elem, referenced)
+
+        return [(elem, map(mapper, ekeys)) \
+                    for elem, ekeys in gathered.itervalues()]
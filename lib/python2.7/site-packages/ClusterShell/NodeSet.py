@@ -370,10 +370,33 @@ class RangeSet:
         Report whether another rangeset contains this rangeset.
         """
         self._binary_sanity_check(rangeset)
-        for sli, pad in self._ranges:
-            for i in xrange(sli.start, sli.stop, sli.step):
-                if not rangeset._contains_with_padding(i, pad):
-                    return False
+        if self._length > rangeset._length:
+            return False
+        # group our runs by padding length
+        padruns = {}
+        runs = self._runs()
+        for (sli, pad), run in zip(self._ranges, runs):
+            padruns.setdefault(pad, []).append(run)
+        if not runs:
+            return True
+        # only look at rangeset ranges within our bounds
+        start, end = rangeset._window(runs[0][0], runs[-1][1])
+        window = zip(rangeset._ranges[start:end], rangeset._runs(start, end))
+        for pad, runs in padruns.iteritems():
+            # get rangeset runs matching padding (see _contains_with_padding)
+            others = []
+            for (sli, rgpad), run in window:
+                if pad == 0 and rgpad > 1:
+                    # only items long enough are matching
+                    run = self._split_run(run, 10 ** (rgpad - 1))[1]
+                elif pad != rgpad and pad != 0:
+                    run = None
+                if run:
+                    others.append(run)
+            # any item left?
+            for run in self._merge_runs(runs, others,
+                                        lambda in1, in2: in1 and not in2):
+                return False
         return True
 
     def issuperset(self, rangeset):
@@ -520,66 +543,241 @@ class RangeSet:
             yield self[begin:begin + length]
             begin += length
 
-    def _expand(self):
+    def _pad(self):
         """
-        Expand all items. Internal use.
+        Get the padding length of the first padded range, or 0. Internal
+        use.
         """
-        items = []
-        pad = 0
         for rgsli, rgpad in self._ranges:
-            items += xrange(rgsli.start, rgsli.stop, rgsli.step)
-            pad = pad or rgpad
-        return items, pad
+            if rgpad:
+                return rgpad
+        return 0
+
+    def _runs(self, start=0, end=None):
+        """
+        Get ranges (or ranges[start:end]) as a list of (first, last, step)
+        runs, where last is the last item really included in the range.
+        Internal use.
+        """
+        return [(sli.start, sli.stop - 1 - (sli.stop - 1 - sli.start) % sli.step,
+                 sli.step) for sli, pad in self._ranges[start:end]]
+
+    def _window(self, first, last):
+        """
+        Get (start, end) indexes of ranges that may contain items between
+        first and last, using binary searches. Internal use.
+        """
+        ranges = self._ranges
+        low, high = 0, len(ranges)
+        while low < high:
+            mid = (low + high) / 2
+            if ranges[mid][0].stop <= first:
+                low = mid + 1
+            else:
+                high = mid
+        start, high = low, len(ranges)
+        while low < high:
+            mid = (low + high) / 2
+            if ranges[mid][0].start <= last:
+                low = mid + 1
+            else:
+                high = mid
+        return start, low
 
-    def _fold(self, items, pad):
+    def _fold_runs(self, runs, pad):
         """
-        Fold items as ranges and group them by step.
+        Fold sorted runs of items as ranges and group them by step. Runs
+        are (first, last, step) tuples of strictly increasing,
+        non-overlapping items. Runs are never expanded: items are
+        regrouped one by one until the run step is detected, then the
+        rest of the run is consumed at once.
         Return: (ranges, total_length)
         """
-        cnt, k, m, istart, rng = 0, -1, 0, None, []
+        cnt, k, m, istart, rng = 0, None, 0, None, []
+        autostep = self._autostep
 
-        # iterate over items and regroup them using steps
-        for i in items:
-            if i > k:
-                cnt += 1
+        for first, last, step in runs:
+            cnt += (last - first) / step + 1
+            i = first
+            while True:
+                # regroup current item using steps
                 if istart is None:
                     istart = k = i
-                elif m > 0: # check step length (m)
-                    if m != i - k:
-                        if m == 1 or k - istart >= self._autostep * m:
+                    m = 0
+                else:
+                    if m > 0 and m != i - k:
+                        if m == 1 or k - istart >= autostep * m:
                             # add one range with possible autostep
                             rng.append((slice(istart, k + 1, m), pad))
                             istart = k = i
-                        elif k - istart > m:
+                        else:
                             # stepped without autostep
                             # be careful to let the last one "pending"
                             for j in xrange(istart, k, m):
                                 rng.append((slice(j, j + 1, 1), pad))
                             istart = k
-                        else:
-                            rng.append((slice(istart, istart + 1, 1), pad))
-                            istart = k
-                m = i - k
-                k = i
+                    m = i - k
+                    k = i
+                if i == last:
+                    break
+                if m == step:
+                    # remaining items of this run just extend pending range
+                    k = last
+                    break
+                i += step
 
         # finishing
-        if istart is not None: # istart might be 0
+        if istart is not None:
             if m > 0:
-                if m == 1 or k - istart >= self._autostep * m:
+                if m == 1 or k - istart >= autostep * m:
                     # add one range with possible autostep
                     rng.append((slice(istart, k + 1, m), pad))
-                elif k - istart > m:
+                else:
                     # stepped without autostep
                     for j in xrange(istart, k + m, m):
                         rng.append((slice(j, j + 1, 1), pad))
-                else:
-                    rng.append((slice(istart, istart + 1, 1), pad))
-                    rng.append((slice(k, k + 1, 1), pad))
             else:
                 rng.append((slice(istart, istart + 1, 1), pad))
 
         return rng, cnt
 
+    @staticmethod
+    def _split_run(run, index):
+        """
+        Split run into two runs with items lower than index and items
+        greater or equal to index (each may be None). Internal use.
+        """
+        first, last, step = run
+        if index <= first:
+            return None, run
+        if index > last:
+            return run, None
+        head_last = first + ((index - first - 1) / step) * step
+        return (first, head_last, step), (head_last + step, last, step)
+
+    @staticmethod
+    def _pack_runs(items):
+        """
+        Generate runs of constant step from a sorted list of items.
+        Internal use.
+        """
+        idx, nitems = 0, len(items)
+        while idx < nitems:
+            first = items[idx]
+            if idx + 1 == nitems:
+                yield first, first, 1
+                return
+            step = items[idx + 1] - first
+            idx += 1
+            while idx + 1 < nitems and items[idx + 1] - items[idx] == step:
+                idx += 1
+            yield first, items[idx], step
+            idx += 1
+
+    @staticmethod
+    def _window_runs(run1, run2, low, high, keep):
+        """
+        Generate runs for items in [low, high] covered by both run1 and
+        run2 (which both span the whole window). keep is a function that
+        tells whether an item should be kept given its membership in run1
+        and run2. Items are only expanded over one period (the least
+        common multiple of both steps), the period pattern is repeated
+        over the window as runs.
+        """
+        first1, step1 = run1[0], run1[2]
+        first2, step2 = run2[0], run2[2]
+        # least common multiple of steps
+        gcd, rem = step1, step2
+        while rem:
+            gcd, rem = rem, gcd % rem
+        period = step1 * step2 / gcd
+        period_high = min(high, low + period - 1)
+
+        set1 = dict.fromkeys(xrange(first1, period_high + 1, step1))
+        set2 = dict.fromkeys(xrange(first2, period_high + 1, step2))
+        items = [i for i in set1.keys() + [j for j in set2 if j not in set1] \
+                    if keep(i in set1, i in set2)]
+        items.sort()
+
+        if not items:
+            return
+        if period_high == high:
+            # window fits in one period
+            for run in RangeSet._pack_runs(items):
+                yield run
+            return
+
+        # is the period pattern a single arithmetic progression?
+        if len(items) == 1:
+            step = period
+        else:
+            step = items[1] - items[0]
+        progression = items[0] + period - items[-1] == step
+        for idx in xrange(1, len(items) - 1):
+            if not progression:
+                break
+            progression = items[idx + 1] - items[idx] == step
+        if progression:
+            yield items[0], items[0] + ((high - items[0]) / step) * step, step
+            return
+
+        # repeat irregular pattern runs over each period
+        runs = list(RangeSet._pack_runs(items))
+        offset = 0
+        while low + offset <= high:
+            for first, last, step in runs:
+                first += offset
+                if first > high:
+                    return
+                last = min(last + offset, first + ((high - first) / step) * step)
+                yield first, last, step
+            offset += period
+
+    @staticmethod
+    def _merge_runs(runs1, runs2, keep):
+        """
+        Generate sorted runs of items resulting from a set operation
+        between two sorted lists of runs, without expanding them. keep
+        is a function that tells whether an item should be kept given its
+        membership in runs1 and runs2.
+        """
+        keep1, keep2 = keep(True, False), keep(False, True)
+        idx1 = idx2 = 0
+        run1 = run2 = None
+        while True:
+            if run1 is None and idx1 < len(runs1):
+                run1 = runs1[idx1]
+                idx1 += 1
+            if run2 is None and idx2 < len(runs2):
+                run2 = runs2[idx2]
+                idx2 += 1
+            if run1 is None and run2 is None:
+                return
+            if run2 is None or (run1 is not None and run1[1] < run2[0]):
+                if keep1:
+                    yield run1
+                run1 = None
+            elif run1 is None or run2[1] < run1[0]:
+                if keep2:
+                    yield run2
+                run2 = None
+            else:
+                # overlapping runs: handle leading part first
+                low = max(run1[0], run2[0])
+                if run1[0] < low:
+                    head, run1 = RangeSet._split_run(run1, low)
+                    if keep1:
+                        yield head
+                elif run2[0] < low:
+                    head, run2 = RangeSet._split_run(run2, low)
+                    if keep2:
+                        yield head
+                high = min(run1[1], run2[1])
+                for run in RangeSet._window_runs(run1, run2, low, high, keep):
+                    yield run
+                run1 = RangeSet._split_run(run1, high + 1)[1]
+                run2 = RangeSet._split_run(run2, high + 1)[1]
+
     def add_range(self, start, stop, step=1, pad=0):
         """
         Add a range (start, stop, step and padding length) to RangeSet.
@@ -601,8 +799,8 @@ class RangeSet:
                     self._ranges.append((slice(j, j + 1, step), pad))
             self._length = (stop_adjust - start - 1) / step + 1
         elif step > 1 or self._autostep < 1E100:
-            # use generic expand/fold method in that case
-            self._add_range_exfold(start, stop, step, pad)
+            # use generic runs merging/folding method in that case
+            self._add_range_runs(start, stop, step, pad)
         else:
             # step == 1 specific method (no expand/folding if possible)
             self._add_range_inline(start, stop, step, pad)
@@ -626,7 +824,7 @@ class RangeSet:
             rgstart, rgstop, rgstep = rgsli.start, rgsli.stop, rgsli.step
             if rgstep > 1:
                 # failback to generic method when step > 1 is found
-                self._add_range_exfold(start, stop, step, pad)
+                self._add_range_runs(start, stop, step, pad)
                 return
             # handle pending range...
             if rgstop <= pstop:
@@ -675,18 +873,17 @@ class RangeSet:
         self._ranges = new_ranges
         self._length = new_length
 
-    def _add_range_exfold(self, start, stop, step, pad):
+    def _add_range_runs(self, start, stop, step, pad):
         """
-        Add range expanding then folding all items.
+        Add range merging then folding runs of items (no expansion).
         """
         assert start < stop, "please provide ordered node index ranges"
         assert step > 0
         assert pad >= 0
 
-        items, rgpad = self._expand()
-        items += xrange(start, stop, step)
-        items.sort()
-        self._ranges, self._length = self._fold(items, pad or rgpad)
+        run = (start, stop - 1 - (stop - 1 - start) % step, step)
+        runs = self._merge_runs(self._runs(), [run], lambda in1, in2: True)
+        self._ranges, self._length = self._fold_runs(runs, pad or self._pad())
 
     def union(self, other):
         """
@@ -715,6 +912,14 @@ class RangeSet:
         """
         Update a rangeset with the union of itself and another.
         """
+        if self._length > 0 and len(rangeset._ranges) > 1:
+            pads = dict.fromkeys([pad for sli, pad in self._ranges])
+            pads.update(dict.fromkeys([pad for sli, pad in rangeset._ranges]))
+            if len(pads) == 1:
+                # same padding everywhere: merge and fold all ranges at
+                # once instead of calling add_range() for each range
+                self._update_runs(rangeset._runs(), pads.keys()[0])
+                return
         for sli, pad in rangeset._ranges:
             self.add_range(sli.start, sli.stop, sli.step, pad)
 
@@ -722,16 +927,39 @@ class RangeSet:
         """
         Update a rangeset with the union of itself and several others.
         """
-        # Use expand/compute/fold for performance in that specific case.
         pad = 0
-        items, rgpad = self._expand()
+        runs = []
         for rng in rangesets:
             if not isinstance(rng, RangeSet):
                 rng = RangeSet(rng)
-            for sli, pad in rng._ranges:
-                items += xrange(sli.start, sli.stop, sli.step)
-        items.sort()
-        self._ranges, self._length = self._fold(items, pad or rgpad)
+            runs += rng._runs()
+            if rng._ranges:
+                pad = rng._ranges[-1][1]
+        self._update_runs(runs, pad)
+
+    def _update_runs(self, runs, pad):
+        """
+        Update a rangeset with the union of itself and a list of unsorted
+        (first, last, step) runs, then fold once with padding length pad
+        (or current padding if pad is 0). Internal use.
+        """
+        # Gather and sort all runs, merge overlapping ones and fold once
+        # for performance in that specific case.
+        rgpad = self._pad()
+        runs = self._runs() + runs
+        runs.sort()
+        merged = []
+        for run in runs:
+            if not merged or merged[-1][1] < run[0]:
+                merged.append(run)
+                continue
+            # only the tail of merged runs can overlap with this run
+            idx = len(merged) - 1
+            while idx > 0 and merged[idx - 1][1] >= run[0]:
+                idx -= 1
+            merged[idx:] = self._merge_runs(merged[idx:], [run],
+                                            lambda in1, in2: True)
+        self._ranges, self._length = self._fold_runs(merged, pad or rgpad)
 
     def clear(self):
         """
@@ -771,7 +999,7 @@ class RangeSet:
         """
         Intersection with provided RangeSet.
         """
-        self._ranges, self._length = self._intersect_exfold(rangeset)
+        self._ranges, self._length = self._intersect_runs(rangeset)
 
     def __iand__(self, other):
         """
@@ -782,19 +1010,13 @@ class RangeSet:
         self.intersection_update(other)
         return self
 
-    def _intersect_exfold(self, rangeset):
+    def _intersect_runs(self, rangeset):
         """
-        Calc intersection with the expand/fold method.
+        Calc intersection with the runs merging/folding method.
         """
-        # expand both rangesets
-        items1, pad1 = self._expand()
-        items2, pad2 = rangeset._expand()
-
-        # create a temporary dict with keys from items2
-        iset = dict.fromkeys(items2)
-
-        # fold items that are in both sets
-        return self._fold([e for e in items1 if e in iset], pad1 or pad2)
+        runs = self._merge_runs(self._runs(), rangeset._runs(),
+                                lambda in1, in2: in1 and in2)
+        return self._fold_runs(runs, self._pad() or rangeset._pad())
 
     def difference(self, rangeset):
         """
@@ -821,7 +1043,7 @@ class RangeSet:
         elements found in t. If strict is True, raise KeyError
         if an element cannot be removed.
         """
-        self._ranges, self._length = self._sub_exfold(rangeset, strict)
+        self._ranges, self._length = self._sub_runs(rangeset, strict)
 
     def __isub__(self, other):
         """
@@ -837,50 +1059,39 @@ class RangeSet:
         Remove element elem from the RangeSet. Raise KeyError if elem
         is not contained in the RangeSet.
         """
-        items1, pad1 = self._expand()
-
         try:
-            items1.remove(int(elem))
+            ielem = int(elem)
         except ValueError:
             raise KeyError, elem
+        if not self._contains(ielem):
+            raise KeyError, elem
 
-        self._ranges, self._length = self._fold(items1, pad1)
+        runs = self._merge_runs(self._runs(), [(ielem, ielem, 1)],
+                                lambda in1, in2: in1 and not in2)
+        self._ranges, self._length = self._fold_runs(runs, self._pad())
 
-    def _sub_exfold(self, rangeset, strict):
+    def _sub_runs(self, rangeset, strict):
         """
-        Calc sub/exclusion with the expand/fold method. If strict is
-        True, raise KeyError if the rangeset is not included.
+        Calc sub/exclusion with the runs merging/folding method. If
+        strict is True, raise KeyError if the rangeset is not included.
         """
-        # expand both rangesets
-        items1, pad1 = self._expand()
-        items2, pad2 = rangeset._expand()
-
-        # create a temporary dict with keys from items2
-        iset = dict.fromkeys(items2)
+        runs1, pad1 = self._runs(), self._pad()
+        runs2, pad2 = rangeset._runs(), rangeset._pad()
 
         if strict:
-            # create a list of remaining items (lst) and update iset
-            lst = []
-            for e in items1:
-                if e not in iset:
-                    lst.append(e)
-                else:
-                    del iset[e]
-
-            # if iset is not empty, some elements were not removed
-            if len(iset) > 0:
+            # look for items that cannot be removed
+            missing = RangeSet()
+            missing._ranges, missing._length = self._fold_runs( \
+                self._merge_runs(runs2, runs1, lambda in2, in1: in2 and not in1),
+                pad2)
+            if missing._length > 0:
                 # give the user an indication of the range that cannot
-                # be removed
-                missing = RangeSet()
-                missing._ranges, missing._length = self._fold(iset.keys(), pad2)
-                # repr(missing) is implicit here
+                # be removed; repr(missing) is implicit here
                 raise KeyError, missing
 
-            return self._fold(lst, pad1 or pad2)
-        else:
-            # fold items that are in set 1 and not in set 2
-            return self._fold([e for e in items1 if e not in iset],
-                              pad1 or pad2)
+        # fold items that are in set 1 and not in set 2
+        runs = self._merge_runs(runs1, runs2, lambda in1, in2: in1 and not in2)
+        return self._fold_runs(runs, pad1 or pad2)
 
     def symmetric_difference(self, other):
         """
@@ -907,7 +1118,7 @@ class RangeSet:
         s.symmetric_difference_update(t) returns rangeset s keeping all
         elements that are in exactly one of the rangesets.
         """
-        self._ranges, self._length = self._xor_exfold(rangeset)
+        self._ranges, self._length = self._xor_runs(rangeset)
 
     def __ixor__(self, other):
         """
@@ -919,28 +1130,20 @@ class RangeSet:
         self.symmetric_difference_update(other)
         return self
 
-    def _xor_exfold(self, rangeset):
+    def _xor_runs(self, rangeset):
         """
         Calc symmetric difference (xor).
         """
-        # expand both rangesets
-        items1, pad1 = self._expand()
-        items2, pad2 = rangeset._expand()
+        pad1, pad2 = self._pad(), rangeset._pad()
 
         if pad1 != pad2:
             raise RangeSetPaddingError('', "%s != %s" % (pad1, pad2))
         # same padding, we're clean...
 
-        # create a temporary dicts
-        iset1 = dict.fromkeys(items1)
-        iset2 = dict.fromkeys(items2)
-
-        # keep items that are in one list only
-        allitems = items1 + items2
-        lst = [e for e in allitems if not e in iset1 or not e in iset2]
-        lst.sort()
-
-        return self._fold(lst, pad1)
+        # keep items that are in one rangeset only
+        runs = self._merge_runs(self._runs(), rangeset._runs(),
+                                lambda in1, in2: in1 != in2)
+        return self._fold_runs(runs, pad1)
 
 
 class NodeSetBase(object):
@@ -1471,6 +1674,80 @@ class NodeGroupBase(NodeSetBase):
         NodeSetBase._add(self, pat, rangeset)
 
 
+class ParseCache(object):
+    """
+    Least recently used cache of parsed NodeSetBase objects, shared by
+    all ParsingEngine instances. Entries are keyed on (string pattern,
+    autostep, group resolver).
+    """
+    def __init__(self, maxsize):
+        """
+        Initialize an empty ParseCache of maxsize entries at most.
+        """
+        self.maxsize = maxsize
+        self._entries = {}
+        # circular doubly linked list of [prev, next, key, value] links,
+        # most recently used first
+        self._root = root = [None, None, None, None]
+        root[0] = root[1] = root
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return a copy of cached NodeSetBase for key, or None.
+        """
+        link = self._entries.get(key)
+        if link is None:
+            return None
+        # move link to front
+        prev, nxt = link[0], link[1]
+        prev[1], nxt[0] = nxt, prev
+        root = self._root
+        link[0], link[1] = root, root[1]
+        root[1][0] = root[1] = link
+        return self._copy(link[3])
+
+    def put(self, key, nodeset):
+        """
+        Cache a copy of nodeset for key, evicting the least recently used
+        entry if needed.
+        """
+        if self.maxsize <= 0 or key in self._entries:
+            return
+        root = self._root
+        if len(self._entries) >= self.maxsize:
+            last = root[0]
+            last[0][1], root[0] = root, last[0]
+            del self._entries[last[2]]
+        link = [root, root[1], key, self._copy(nodeset)]
+        root[1][0] = root[1] = link
+        self._entries[key] = link
+
+    def clear(self):
+        """
+        Remove all entries from cache.
+        """
+        self._entries.clear()
+        root = self._root
+        root[0] = root[1] = root
+
+    def _copy(self, nodeset):
+        """Copy NodeSetBase patterns so that cached ones are never shared."""
+        result = NodeSetBase()
+        for pat, rangeset in nodeset._patterns.iteritems():
+            if rangeset is not None:
+                rangeset = rangeset.copy()
+            result._patterns[pat] = rangeset
+        return result
+
+
+# Default number of parsed string patterns kept in the shared parse cache.
+PARSE_CACHE_SIZE = 256
+PARSE_CACHE = ParseCache(PARSE_CACHE_SIZE)
+
+
 class ParsingEngine(object):
     """
     Class that is able to transform a source into a NodeSetBase.
@@ -1480,6 +1757,9 @@ class ParsingEngine(object):
                  'intersection_update': '&',
                  'symmetric_difference_update': '^' }
 
+    # plain node name without any range, operator, group or whitespace
+    SIMPLE_NODE_RE = re.compile(r"([^\d\[\],!&^%@\s]*)(\d*)([^\[\],!&^%@\s]*)$")
+
     def __init__(self, group_resolver):
         """
         Initialize Parsing Engine.
@@ -1501,13 +1781,80 @@ class ParsingEngine(object):
 
         # or is nsobj a string?
         if type(nsobj) is str:
+            key = (nsobj, autostep, self.group_resolver)
+            nodeset = PARSE_CACHE.get(key)
+            if nodeset is not None:
+                return nodeset
             try:
-                return self.parse_string(str(nsobj), autostep)
+                nodeset = self.parse_string(str(nsobj), autostep)
             except NodeUtils.GroupSourceQueryFailed, exc:
                 raise NodeSetParseError(nsobj, str(exc))
+            # don't cache group resolution results, as they are external
+            if not self.group_resolver or nsobj.find('@') < 0:
+                PARSE_CACHE.put(key, nodeset)
+            return nodeset
 
         raise TypeError("Unsupported NodeSet input %s" % type(nsobj))
-        
+
+    def parse_list(self, nslist, autostep, nodeset=None):
+        """
+        Parse provided list of objects and return a single NodeSetBase
+        object. Plain node names are split into (pattern, index, padding)
+        in one pass, then all indexes of a same pattern are sorted and
+        folded at once. If the result is to be merged into nodeset, its
+        padding is used as a fallback like RangeSet.updaten() does.
+        """
+        # pattern -> (list of runs, list of (first pad, last pad)) or None
+        patd = {}
+        for nsobj in nslist:
+            mo = None
+            if type(nsobj) is str:
+                mo = self.SIMPLE_NODE_RE.match(nsobj)
+            if mo and (mo.group(1) or mo.group(3)):
+                pfx, idx, sfx = mo.groups()
+                if not idx:
+                    patd[pfx] = None
+                    continue
+                pad = 0
+                if len(idx) > 1 and idx[0] == '0':
+                    pad = len(idx)
+                index = int(idx)
+                runs, pads = patd.setdefault("%s%%s%s" % (pfx, sfx), ([], []))
+                runs.append((index, index, 1))
+                pads.append((pad, pad))
+                continue
+            # general case
+            for pat, rangeset in self.parse(nsobj, autostep)._patterns.iteritems():
+                if rangeset is None:
+                    patd[pat] = None
+                elif len(rangeset) > 0:
+                    runs, pads = patd.setdefault(pat, ([], []))
+                    runs += rangeset._runs()
+                    pads.append((rangeset._pad(), rangeset._ranges[-1][1]))
+
+        result = NodeSetBase()
+        for pat, entry in patd.iteritems():
+            if entry is None:
+                result._patterns[pat] = None
+                continue
+            runs, pads = entry
+            # Same padding rules as RangeSet.updaten() on each rangeset:
+            # the padding of the last one, or else the padding of the
+            # target rangeset, which is the first one for a new pattern.
+            target = None
+            if nodeset is not None:
+                target = nodeset._patterns.get(pat)
+            if target is not None:
+                pad = pads[-1][1] or target._pad()
+            elif len(pads) > 1:
+                pad = pads[-1][1] or pads[0][0]
+            else:
+                pad = pads[0][0]
+            rangeset = RangeSet(autostep=autostep)
+            rangeset._update_runs(runs, pad)
+            result._patterns[pat] = rangeset
+        return result
+
     def parse_string(self, nsstr, autostep):
         """
         Parse provided string and return a NodeSetBase object.
@@ -1657,6 +2004,48 @@ class ParsingEngine(object):
 NOGROUP_RESOLVER = -1
 
 
+class NodeGroupIndex(object):
+    """
+    Inverted index of the node groups of a group source, from node
+    patterns to groups, built once from all group maps. It allows
+    NodeSet.regroup() to only look at groups sharing node patterns with
+    the nodeset to regroup, instead of intersecting every group.
+    """
+    def __init__(self, groupsmap, resolver=None):
+        """
+        Build index from groupsmap, a dict of group name -> node list.
+        """
+        self.groupsmap = groupsmap
+        self._groups = {}
+        self._patterns = {}
+        for grp, nodelist in groupsmap.iteritems():
+            nodes = NodeSet(",".join(nodelist), resolver=resolver)
+            if not nodes:
+                continue
+            self._groups[grp] = nodes
+            for pat in nodes._patterns:
+                self._patterns.setdefault(pat, []).append(grp)
+
+    def full_groups(self, nodeset):
+        """
+        Return a dict of group name -> NodeSet for all groups whose nodes
+        are all included in nodeset.
+        """
+        candidates = {}
+        for pat in nodeset._patterns:
+            for grp in self._patterns.get(pat, ()):
+                candidates[grp] = self._groups[grp]
+        result = {}
+        for grp, nodes in candidates.iteritems():
+            if NodeSetBase.issuperset(nodeset, nodes):
+                result[grp] = nodes
+        return result
+
+
+# Group indexes used by NodeSet.regroup(), by (resolver, group source).
+GROUP_INDEXES = {}
+
+
 class NodeSet(NodeSetBase):
     """
     Iterable class of nodes with node ranges support.
@@ -1740,10 +2129,10 @@ class NodeSet(NodeSetBase):
                 allgrpns = NodeSet.fromlist( \
                                 inst._resolver.grouplist(groupsource),
                                 resolver=NOGROUP_RESOLVER)
-                # For each individual group, resolve it to node and accumulate.
-                for grp in allgrpns:
-                    inst.update(NodeSet.fromlist( \
-                                inst._resolver.group_nodes(grp, groupsource)))
+                # Resolve all groups to nodes at once and accumulate.
+                for nodelist in inst._resolver.groups_nodes(list(allgrpns),
+                                                groupsource).itervalues():
+                    inst.update(NodeSet.fromlist(nodelist))
             except NodeUtils.GroupSourceNoUpcall:
                 # We are not able to find "all" nodes, definitely.
                 raise NodeSetExternalError("Not enough working external " \
@@ -1767,17 +2156,24 @@ class NodeSet(NodeSetBase):
         self._resolver = None
         self._parser = ParsingEngine(None)
 
-    def _find_groups(self, node, namespace, allgroups):
-        """Find groups of node by namespace."""
-        if allgroups:
-            # find node groups using in-memory allgroups
-            for grp, nodeset in allgroups.iteritems():
-                if node in nodeset:
-                    yield grp
-        else:
-            # find node groups using resolver
-            for group in self._resolver.node_groups(node, namespace):
-                yield group
+    def _group_index(self, groupsource, allgrpns):
+        """
+        Get the NodeGroupIndex of all groups in groupsource, building it
+        again if group maps have changed since it was built.
+        """
+        try:
+            groupsmap = self._resolver.groups_nodes(list(allgrpns),
+                                                    groupsource)
+        except NodeUtils.GroupSourceQueryFailed, exc:
+            # External result inconsistency
+            raise NodeSetExternalError("Unable to map a group " \
+                    "previously listed\n\tFailed command: %s" % exc)
+        key = (self._resolver, groupsource)
+        index = GROUP_INDEXES.get(key)
+        if index is None or index.groupsmap != groupsmap:
+            index = NodeGroupIndex(groupsmap, self._resolver)
+            GROUP_INDEXES[key] = index
+        return index
 
     def regroup(self, groupsource=None, autostep=None, overlap=False,
                 noprefix=False):
@@ -1796,43 +2192,31 @@ class NodeSet(NodeSetBase):
             # using reverse.
             allgrpns = None
 
-        allgroups = {}
-
         # Check for external reverse presence, and also use the
         # following heuristic: external reverse is used only when number
-        # of groups is greater than the NodeSet size.
+        # of groups is greater than the NodeSet size, unless an index of
+        # groups has already been built.
         if self._resolver.has_node_groups(groupsource) and \
-            (not allgrpns or len(allgrpns) >= len(self)):
-            # use external reverse
-            pass
+            (not allgrpns or len(allgrpns) >= len(self)) and \
+            (self._resolver, groupsource) not in GROUP_INDEXES:
+            # use external reverse: count nodes found in each group
+            counts = {}
+            for node in self._iterbase():
+                for grp in self._resolver.node_groups(node, groupsource):
+                    counts[grp] = counts.get(grp, 0) + 1
+            # Keep only groups that are full.
+            for grp, cnt in counts.iteritems():
+                nodes = self._parser.parse_group(grp, groupsource, autostep)
+                assert cnt <= len(nodes)
+                if cnt == len(nodes):
+                    groups[grp] = nodes
         else:
             if not allgrpns: # list query failed and no way to reverse!
                 return str(rest)
-            try:
-                # use internal reverse: populate allgroups
-                for grp in allgrpns:
-                    nodelist = self._resolver.group_nodes(grp, groupsource)
-                    allgroups[grp] = NodeSet(",".join(nodelist))
-            except NodeUtils.GroupSourceQueryFailed, exc:
-                # External result inconsistency
-                raise NodeSetExternalError("Unable to map a group " \
-                        "previously listed\n\tFailed command: %s" % exc)
-
-        # For each NodeSetBase in self, finds its groups.
-        for node in self._iterbase():
-            for grp in self._find_groups(node, groupsource, allgroups):
-                if grp not in groups:
-                    nodes = self._parser.parse_group(grp, groupsource, autostep)
-                    groups[grp] = (0, nodes)
-                i, nodes = groups[grp]
-                groups[grp] = (i + 1, nodes)
-                
-        # Keep only groups that are full.
-        fulls = []
-        for k, (i, nodes) in groups.iteritems():
-            assert i <= len(nodes)
-            if i == len(nodes):
-                fulls.append((i, k))
+            # use internal reverse: only full groups are returned
+            groups = self._group_index(groupsource, allgrpns).full_groups(self)
+
+        fulls = [(len(nodes), grp) for grp, nodes in groups.iteritems()]
 
         regrouped = NodeSet(resolver=NOGROUP_RESOLVER)
 
@@ -1840,13 +2224,13 @@ class NodeSet(NodeSetBase):
 
         # Build regrouped NodeSet by selecting largest groups first.
         for num, grp in sorted(fulls, cmp=bigalpha):
-            if not overlap and groups[grp][1] not in rest:
+            if not overlap and groups[grp] not in rest:
                 continue
             if groupsource and not noprefix:
                 regrouped.update("@%s:%s" % (groupsource, grp))
             else:
                 regrouped.update("@" + grp)
-            rest.difference_update(groups[grp][1])
+            rest.difference_update(groups[grp])
             if not rest:
                 return str(regrouped)
 
@@ -1917,7 +2301,7 @@ class NodeSet(NodeSetBase):
         s.updaten(list) returns nodeset s with elements added from given list.
         """
         NodeSetBase.updaten(self, \
-            [self._parser.parse(other, self._autostep) for other in others])
+            [self._parser.parse_list(others, self._autostep, self)])
 
     def intersection_update(self, other):
         """
@@ -43,12 +43,24 @@ to external node groups sources in separate namespaces (example of
 group sources are: files, jobs scheduler, custom scripts, etc.).
 """
 
+import os
 import sys
+import threading
+import time
 
 from ConfigParser import ConfigParser, NoOptionError, NoSectionError
 from string import Template
 from subprocess import Popen, PIPE
 
+try:
+    import sqlite3
+except ImportError:
+    try:
+        from pysqlite2 import dbapi2 as sqlite3
+    except ImportError:
+        # persistent upcall cache not available
+        sqlite3 = None
+
 
 class GroupSourceException(Exception):
     """Base GroupSource exception"""
@@ -72,12 +84,95 @@ class GroupResolverConfigError(GroupResolverError):
     """Raised when a configuration error is encountered"""
 
 
+def default_cache_dir():
+    """
+    Return the default directory of persistent upcall caches, in the user
+    cache directory.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'clustershell')
+
+
+class UpcallCache(object):
+    """
+    Persistent cache of upcall command outputs, stored in a sqlite
+    database file that may be shared by several processes. Entries are
+    keyed on the full upcall command line, so that any upcall change in
+    configuration invalidates them.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Get sqlite connection of current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname, 0700)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.text_factory = str
+            conn.execute("CREATE TABLE IF NOT EXISTS upcall (cmdline TEXT " \
+                         "PRIMARY KEY, output TEXT, stamp REAL)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, cmdline):
+        """
+        Return a (output, timestamp) tuple for cmdline if found in cache,
+        or None.
+        """
+        cur = self._connection().execute( \
+            "SELECT output, stamp FROM upcall WHERE cmdline = ?", (cmdline,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def put(self, cmdline, output, stamp=None):
+        """
+        Store upcall output for cmdline.
+        """
+        if stamp is None:
+            stamp = time.time()
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO upcall (cmdline, output, stamp) " \
+                     "VALUES (?, ?, ?)", (cmdline, output, stamp))
+        conn.commit()
+
+    def putn(self, entries, stamp=None):
+        """
+        Store several (cmdline, output) entries in one transaction.
+        """
+        if stamp is None:
+            stamp = time.time()
+        conn = self._connection()
+        conn.executemany("INSERT OR REPLACE INTO upcall (cmdline, output, " \
+                         "stamp) VALUES (?, ?, ?)",
+                         [(cmdline, output, stamp) \
+                            for cmdline, output in entries])
+        conn.commit()
+
+
 class GroupSource(object):
     """
     GroupSource class managing external calls for nodegroup support.
+
+    Upcall outputs are cached in memory for the life of the object. When
+    cache_time is set (in seconds), they are also kept in a persistent
+    UpcallCache file in cache_dir, shared by all processes: entries
+    younger than cache_time are used as is, entries younger than
+    cache_time + cache_stale_time are used while being refreshed in a
+    background thread (one per source, map entries are refreshed with
+    a single batchmap upcall when defined), older entries are refreshed
+    before being used.
     """
     def __init__(self, name, map_upcall, all_upcall=None,
-                 list_upcall=None, reverse_upcall=None):
+                 list_upcall=None, reverse_upcall=None, batchmap_upcall=None,
+                 cache_time=0, cache_stale_time=None, cache_dir=None):
         self.name = name
         self.verbosity = 0
 
@@ -92,19 +187,145 @@ class GroupSource(object):
         self.all_upcall = all_upcall
         self.list_upcall = list_upcall
         self.reverse_upcall = reverse_upcall
+        self.batchmap_upcall = batchmap_upcall
+
+        # Persistent upcall cache
+        self.cache_time = cache_time
+        if cache_stale_time is None:
+            cache_stale_time = cache_time
+        self.cache_stale_time = cache_stale_time
+        self._upcall_cache = None
+        if cache_time > 0 and sqlite3 is not None:
+            filename = "%s.db" % name.replace(os.sep, '_')
+            self._upcall_cache = UpcallCache(os.path.join(cache_dir or \
+                                                default_cache_dir(), filename))
+        # Stale entries to refresh: cmdline -> group (map) or None
+        self._stale = {}
+        self._stale_lock = threading.Lock()
+        self._refresher = None
 
     def _verbose_print(self, msg):
         if self.verbosity > 0:
             print >> sys.stderr, "%s<%s> %s" % \
                 (self.__class__.__name__, self.name, msg)
 
+    def _upcall_cmdline(self, cmdtpl, vars=dict()):
+        """Get command line of the specified upcall."""
+        return Template(getattr(self, "%s_upcall" % \
+                    cmdtpl)).safe_substitute(vars)
+
     def _upcall_read(self, cmdtpl, vars=dict()):
         """
         Invoke the specified upcall command, raise an Exception if
         something goes wrong and return the command output otherwise.
+        The persistent upcall cache is used when enabled.
+        """
+        cmdline = self._upcall_cmdline(cmdtpl, vars)
+        if self._upcall_cache is None:
+            return self._upcall_exec(cmdline)
+
+        group = None
+        if cmdtpl == 'map':
+            group = vars.get('GROUP')
+        output = self._cache_lookup(cmdline, group)
+        self._revalidate()
+        if output is None:
+            output = self._upcall_exec(cmdline)
+            self._cache_store([(cmdline, output)])
+        return output
+
+    def _cache_lookup(self, cmdline, group=None):
+        """
+        Get upcall output from the persistent cache, or None if not
+        found or too old. Stale entries are queued for a background
+        refresh started by _revalidate(); group is the group name of a
+        map upcall.
+        """
+        try:
+            entry = self._upcall_cache.get(cmdline)
+        except (sqlite3.Error, OSError), exc:
+            self._verbose_print("CACHE ERROR %s" % exc)
+            return None
+        if entry is None:
+            return None
+        output, stamp = entry
+        age = time.time() - stamp
+        if age < self.cache_time:
+            self._verbose_print("CACHE '%s'" % cmdline)
+            return output
+        if age < self.cache_time + self.cache_stale_time:
+            self._verbose_print("CACHE STALE '%s'" % cmdline)
+            self._stale_lock.acquire()
+            try:
+                self._stale.setdefault(cmdline, group)
+            finally:
+                self._stale_lock.release()
+            return output
+        return None
+
+    def _cache_store(self, entries):
+        """Store (cmdline, output) entries in the persistent cache."""
+        try:
+            self._upcall_cache.putn(entries)
+        except (sqlite3.Error, OSError), exc:
+            self._verbose_print("CACHE ERROR %s" % exc)
+
+    def _revalidate(self):
+        """
+        Start the background thread refreshing queued stale entries, if
+        not already running.
+        """
+        self._stale_lock.acquire()
+        try:
+            if not self._stale or self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh)
+            # never delay exit for a cache refresh
+            self._refresher.setDaemon(True)
+            self._refresher.start()
+        finally:
+            self._stale_lock.release()
+
+    def _refresh(self):
+        """Refresh thread: update stale entries until none is queued."""
+        while True:
+            self._stale_lock.acquire()
+            try:
+                stale = self._stale
+                if not stale:
+                    self._refresher = None
+                    return
+                self._stale = {}
+            finally:
+                self._stale_lock.release()
+
+            entries = []
+            groups = [group for group in stale.itervalues() \
+                        if group is not None]
+            if groups and self.batchmap_upcall:
+                try:
+                    batch = self._batchmap_exec(groups)
+                except GroupSourceQueryFailed:
+                    # keep stale entries
+                    batch = {}
+                for group, nodes in batch.iteritems():
+                    cmdline = self._upcall_cmdline('map', dict(GROUP=group))
+                    entries.append((cmdline, nodes))
+                    stale.pop(cmdline, None)
+            for cmdline in stale:
+                try:
+                    entries.append((cmdline, self._upcall_exec(cmdline)))
+                except GroupSourceQueryFailed:
+                    # keep stale entry
+                    pass
+            if entries:
+                self._cache_store(entries)
+
+    def _upcall_exec(self, cmdline):
+        """
+        Execute upcall command line, raise an Exception if something
+        goes wrong and return the command output otherwise.
         """
-        cmdline = Template(getattr(self, "%s_upcall" % \
-                    cmdtpl)).safe_substitute(vars)
         self._verbose_print("EXEC '%s'" % cmdline)
         proc = Popen(cmdline, stdout=PIPE, shell=True)
         output = proc.communicate()[0].strip()
@@ -125,6 +346,64 @@ class GroupSource(object):
 
         return self._cache_map[group]
 
+    def resolv_maps(self, groups):
+        """
+        Get nodes from several groups at once, using cached values if
+        available. Uncached groups are resolved using a single batchmap
+        upcall when it is defined. Return a dict of group -> nodes.
+        """
+        result = {}
+        missing = []
+        for group in groups:
+            if group in self._cache_map:
+                result[group] = self._cache_map[group]
+            elif self._upcall_cache is not None:
+                output = self._cache_lookup( \
+                    self._upcall_cmdline('map', dict(GROUP=group)), group)
+                if output is None:
+                    missing.append(group)
+                else:
+                    result[group] = self._cache_map[group] = output
+            else:
+                missing.append(group)
+
+        # refresh all stale groups at once
+        if self._upcall_cache is not None:
+            self._revalidate()
+
+        if missing and self.batchmap_upcall:
+            batch = self._batchmap_exec(missing)
+            entries = []
+            for group, nodes in batch.iteritems():
+                result[group] = self._cache_map[group] = nodes
+                entries.append((self._upcall_cmdline('map', \
+                                    dict(GROUP=group)), nodes))
+            if self._upcall_cache is not None and entries:
+                self._cache_store(entries)
+            missing = [group for group in missing if group not in batch]
+
+        # fall back to map upcall for each remaining group
+        for group in missing:
+            result[group] = self.resolv_map(group)
+        return result
+
+    def _batchmap_exec(self, groups):
+        """
+        Execute batchmap upcall for groups and return a dict of group ->
+        nodes. Its output has one "group: nodes" line per group.
+        """
+        output = self._upcall_exec(self._upcall_cmdline('batchmap', \
+                                        dict(GROUPS=" ".join(groups))))
+        batch = {}
+        for line in output.splitlines():
+            if line.find(':') < 0:
+                continue
+            group, nodes = line.split(':', 1)
+            batch.setdefault(group.strip(), []).append(nodes.strip())
+        for group, lines in batch.iteritems():
+            batch[group] = "\n".join(lines)
+        return batch
+
     def resolv_list(self):
         """
         Return a list of all group names for this group source, using
@@ -229,6 +508,17 @@ class GroupResolver(object):
         source = self._source(namespace)
         return self._list(source, 'map', group)
 
+    def groups_nodes(self, groups, namespace=None):
+        """
+        Find nodes for several group names at once and optional
+        namespace. Return a dict of group -> node list.
+        """
+        source = self._source(namespace)
+        result = {}
+        for group, raw in source.resolv_maps(groups).iteritems():
+            result[group] = raw.split()
+        return result
+
     def all_nodes(self, namespace=None):
         """
         Find all nodes. You may specify an optional namespace.
@@ -301,21 +591,41 @@ class GroupResolverConfig(GroupResolver):
         if not self.default_sourcename:
             self.default_sourcename = group_sections[0]
 
+        # Persistent upcall cache directory
+        cache_dir = None
+        if self.config.has_option('Main', 'cache_dir'):
+            cache_dir = self.config.get('Main', 'cache_dir')
+
         try:
             for section in group_sections:
                 map_upcall = self.config.get(section, 'map', True)
                 all_upcall = list_upcall = reverse_upcall = None
+                batchmap_upcall = None
                 if self.config.has_option(section, 'all'):
                     all_upcall = self.config.get(section, 'all', True)
                 if self.config.has_option(section, 'list'):
                     list_upcall = self.config.get(section, 'list', True)
                 if self.config.has_option(section, 'reverse'):
                     reverse_upcall = self.config.get(section, 'reverse', True)
+                if self.config.has_option(section, 'batchmap'):
+                    batchmap_upcall = self.config.get(section, 'batchmap',
+                                                      True)
+                cache_time = 0
+                cache_stale_time = None
+                if self.config.has_option(section, 'cache_time'):
+                    cache_time = self.config.getfloat(section, 'cache_time')
+                if self.config.has_option(section, 'cache_stale_time'):
+                    cache_stale_time = self.config.getfloat(section,
+                                                        'cache_stale_time')
 
                 self.add_source(GroupSource(section, map_upcall, all_upcall,
-                                            list_upcall, reverse_upcall))
+                                            list_upcall, reverse_upcall,
+                                            batchmap_upcall, cache_time,
+                                            cache_stale_time, cache_dir))
         except (NoSectionError, NoOptionError), e:
             raise GroupResolverConfigError(str(e))
+        except ValueError, e:
+            raise GroupResolverConfigError(str(e))
 
     def _source(self, namespace):
         return GroupResolver._source(self, namespace or self.default_sourcename)
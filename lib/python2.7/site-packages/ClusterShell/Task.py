@@ -70,6 +70,7 @@ from ClusterShell.Engine.Factory import PreferredEngine
 from ClusterShell.Worker.EngineClient import EnginePort
 from ClusterShell.Worker.Ssh import WorkerSsh
 from ClusterShell.Worker.Popen import WorkerPopen
+from ClusterShell.Worker.Tree import WorkerTree
 
 from ClusterShell.Event import EventHandler
 from ClusterShell.MsgTree import MsgTree
@@ -131,6 +132,9 @@ class Task(object):
     _std_info =     { "debug"               : False,
                       "print_debug"         : _task_print_debug,
                       "fanout"              : 64,
+                      "fanout_adaptive"     : False,
+                      "fanout_min"          : 8,
+                      "fanout_groups"       : None,
                       "connect_timeout"     : 10,
                       "command_timeout"     : 0 }
     _tasks = {}
@@ -421,6 +425,15 @@ class Task(object):
             print).
           - "fanout": Max number of registered clients in Engine at a
             time (default: 64).
+          - "fanout_adaptive": Boolean value indicating whether the
+            effective fanout should be adapted between "fanout_min" and
+            "fanout" according to observed connection latency, load
+            average and file descriptors usage (default: False).
+          - "fanout_min": Min (and initial) number of registered clients
+            in Engine at a time when "fanout_adaptive" is set (default: 8).
+          - "fanout_groups": Optional dict of nodeset strings to max
+            number of concurrent clients for these nodes, for example
+            {"@rack1": 16, "@dc2": 128} (default: None).
           - "connect_timeout": Time in seconds to wait for connecting to
             remote host before aborting (default: 10).
           - "command_timeout": Time in seconds to wait for a command to
@@ -462,6 +475,20 @@ class Task(object):
             default is False
           - stderr: separate stdout/stderr if set to True -- default
             is False.
+          - multiplex: for distant commands, reuse per node ssh master
+            connections if set to True (see Worker.Ssh.SshMasterPool)
+            -- default is task info "ssh_multiplex" or False. Task info
+            "ssh_multiplex_idle" (default: 60) and "ssh_multiplex_max"
+            (default: 256) set the idle delay in seconds before a master
+            connection exits and the max number of master connections.
+          - tree: for distant commands, propagate the command through
+            gateway nodes according to task info "tree_routes", a
+            dictionary of gateway: nodeset (see Worker.Tree.WorkerTree)
+            -- default is True, effective only if "tree_routes" is set.
+            On gateways, the agent is started with ssh unless task info
+            "tree_gateway_cmd" is set to a shell command template (with
+            %(gateway)s), and results are flushed upstream every
+            "tree_flush_interval" seconds (default: 0.5).
 
         Local usage::
             task.shell(command [, key=key] [, handler=handler]
@@ -489,10 +516,21 @@ class Task(object):
             assert kwargs.get("key", None) is None, \
                     "'key' argument not supported for distant command"
 
-            # create ssh-based worker
-            worker = WorkerSsh(NodeSet(kwargs["nodes"]), command=command,
-                               handler=handler, stderr=stderr, timeout=timeo,
-                               autoclose=ac)
+            multiplex = kwargs.get("multiplex",
+                                   self.info("ssh_multiplex", False))
+            routes = self.info("tree_routes")
+            if routes and kwargs.get("tree", True):
+                # create tree worker (through gateways)
+                worker = WorkerTree(NodeSet(kwargs["nodes"]), command=command,
+                                    handler=handler, stderr=stderr,
+                                    timeout=timeo, autoclose=ac,
+                                    multiplex=multiplex, routes=routes)
+            else:
+                # create ssh-based worker
+                worker = WorkerSsh(NodeSet(kwargs["nodes"]), command=command,
+                                   handler=handler, stderr=stderr,
+                                   timeout=timeo, autoclose=ac,
+                                   multiplex=multiplex)
         else:
             # create (local) worker
             worker = WorkerPopen(command, key=kwargs.get("key", None),
@@ -506,7 +544,8 @@ class Task(object):
 
     def copy(self, source, dest, nodes, **kwargs):
         """
-        Copy local file to distant nodes.
+        Copy local file to distant nodes. Set the multiplex parameter
+        to True to reuse ssh master connections (see shell()).
         """
         assert nodes != None, "local copy not supported"
 
@@ -515,11 +554,12 @@ class Task(object):
         timeo = kwargs.get("timeout", None)
         preserve = kwargs.get("preserve", None)
         reverse = kwargs.get("reverse", False)
+        multiplex = kwargs.get("multiplex", self.info("ssh_multiplex", False))
 
         # create a new copy worker
         worker = WorkerSsh(nodes, source=source, dest=dest, handler=handler,
                            stderr=stderr, timeout=timeo, preserve=preserve,
-                           reverse=reverse)
+                           reverse=reverse, multiplex=multiplex)
 
         self.schedule(worker)
         return worker
@@ -821,6 +861,23 @@ class Task(object):
         """
         return self._engine.running
 
+    def scheduler_stats(self):
+        """
+        Return a dict of engine clients scheduler counters: number of
+        started, completed and deferred clients, current and max
+        effective fanout, number of adaptive fanout increases and
+        decreases, and average response latency in seconds (or None).
+        """
+        sched = self._engine.scheduler
+        return { "started"   : sched.started,
+                 "completed" : sched.completed,
+                 "deferred"  : sched.deferred,
+                 "fanout"    : sched.limit(),
+                 "max_fanout": sched.max_fanout,
+                 "increased" : sched.increased,
+                 "decreased" : sched.decreased,
+                 "latency"   : sched.latency }
+
     def _reset(self):
         """
         Reset buffers and retcodes management variables.
@@ -998,6 +1055,26 @@ class Task(object):
         if self._errtree is not None:
             self._errtree.remove(lambda k: k[0] == worker)
 
+    def _pop_buffers_by_worker(self, worker, keys):
+        """
+        Remove messages of specified keys from worker and return a
+        list of (message, keys) tuples gathered by message.
+        """
+        if self._msgtree is None:
+            raise TaskMsgTreeError("stdout_msgtree not set")
+        return self._msgtree.evict([(worker, key) for key in keys],
+                                   itemgetter(1))
+
+    def _pop_errors_by_worker(self, worker, keys):
+        """
+        Remove error messages of specified keys from worker and return
+        a list of (message, keys) tuples gathered by message.
+        """
+        if self._errtree is None:
+            raise TaskMsgTreeError("stderr_msgtree not set")
+        return self._errtree.evict([(worker, key) for key in keys],
+                                   itemgetter(1))
+
     def key_buffer(self, key):
         """
         Get buffer for a specific key. When the key is associated
@@ -42,9 +42,11 @@ it and write data to it.
 """
 
 import fcntl
+import io
 import os
 import Queue
 import thread
+import threading
 
 from fastsubprocess import Popen, PIPE, STDOUT, set_nonblock_flag
 
@@ -64,6 +66,19 @@ class EngineClientNotSupportedError(EngineClientError):
     """Operation not supported by EngineClient."""
 
 
+# size of read chunks
+READ_CHUNK_SIZE = 65536
+
+class _ReadChunk(threading.local):
+    """Per thread (ie. per task) reusable read buffer."""
+    def __init__(self):
+        threading.local.__init__(self)
+        self.buf = bytearray(READ_CHUNK_SIZE)
+        self.view = memoryview(self.buf)
+
+_READ_CHUNK = _ReadChunk()
+
+
 class EngineClient(EngineBaseTimer):
     """
     Abstract class EngineClient.
@@ -96,10 +111,13 @@ class EngineClient(EngineBaseTimer):
         self.fd_reader = None
         self.fd_writer = None
 
-        # initialize error, read and write buffers
-        self._ebuf = ""
-        self._rbuf = ""
+        # initialize error, read and write buffers (error and read
+        # buffers only hold a partial line, see _readlines())
+        self._ebuf = bytearray()
+        self._rbuf = bytearray()
         self._wbuf = ""
+        # raw file objects used to read into reusable buffers
+        self._fdio = {}
         self._weof = False                  # write-ends notification
 
     def _fire(self):
@@ -239,54 +257,80 @@ class EngineClient(EngineBaseTimer):
 
         return proc
 
+    def _readinto_lines(self, fd, buf):
+        """
+        Read a chunk of data from fd into a reusable buffer and return
+        the list of complete lines found (without EOL). Incomplete line
+        data is kept in the bytearray buf, which never contains any LF,
+        so that already read data is never scanned again. Return None
+        if no data is available right now, or raise EngineClientEOF.
+        """
+        fdio = self._fdio.get(fd)
+        if fdio is None:
+            fdio = self._fdio[fd] = io.FileIO(fd, 'r', closefd=False)
+        chunk = _READ_CHUNK
+        size = fdio.readinto(chunk.view)
+        if size is None:
+            return None
+        if not size:
+            raise EngineClientEOF()
+
+        data = chunk.buf
+        view = chunk.view
+        lines = []
+        eol = data.find('\n', 0, size)
+        if eol < 0:
+            # no EOL, keep partial line in buffer
+            buf += view[:size]
+            return lines
+        if buf:
+            # complete previous partial line
+            buf += view[:eol]
+            if buf[-1] == 13:
+                del buf[-1] # trim CRLF
+            lines.append(str(buf))
+            del buf[:]
+        else:
+            end = eol
+            if end > 0 and data[end - 1] == 13:
+                end -= 1 # trim CRLF
+            lines.append(view[:end].tobytes())
+        start = eol + 1
+        eol = data.find('\n', start, size)
+        while eol >= 0:
+            end = eol
+            if end > start and data[end - 1] == 13:
+                end -= 1 # trim CRLF
+            lines.append(view[start:end].tobytes())
+            start = eol + 1
+            eol = data.find('\n', start, size)
+        if start < size:
+            # keep partial line in buffer
+            buf += view[start:size]
+        return lines
+
     def _readlines(self):
         """
-        Utility method to read client lines
+        Utility method to read client lines. Return a list of lines.
         """
         # read a chunk of data, may raise eof
-        readbuf = self._read()
-        assert len(readbuf) > 0, "assertion failed: len(readbuf) > 0"
-
-        # Current version implements line-buffered reads. If needed, we could
-        # easily provide direct, non-buffered, data reads in the future.
-
-        buf = self._rbuf + readbuf
-        lines = buf.splitlines(True)
-        self._rbuf = ""
-        for line in lines:
-            if line.endswith('\n'):
-                if line.endswith('\r\n'):
-                    yield line[:-2] # trim CRLF
-                else:
-                    # trim LF
-                    yield line[:-1] # trim LF
-            else:
-                # keep partial line in buffer
-                self._rbuf = line
-                # breaking here
+        lines = self._readinto_lines(self.fd_reader, self._rbuf)
+        self._set_reading()
+        if lines is None:
+            return []
+        return lines
 
     def _readerrlines(self):
         """
-        Utility method to read client lines
+        Utility method to read client error lines. Return a list of
+        lines.
         """
-        # read a chunk of data, may raise eof
-        readerrbuf = self._readerr()
-        assert len(readerrbuf) > 0, "assertion failed: len(readerrbuf) > 0"
-
-        buf = self._ebuf + readerrbuf
-        lines = buf.splitlines(True)
-        self._ebuf = ""
-        for line in lines:
-            if line.endswith('\n'):
-                if line.endswith('\r\n'):
-                    yield line[:-2] # trim CRLF
-                else:
-                    # trim LF
-                    yield line[:-1] # trim LF
-            else:
-                # keep partial line in buffer
-                self._ebuf = line
-                # breaking here
+        # read a chunk of error data, may raise eof
+        lines = self._readinto_lines(self.fd_error, self._ebuf)
+        self._set_reading_error()
+        if lines is None:
+            return []
+        return lines
 
     def _write(self, buf):
         """
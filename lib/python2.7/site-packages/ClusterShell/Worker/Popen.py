@@ -97,7 +97,7 @@ class WorkerPopen(WorkerSimple):
         if flush and self._rbuf:
             # We still have some read data available in buffer, but no
             # EOL. Generate a final message before closing.
-            self.worker._on_msgline(self._rbuf)
+            self.worker._on_msgline(str(self._rbuf))
 
         rc = -1
         if abort:
@@ -38,14 +38,189 @@ ClusterShell Ssh/Scp support
 This module implements OpenSSH engine client and task's worker.
 """
 
+import atexit
 import copy
 import os
+import shutil
+import tempfile
+import threading
+import time
+from subprocess import Popen, call
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
 
 from ClusterShell.NodeSet import NodeSet
 from ClusterShell.Worker.EngineClient import EngineClient
 from ClusterShell.Worker.Worker import DistantWorker
 
 
+class SshMasterPool(object):
+    """
+    Pool of OpenSSH master connections (ControlMaster), used to share
+    a single connection to a node between successive ssh/scp commands
+    and thus avoid a full key exchange per command.
+
+    Masters are started in background on first use of a node, while
+    the first command connects normally (ControlMaster=no falls back
+    to a direct connection if the control socket is not ready yet).
+    Masters idle for more than the task info "ssh_multiplex_idle"
+    seconds exit by themselves (ControlPersist) and are forgotten. At
+    most "ssh_multiplex_max" masters are kept open: when the limit is
+    reached, the least recently used idle master is closed, or the
+    command connects directly if all masters are in use.
+    """
+
+    class _Master(object):
+        """Master connection state."""
+        def __init__(self, cmd_base, node, path, proc, now):
+            self.cmd_base = cmd_base
+            self.node = node
+            self.path = path
+            self.proc = proc
+            self.active = 0
+            self.last = now
+
+        def alive(self, now, idle):
+            """Is master connection (possibly) still alive?"""
+            if self.active > 0:
+                return True
+            if now - self.last > idle:
+                return False
+            # starting or started
+            return self.proc.poll() is None or os.path.exists(self.path)
+
+        def close(self):
+            """Ask master connection to exit."""
+            if self.proc.poll() is None:
+                self.proc.kill()
+                self.proc.wait()
+            if os.path.exists(self.path):
+                devnull = open(os.devnull, 'r+')
+                try:
+                    call(self.cmd_base + ["-oControlPath=%s" % self.path,
+                                          "-O", "exit", self.node],
+                         stdin=devnull, stdout=devnull, stderr=devnull,
+                         close_fds=True)
+                finally:
+                    devnull.close()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dir = None
+        # (user, node) -> _Master
+        self._masters = {}
+
+    def _control_path(self, user, node):
+        """Get control socket path for user@node (kept short)."""
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="clush-")
+        return os.path.join(self._dir,
+                            md5("%s@%s" % (user, node)).hexdigest()[:16])
+
+    def _evict(self, now, idle, maxmasters):
+        """Forget dead masters and make room for a new master. Return
+        False if all masters are in use."""
+        lru = None
+        for key, master in self._masters.items():
+            if not master.alive(now, idle):
+                del self._masters[key]
+            elif master.active == 0 and \
+                    (lru is None or master.last < self._masters[lru].last):
+                lru = key
+        if len(self._masters) >= maxmasters and lru is not None:
+            self._masters.pop(lru).close()
+        return len(self._masters) < maxmasters
+
+    def acquire(self, task, cmd_base, user, node):
+        """
+        Get a master connection for node, starting it if needed, and
+        return ssh options to use it (possibly an empty list).
+        """
+        idle = task.info("ssh_multiplex_idle", 60)
+        maxmasters = task.info("ssh_multiplex_max", 256)
+        self._lock.acquire()
+        try:
+            now = time.time()
+            master = self._masters.get((user, node))
+            if master is None or not master.alive(now, idle):
+                if not self._evict(now, idle, maxmasters):
+                    return []
+                path = self._control_path(user, node)
+                devnull = open(os.devnull, 'r+')
+                try:
+                    # ssh forks in background once authenticated
+                    proc = Popen(cmd_base + ["-oControlPath=%s" % path,
+                                             "-oControlMaster=yes",
+                                             "-oControlPersist=%d" % idle,
+                                             "-f", "-N", node],
+                                 stdin=devnull, stdout=devnull,
+                                 stderr=devnull, close_fds=True)
+                finally:
+                    devnull.close()
+                master = self._masters[(user, node)] = \
+                    self._Master(cmd_base, node, path, proc, now)
+            master.active += 1
+            master.last = now
+            return ["-oControlPath=%s" % master.path, "-oControlMaster=no"]
+        finally:
+            self._lock.release()
+
+    def release(self, user, node):
+        """Release master connection of node after use."""
+        self._lock.acquire()
+        try:
+            master = self._masters.get((user, node))
+            if master is not None and master.active > 0:
+                master.active -= 1
+                master.last = time.time()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """Close all master connections."""
+        self._lock.acquire()
+        try:
+            for master in self._masters.values():
+                master.close()
+            self._masters.clear()
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = None
+        finally:
+            self._lock.release()
+
+SSH_MASTER_POOL = SshMasterPool()
+atexit.register(SSH_MASTER_POOL.close)
+
+
+def ssh_base_command(task, user):
+    """
+    Build base ssh command (without destination) from task info.
+    """
+    cmd_l = [ task.info("ssh_path") or "ssh", "-a", "-x"  ]
+
+    if user:
+        cmd_l.append("-l")
+        cmd_l.append(user)
+
+    connect_timeout = task.info("connect_timeout", 0)
+    if connect_timeout > 0:
+        cmd_l.append("-oConnectTimeout=%d" % connect_timeout)
+
+    # Disable passphrase/password querying
+    cmd_l.append("-oBatchMode=yes")
+
+    # Add custom ssh options
+    ssh_options = task.info("ssh_options")
+    if ssh_options:
+        cmd_l += ssh_options.split()
+
+    return cmd_l
+
+
 class Ssh(EngineClient):
     """
     Ssh EngineClient.
@@ -60,6 +235,22 @@ class Ssh(EngineClient):
         self.key = copy.copy(node)
         self.command = command
         self.popen = None
+        # reuse a master connection (see SshMasterPool)
+        self.multiplex = getattr(worker, 'multiplex', False)
+        self._muxed = False
+        self._mux_user = None
+
+    def _mux_options(self, task, ssh_base, user):
+        """
+        Get options to use a shared master connection, if enabled.
+        """
+        if not self.multiplex:
+            return []
+        options = SSH_MASTER_POOL.acquire(task, ssh_base, user, self.key)
+        if options:
+            self._muxed = True
+            self._mux_user = user
+        return options
 
     def _start(self):
         """
@@ -68,24 +259,9 @@ class Ssh(EngineClient):
         task = self.worker.task
 
         # Build ssh command
-        cmd_l = [ task.info("ssh_path") or "ssh", "-a", "-x"  ]
-
         user = task.info("ssh_user")
-        if user:
-            cmd_l.append("-l")
-            cmd_l.append(user)
-
-        connect_timeout = task.info("connect_timeout", 0)
-        if connect_timeout > 0:
-            cmd_l.append("-oConnectTimeout=%d" % connect_timeout)
-
-        # Disable passphrase/password querying
-        cmd_l.append("-oBatchMode=yes")
-
-        # Add custom ssh options
-        ssh_options = task.info("ssh_options")
-        if ssh_options:
-            cmd_l += ssh_options.split()
+        cmd_l = ssh_base_command(task, user)
+        cmd_l += self._mux_options(task, cmd_l[:], user)
 
         cmd_l.append("%s" % self.key)
         cmd_l.append("%s" % self.command)
@@ -104,7 +280,7 @@ class Ssh(EngineClient):
         if flush and self._rbuf:
             # We still have some read data available in buffer, but no
             # EOL. Generate a final message before closing.
-            self.worker._on_node_msgline(self.key, self._rbuf)
+            self.worker._on_node_msgline(self.key, str(self._rbuf))
 
         rc = -1
         if abort:
@@ -116,6 +292,10 @@ class Ssh(EngineClient):
         if prc >= 0:
             rc = prc
 
+        if self._muxed:
+            SSH_MASTER_POOL.release(self._mux_user, self.key)
+            self._muxed = False
+
         os.close(self.fd_reader)
         self.fd_reader = None
         if self.fd_error:
@@ -142,14 +322,12 @@ class Ssh(EngineClient):
         worker = self.worker
         task = worker.task
         key = self.key
-        node_msgline = worker._on_node_msgline
-        debug = task.info("debug", False)
-        if debug:
+        msgs = self._readlines()
+        if task.info("debug", False):
             print_debug = task.info("print_debug")
-        for msg in self._readlines():
-            if debug:
+            for msg in msgs:
                 print_debug(task, "%s: %s" % (key, msg))
-            node_msgline(key, msg)  # handle full msg line
+        worker._on_node_msglines(key, msgs)  # handle full msg lines
 
     def _handle_error(self):
         """
@@ -159,14 +337,12 @@ class Ssh(EngineClient):
         worker = self.worker
         task = worker.task
         key = self.key
-        node_errline = worker._on_node_errline
-        debug = task.info("debug", False)
-        if debug:
+        msgs = self._readerrlines()
+        if task.info("debug", False):
             print_debug = task.info("print_debug")
-        for msg in self._readerrlines():
-            if debug:
+            for msg in msgs:
                 print_debug(task, "%s@STDERR: %s" % (key, msg))
-            node_errline(key, msg)  # handle full stderr line
+        worker._on_node_errlines(key, msgs)  # handle full stderr lines
 
 
 class Scp(Ssh):
@@ -230,6 +406,7 @@ class Scp(Ssh):
                 cmd_l += ssh_options.split()
 
         user = task.info("scp_user") or task.info("ssh_user")
+        cmd_l += self._mux_options(task, ssh_base_command(task, user), user)
         if self.reverse:
             if user:
                 cmd_l.append("%s@%s:%s" % (user, self.key, self.source))
@@ -269,6 +446,9 @@ class WorkerSsh(DistantWorker):
        ...                    dest="/etc/my.conf")
        >>> task.schedule(worker)      # schedule worker for execution
        >>> task.resume()              # run
+
+    If the multiplex parameter is set to True, ssh and scp commands
+    share per node master connections (see SshMasterPool).
     """
 
     def __init__(self, nodes, handler, timeout, **kwargs):
@@ -284,6 +464,7 @@ class WorkerSsh(DistantWorker):
         self.dest = kwargs.get('dest')
         autoclose = kwargs.get('autoclose', False)
         stderr = kwargs.get('stderr', False)
+        self.multiplex = kwargs.get('multiplex', False)
         self._close_count = 0
         self._has_timeout = False
 
@@ -0,0 +1,309 @@
+#
+# Copyright CEA/DAM/DIF (2011)
+#  Contributor: Stephane THIELL <stephane.thiell@cea.fr>
+#
+# This file is part of the ClusterShell library.
+#
+# This software is governed by the CeCILL-C license under French law and
+# abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL-C
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# "http://www.cecill.info".
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# In this respect, the user's attention is drawn to the risks associated
+# with loading,  using,  modifying and/or developing or reproducing the
+# software by the user in light of its specific status of free software,
+# that may mean  that it is complicated to manipulate,  and  that  also
+# therefore means  that it is reserved for developers  and  experienced
+# professionals having in-depth computer knowledge. Users are therefore
+# encouraged to load and test the software's suitability as regards their
+# requirements in conditions enabling the security of their systems and/or
+# data to be ensured and,  more generally, to use and operate it in the
+# same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+#
+
+"""
+ClusterShell tree mode support
+
+This module implements a worker propagating commands through gateway
+nodes. Each gateway runs a ClusterShell agent (see ClusterShell.Gateway)
+which executes the command on its target nodes with its own fanout, and
+streams gathered results back, so that the local fanout only applies
+to gateways and identical outputs cross the network once.
+"""
+
+import os
+
+from ClusterShell.Gateway import GATEWAY_INFO_KEYS
+from ClusterShell.Gateway import decode_record, encode_request
+from ClusterShell.NodeSet import NodeSet
+from ClusterShell.Worker.EngineClient import EngineClient
+from ClusterShell.Worker.Ssh import Ssh, ssh_base_command
+from ClusterShell.Worker.Worker import DistantWorker
+
+
+# Default remote command starting the gateway agent
+GATEWAY_AGENT = "python -m ClusterShell.Gateway"
+
+# Extra delay before killing a gateway on command timeout, leaving it
+# the time to report results and timeouts of its target nodes
+GATEWAY_TIMEOUT_GRACE = 5
+
+
+class GatewayClient(EngineClient):
+    """
+    Gateway EngineClient: runs the gateway agent (through ssh) and
+    replays streamed results of its target nodes on the worker.
+    """
+
+    def __init__(self, gateway, nodes, command, worker, stderr, timeout,
+                 autoclose=False):
+        """
+        Initialize GatewayClient instance.
+        """
+        if timeout:
+            client_timeout = timeout + GATEWAY_TIMEOUT_GRACE
+        else:
+            client_timeout = timeout
+        # always separate agent stderr from the records stream
+        EngineClient.__init__(self, worker, True, client_timeout, autoclose)
+
+        self.key = gateway
+        self.nodes = NodeSet(nodes)
+        self.command = command
+        self.popen = None
+        self._node_stderr = stderr
+        self._cmd_timeout = timeout
+        self._unreported = set(self.nodes)
+        self._failure = None
+
+    def _start(self):
+        """
+        Start gateway agent and send command request.
+        """
+        task = self.worker.task
+
+        gateway_cmd = task.info("tree_gateway_cmd")
+        if gateway_cmd:
+            cmd = gateway_cmd % { 'gateway': self.key }
+            shell = True
+        else:
+            cmd = ssh_base_command(task, task.info("ssh_user"))
+            cmd += [self.key, GATEWAY_AGENT]
+            shell = False
+
+        if task.info("debug", False):
+            task.info("print_debug")(task, "GATEWAY %s: %s" % (self.key,
+                                     cmd if shell else ' '.join(cmd)))
+
+        info = {}
+        for key in GATEWAY_INFO_KEYS:
+            value = task.info(key)
+            if value is not None:
+                info[key] = value
+
+        # request is buffered until the engine registers the writer
+        self._write(encode_request(self.command, self.nodes,
+                                   self._cmd_timeout, self._node_stderr,
+                                   info) + '\n')
+        self._set_write_eof()
+        self.popen = self._exec_nonblock(cmd, shell=shell)
+        self.worker._on_start()
+        return self
+
+    def _close(self, abort, flush, timeout):
+        """
+        Close client. See EngineClient._close().
+        """
+        if abort:
+            prc = self.popen.poll()
+            if prc is None:
+                # process is still running, kill it
+                self.popen.kill()
+        prc = self.popen.wait()
+
+        os.close(self.fd_reader)
+        self.fd_reader = None
+        if self.fd_error:
+            os.close(self.fd_error)
+            self.fd_error = None
+        if self.fd_writer:
+            os.close(self.fd_writer)
+            self.fd_writer = None
+
+        # nodes not reported by the gateway: report timeout or failure
+        worker = self.worker
+        for node in NodeSet.fromlist(self._unreported):
+            if timeout:
+                worker._on_node_timeout(node)
+                continue
+            if self._failure is None:
+                self._failure = "gateway %s exited with status %d" % \
+                                (self.key, prc)
+            msg = "clush: %s: %s" % (node, self._failure)
+            if self._node_stderr:
+                worker._on_node_errline(node, msg)
+            else:
+                worker._on_node_msgline(node, msg)
+            worker._on_node_rc(node, 255)
+        self._unreported.clear()
+
+        worker._check_fini()
+
+    def _handle_read(self):
+        """
+        Handle a read notification: decode results records.
+        """
+        worker = self.worker
+        task = worker.task
+        for line in self._readlines():
+            try:
+                records = decode_record(line)
+            except ValueError:
+                # not a records line (eg. login banner)
+                if task.info("debug", False):
+                    task.info("print_debug")(task, "%s: %s" % (self.key,
+                                                               line))
+                continue
+            for record in records:
+                self._on_record(record)
+
+    def _on_record(self, record):
+        """
+        Replay a gateway record on the worker.
+        """
+        worker = self.worker
+        kind = record[0]
+        if kind == "o":
+            msgs = record[1].split('\n')
+            for node in NodeSet(record[2]):
+                worker._on_node_msglines(node, msgs)
+        elif kind == "e":
+            msgs = record[1].split('\n')
+            for node in NodeSet(record[2]):
+                worker._on_node_errlines(node, msgs)
+        elif kind == "r":
+            for node in NodeSet(record[2]):
+                self._unreported.discard(node)
+                worker._on_node_rc(node, record[1])
+        elif kind == "t":
+            for node in NodeSet(record[1]):
+                self._unreported.discard(node)
+                worker._on_node_timeout(node)
+        elif kind == "x":
+            self._failure = "gateway %s: %s" % (self.key, record[1])
+
+    def _handle_error(self):
+        """
+        Handle a read error (stderr) notification: agent messages are
+        only displayed in debug mode, the last one is kept to report
+        failures.
+        """
+        task = self.worker.task
+        for msg in self._readerrlines():
+            if task.info("debug", False):
+                task.info("print_debug")(task, "%s@STDERR: %s" % (self.key,
+                                                                  msg))
+            if msg:
+                self._failure = "gateway %s: %s" % (self.key, msg)
+
+
+class WorkerTree(DistantWorker):
+    """
+    ClusterShell tree mode worker Class.
+
+    Nodes are reached through the gateways of the routes dictionary
+    (gateway: nodeset), other nodes are reached directly with ssh.
+       >>> worker = WorkerTree("node[1-1024]", handler=MyEventHandler(),
+       ...                     timeout=30, command="/bin/hostname",
+       ...                     routes={ "gw1": "node[1-512]",
+       ...                              "gw2": "node[513-1024]" })
+       >>> task.schedule(worker)      # schedule worker for execution
+       >>> task.resume()              # run
+
+    Standard input (write()) is only supported for directly reached
+    nodes.
+    """
+
+    def __init__(self, nodes, handler, timeout, **kwargs):
+        """
+        Initialize Tree worker instance.
+        """
+        DistantWorker.__init__(self, handler)
+
+        self.clients = []
+        self.direct_clients = []
+        self.nodes = NodeSet(nodes)
+        self.command = kwargs['command']
+        autoclose = kwargs.get('autoclose', False)
+        stderr = kwargs.get('stderr', False)
+        self.multiplex = kwargs.get('multiplex', False)
+        self._close_count = 0
+        self._has_timeout = False
+
+        direct = NodeSet(self.nodes)
+        routes = kwargs.get('routes') or {}
+        for gateway in sorted(routes):
+            targets = direct.intersection(routes[gateway])
+            if len(targets) > 0:
+                direct.difference_update(targets)
+                self.clients.append(GatewayClient(gateway, targets,
+                    self.command, self, stderr, timeout, autoclose))
+        for node in direct:
+            self.direct_clients.append(Ssh(node, self.command, self,
+                                           stderr, timeout, autoclose))
+        self.clients += self.direct_clients
+
+    def _engine_clients(self):
+        """
+        Access underlying engine clients.
+        """
+        return self.clients
+
+    def _on_node_rc(self, node, rc):
+        DistantWorker._on_node_rc(self, node, rc)
+        self._close_count += 1
+
+    def _on_node_timeout(self, node):
+        DistantWorker._on_node_timeout(self, node)
+        self._close_count += 1
+        self._has_timeout = True
+
+    def _check_fini(self):
+        if self._close_count >= len(self.nodes):
+            handler = self.eh
+            if handler:
+                if self._has_timeout:
+                    handler.ev_timeout(self)
+                handler.ev_close(self)
+
+    def write(self, buf):
+        """
+        Write to directly reached nodes.
+        """
+        for c in self.direct_clients:
+            c._write(buf)
+
+    def set_write_eof(self):
+        """
+        Tell worker to close its writer file descriptor once flushed. Do not
+        perform writes after this call.
+        """
+        for c in self.direct_clients:
+            c._set_write_eof()
+
+    def abort(self):
+        """
+        Abort processing any action by this worker.
+        """
+        for c in self.clients:
+            c.abort()
@@ -165,6 +165,24 @@ class DistantWorker(Worker):
         if handler is not None:
             handler.ev_read(self)
 
+    def _on_node_msglines(self, node, msgs):
+        """
+        Messages received from node (batch of lines read at once), see
+        _on_node_msgline().
+        """
+        task = self.task
+        handler = self.eh
+        msgtree = task._msgtree
+        source = (self, node)
+
+        self.current_node = node
+        for msg in msgs:
+            self.current_msg = msg
+            if msgtree is not None:
+                msgtree.add(source, msg)
+            if handler is not None:
+                handler.ev_read(self)
+
     def _on_node_errline(self, node, msg):
         """
         Error message received from node, update last* stuffs.
@@ -181,6 +199,24 @@ class DistantWorker(Worker):
         if handler is not None:
             handler.ev_error(self)
 
+    def _on_node_errlines(self, node, msgs):
+        """
+        Error messages received from node (batch of lines read at once),
+        see _on_node_errline().
+        """
+        task = self.task
+        handler = self.eh
+        errtree = task._errtree
+        source = (self, node)
+
+        self.current_node = node
+        for msg in msgs:
+            self.current_errmsg = msg
+            if errtree is not None:
+                errtree.add(source, msg)
+            if handler is not None:
+                handler.ev_error(self)
+
     def _on_node_rc(self, node, rc):
         """
         Return code received from a node, update last* stuffs.
@@ -280,6 +316,25 @@ class DistantWorker(Worker):
                             self.task._errtree.walk, match_keys, self):
             yield msg, NodeSet.fromlist(keys)
 
+    def pop_buffers(self, keys):
+        """
+        Remove buffers of the given keys (ie. nodes) and return an
+        iterator over removed buffers and associated NodeSet. Useful to
+        display results of completed nodes while others are running.
+        """
+        self._task_bound_check()
+        popped = self.task._pop_buffers_by_worker(self, keys)
+        return ((msg, NodeSet.fromlist(nodes)) for msg, nodes in popped)
+
+    def pop_errors(self, keys):
+        """
+        Remove error buffers of the given keys (ie. nodes) and return an
+        iterator over removed error buffers and associated NodeSet.
+        """
+        self._task_bound_check()
+        popped = self.task._pop_errors_by_worker(self, keys)
+        return ((msg, NodeSet.fromlist(nodes)) for msg, nodes in popped)
+
     def iter_node_buffers(self, match_keys=None):
         """
         Returns an iterator over each node and associated buffer.
@@ -391,7 +446,7 @@ class WorkerSimple(EngineClient, Worker):
         if flush and self._rbuf:
             # We still have some read data available in buffer, but no
             # EOL. Generate a final message before closing.
-            self.worker._on_msgline(self._rbuf)
+            self.worker._on_msgline(str(self._rbuf))
 
         if self.fd_reader:
             os.close(self.fd_reader)
@@ -422,8 +477,7 @@ class WorkerSimple(EngineClient, Worker):
                 print_debug(task, "LINE %s" % msg)
                 msgline(msg)
         else:
-            for msg in self._readlines():
-                msgline(msg)
+            self._on_msglines(self._readlines())
 
     def _handle_error(self):
         """
@@ -467,6 +521,20 @@ class WorkerSimple(EngineClient, Worker):
         if self.eh:
             self.eh.ev_read(self)
 
+    def _on_msglines(self, msgs):
+        """
+        Add messages (batch of lines read at once).
+        """
+        msgtree = self.task._msgtree
+        source = (self, self.key)
+        handler = self.eh
+        for msg in msgs:
+            self.current_msg = msg
+            if msgtree is not None:
+                msgtree.add(source, msg)
+            if handler:
+                handler.ev_read(self)
+
     def _on_errmsgline(self, msg):
         """
         Add a message.
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# ClusterShell.NodeSet test suite
+
+"""Unit test for NodeSet"""
+
+import unittest
+
+from ClusterShell.NodeSet import NodeSet
+
+
+class NodeSetTest(unittest.TestCase):
+
+    def testIsSubSetString(self):
+        """test NodeSet.issubset() with a string argument"""
+        nodeset = NodeSet("n[1-2]")
+        self.assertTrue(nodeset.issubset("n[1-5]"))
+        self.assertFalse(nodeset.issubset("n[2-5]"))
+        self.assertTrue(nodeset.issubset(NodeSet("n[1-5]")))
+
+    def testIsSuperSetString(self):
+        """test NodeSet.issuperset() with a string argument"""
+        nodeset = NodeSet("n[1-5]")
+        self.assertTrue(nodeset.issuperset("n[1-2]"))
+        self.assertFalse(nodeset.issuperset("n[5-6]"))
+
+    def testUpdateNPadding(self):
+        """test NodeSet.updaten() padding fallback on the target"""
+        nodeset = NodeSet("n18")
+        nodeset.updaten(["n086", "n165"])
+        self.assertEqual(str(nodeset), "n[18,86,165]")
+        nodeset = NodeSet("n018")
+        nodeset.updaten(["n86", "n165"])
+        self.assertEqual(str(nodeset), "n[018,086,165]")
+        self.assertEqual(str(NodeSet.fromlist(["n086", "n165"])),
+                         "n[086,165]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# ClusterShell.NodeUtils test suite
+
+"""Unit test for NodeUtils persistent upcall cache"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ClusterShell.NodeUtils import GroupSource
+
+
+class GroupSourceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+        self.groups_dir = os.path.join(self.tmpdir, "groups")
+        os.mkdir(self.groups_dir)
+        self.set_group("a", "n[1-2]")
+        self.set_group("b", "n[3-4]")
+        self.set_group("c", "n5")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def set_group(self, group, nodes):
+        groupfile = open(os.path.join(self.groups_dir, group), "w")
+        groupfile.write(nodes + "\n")
+        groupfile.close()
+
+    def upcall_count(self, upcall):
+        """Number of invocations of upcall (map or batchmap)."""
+        try:
+            logfile = open(os.path.join(self.tmpdir, "%s.log" % upcall))
+        except IOError:
+            return 0
+        try:
+            return len(logfile.readlines())
+        finally:
+            logfile.close()
+
+    def make_source(self, batchmap=False, cache_time=60,
+                    cache_stale_time=60):
+        """New source (empty memory cache) sharing the persistent cache."""
+        map_upcall = "echo $GROUP >> %s/map.log; cat %s/$GROUP" % \
+                        (self.tmpdir, self.groups_dir)
+        batchmap_upcall = None
+        if batchmap:
+            batchmap_upcall = "echo $GROUPS >> %s/batchmap.log; " \
+                "for g in $GROUPS; do [ -f %s/$g ] && " \
+                "echo \"$g: `cat %s/$g`\"; done; true" % \
+                (self.tmpdir, self.groups_dir, self.groups_dir)
+        return GroupSource("test", map_upcall,
+                           batchmap_upcall=batchmap_upcall,
+                           cache_time=cache_time,
+                           cache_stale_time=cache_stale_time,
+                           cache_dir=self.cache_dir)
+
+    def age_cache(self, source, seconds):
+        """Make the persistent cache entries older."""
+        conn = source._upcall_cache._connection()
+        conn.execute("UPDATE upcall SET stamp = stamp - ?", (seconds,))
+        conn.commit()
+
+    def wait_refresh(self, source):
+        refresher = source._refresher
+        if refresher is not None:
+            refresher.join(10)
+        self.assertTrue(source._refresher is None)
+
+    def testCacheHit(self):
+        """test persistent upcall cache hit within cache_time"""
+        self.assertEqual(self.make_source().resolv_map("a"), "n[1-2]")
+        self.assertEqual(self.upcall_count("map"), 1)
+        self.set_group("a", "n[1-3]")
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-2]")
+        self.assertEqual(self.upcall_count("map"), 1)
+        self.assertTrue(source._refresher is None)
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir,
+                                                    "test.db")))
+
+    def testStaleRefresh(self):
+        """test stale upcall cache hit refreshed in background"""
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-2]")
+        self.set_group("a", "n[1-3]")
+        self.age_cache(source, 90)
+        # the stale output is used while being refreshed
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-2]")
+        self.wait_refresh(source)
+        self.assertEqual(self.upcall_count("map"), 2)
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-3]")
+        self.assertEqual(self.upcall_count("map"), 2)
+
+    def testStaleRefreshBatchmap(self):
+        """test stale map entries refreshed with one batchmap upcall"""
+        source = self.make_source(batchmap=True)
+        self.assertEqual(source.resolv_maps(["a", "b", "c"]),
+                         {"a": "n[1-2]", "b": "n[3-4]", "c": "n5"})
+        self.assertEqual(self.upcall_count("batchmap"), 1)
+        self.set_group("b", "n[3-6]")
+        self.age_cache(source, 90)
+        source = self.make_source(batchmap=True)
+        self.assertEqual(source.resolv_maps(["a", "b", "c"]),
+                         {"a": "n[1-2]", "b": "n[3-4]", "c": "n5"})
+        self.wait_refresh(source)
+        self.assertEqual(self.upcall_count("batchmap"), 2)
+        self.assertEqual(self.upcall_count("map"), 0)
+        source = self.make_source(batchmap=True)
+        self.assertEqual(source.resolv_maps(["a", "b", "c"]),
+                         {"a": "n[1-2]", "b": "n[3-6]", "c": "n5"})
+        self.assertEqual(self.upcall_count("batchmap"), 2)
+
+    def testExpired(self):
+        """test upcall cache entry expired past cache_stale_time"""
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-2]")
+        self.set_group("a", "n[1-3]")
+        self.age_cache(source, 150)
+        source = self.make_source()
+        self.assertEqual(source.resolv_map("a"), "n[1-3]")
+        self.assertEqual(self.upcall_count("map"), 2)
+        self.assertTrue(source._refresher is None)
+
+    def testNoCache(self):
+        """test upcalls without persistent cache"""
+        source = self.make_source(cache_time=0)
+        self.assertEqual(source.resolv_map("a"), "n[1-2]")
+        self.assertEqual(self.make_source(cache_time=0).resolv_map("a"),
+                         "n[1-2]")
+        self.assertEqual(self.upcall_count("map"), 2)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def testBatchmap(self):
+        """test batchmap results matching per group map results"""
+        groups = ["a", "b", "c", "d"]
+        self.set_group("d", "n[6-8],n9")
+        expected = self.make_source(cache_time=0).resolv_maps(groups)
+        self.assertEqual(expected, dict((group,
+            self.make_source(cache_time=0).resolv_map(group)) \
+                for group in groups))
+        map_count = self.upcall_count("map")
+        source = self.make_source(batchmap=True, cache_time=0)
+        self.assertEqual(source.resolv_maps(groups), expected)
+        self.assertEqual(self.upcall_count("batchmap"), 1)
+        self.assertEqual(self.upcall_count("map"), map_count)
+
+    def testBatchmapMissingGroup(self):
+        """test map fallback for groups missing in batchmap output"""
+        source = self.make_source(batchmap=True)
+        os.unlink(os.path.join(self.groups_dir, "c"))
+        self.assertEqual(source.resolv_maps(["a", "b"]),
+                         {"a": "n[1-2]", "b": "n[3-4]"})
+        self.set_group("c", "n5")
+        self.assertEqual(source.resolv_maps(["a", "c"]),
+                         {"a": "n[1-2]", "c": "n5"})
+        self.assertEqual(self.upcall_count("batchmap"), 2)
+        self.assertEqual(self.upcall_count("map"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
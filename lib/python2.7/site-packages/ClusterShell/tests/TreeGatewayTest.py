@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# ClusterShell tree mode test suite
+
+"""Unit test for Gateway and WorkerTree"""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+import ClusterShell
+from ClusterShell.Gateway import decode_record, decode_request
+from ClusterShell.Gateway import encode_record, encode_request
+from ClusterShell.NodeSet import NodeSet
+from ClusterShell.Task import task_self
+import ClusterShell.Worker.Tree
+from ClusterShell.Worker.Tree import WorkerTree
+
+
+# fake ssh running the command locally: the last two arguments are the
+# host (exported as $HOST) and the command
+FAKE_SSH = """#!/bin/sh
+for cmd; do :; done
+host=$(eval echo \\${$(($# - 1))})
+HOST=$host exec sh -c "$cmd"
+"""
+
+# gateway command template running the agent locally, "gwfail" exits
+# without running it and "gwslow" never answers
+GATEWAY_CMD = "case %%(gateway)s in gwfail) exit 3;; " \
+              "gwslow) exec sleep 10;; esac; " \
+              "PYTHONPATH=%s exec %s -m ClusterShell.Gateway"
+
+
+class GatewayProtocolTest(unittest.TestCase):
+
+    def testRequestRoundTrip(self):
+        """test gateway request encoding of non-ASCII byte strings"""
+        line = encode_request("echo \xc3\xa9\xff", NodeSet("n[1-3]"), 5,
+                              True, {"ssh_options": "-oUser=\xe9",
+                                     "fanout": 8})
+        self.assertTrue('\n' not in line)
+        request = decode_request(line)
+        self.assertEqual(request["command"], "echo \xc3\xa9\xff")
+        self.assertEqual(type(request["command"]), str)
+        self.assertEqual(request["nodes"], "n[1-3]")
+        self.assertEqual(request["timeout"], 5)
+        self.assertEqual(request["stderr"], True)
+        self.assertEqual(request["info"], {"ssh_options": "-oUser=\xe9",
+                                           "fanout": 8})
+
+    def testRecordRoundTrip(self):
+        """test gateway record encoding of non-ASCII byte strings"""
+        records = [["o", "caf\xc3\xa9\n\xff\x00", "n[1-2]"],
+                   ["e", "", "n3"],
+                   ["r", 255, "n[1-3]"],
+                   ["t", "n4"],
+                   ["x", "error \xe9"]]
+        line = encode_record(records)
+        self.assertTrue('\n' not in line)
+        decoded = decode_record(line)
+        self.assertEqual(decoded, records)
+        self.assertEqual(type(decoded[0][1]), str)
+
+    def testDecodeRecordBanner(self):
+        """test decoding a line which is not a records line"""
+        self.assertRaises(ValueError, decode_record, "Welcome to gw1!")
+        self.assertRaises(ValueError, decode_record, "Welcome")
+        self.assertRaises(ValueError, decode_record, "")
+
+
+class WorkerTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        ssh_path = os.path.join(self.tmpdir, "ssh")
+        fake_ssh = open(ssh_path, "w")
+        fake_ssh.write(FAKE_SSH)
+        fake_ssh.close()
+        os.chmod(ssh_path, stat.S_IRWXU)
+        libdir = os.path.dirname(os.path.dirname(ClusterShell.__file__))
+        self.task = task_self()
+        self.task.set_info("ssh_path", ssh_path)
+        self.task.set_info("tree_gateway_cmd",
+                           GATEWAY_CMD % (libdir, sys.executable))
+        self.task.set_info("tree_flush_interval", 0.1)
+        self.grace = ClusterShell.Worker.Tree.GATEWAY_TIMEOUT_GRACE
+        ClusterShell.Worker.Tree.GATEWAY_TIMEOUT_GRACE = 1
+
+    def tearDown(self):
+        ClusterShell.Worker.Tree.GATEWAY_TIMEOUT_GRACE = self.grace
+        for key in ("ssh_path", "tree_gateway_cmd", "tree_flush_interval",
+                    "tree_routes"):
+            self.task.set_info(key, None)
+        shutil.rmtree(self.tmpdir)
+
+    def run_tree(self, command, nodes, routes, timeout=None):
+        self.task.set_info("tree_routes", routes)
+        worker = self.task.shell(command, nodes=nodes, stderr=True,
+                                 timeout=timeout)
+        self.task.resume()
+        return worker
+
+    def results(self, iterator):
+        return dict((str(msg), str(nodeset)) for msg, nodeset in iterator)
+
+    def testGatewayOutput(self):
+        """test WorkerTree results through gateways and direct nodes"""
+        worker = self.run_tree('echo "$HOST \xc3\xa9"; echo err >&2; '
+                               'case $HOST in n3) exit 2;; esac',
+                               "n[1-6]", {"gw1": "n[1-3]", "gw2": "n[4-5]"})
+        self.assertTrue(isinstance(worker, WorkerTree))
+        for node in NodeSet("n[1-6]"):
+            self.assertEqual(worker.node_buffer(node), "%s \xc3\xa9" % node)
+        self.assertEqual(self.results(worker.iter_errors()), {"err": "n[1-6]"})
+        self.assertEqual(self.results(worker.iter_retcodes()),
+                         {"0": "n[1-2,4-6]", "2": "n3"})
+        self.assertEqual(list(worker.iter_keys_timeout()), [])
+
+    def testGatewayFailure(self):
+        """test WorkerTree nodes of a failing gateway"""
+        worker = self.run_tree("echo ok", "n[1-4]",
+                               {"gw1": "n[1-2]", "gwfail": "n[3-4]"})
+        self.assertEqual(self.results(worker.iter_buffers()), {"ok": "n[1-2]"})
+        self.assertEqual(self.results(worker.iter_retcodes()),
+                         {"0": "n[1-2]", "255": "n[3-4]"})
+        self.assertEqual(worker.node_error("n3"),
+                         "clush: n3: gateway gwfail exited with status 3")
+
+    def testGatewayTimeout(self):
+        """test WorkerTree timeouts reported by and for gateways"""
+        worker = self.run_tree("case $HOST in n2) sleep 10;; esac; echo ok",
+                               "n[1-4]", {"gw1": "n[1-2]", "gwslow": "n[3-4]"},
+                               timeout=1)
+        self.assertEqual(self.results(worker.iter_retcodes()), {"0": "n1"})
+        self.assertEqual(str(NodeSet.fromlist(worker.iter_keys_timeout())),
+                         "n[2-4]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,7 +39,7 @@ from jinja2.loaders import BaseLoader, FileSystemLoader, PackageLoader, \
 
 # bytecode caches
 from jinja2.bccache import BytecodeCache, FileSystemBytecodeCache, \
-     MemcachedBytecodeCache
+     MemcachedBytecodeCache, SQLiteBytecodeCache
 
 # undefined types
 from jinja2.runtime import Undefined, DebugUndefined, StrictUndefined
@@ -51,7 +51,7 @@ from jinja2.exceptions import TemplateError, UndefinedError, \
 
 # decorators and public utilities
 from jinja2.filters import environmentfilter, contextfilter, \
-     evalcontextfilter
+     evalcontextfilter, volatilefilter
 from jinja2.utils import Markup, escape, clear_caches, \
      environmentfunction, evalcontextfunction, contextfunction, \
      is_undefined
@@ -60,10 +60,10 @@ __all__ = [
     'Environment', 'Template', 'BaseLoader', 'FileSystemLoader',
     'PackageLoader', 'DictLoader', 'FunctionLoader', 'PrefixLoader',
     'ChoiceLoader', 'BytecodeCache', 'FileSystemBytecodeCache',
-    'MemcachedBytecodeCache', 'Undefined', 'DebugUndefined',
-    'StrictUndefined', 'TemplateError', 'UndefinedError', 'TemplateNotFound',
+    'MemcachedBytecodeCache', 'SQLiteBytecodeCache', 'Undefined',
+    'DebugUndefined', 'StrictUndefined', 'TemplateError', 'UndefinedError', 'TemplateNotFound',
     'TemplatesNotFound', 'TemplateSyntaxError', 'TemplateAssertionError',
     'ModuleLoader', 'environmentfilter', 'contextfilter', 'Markup', 'escape',
     'environmentfunction', 'contextfunction', 'clear_caches', 'is_undefined',
-    'evalcontextfilter', 'evalcontextfunction'
+    'evalcontextfilter', 'evalcontextfunction', 'volatilefilter'
 ]
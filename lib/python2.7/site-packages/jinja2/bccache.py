@@ -14,10 +14,14 @@
     :copyright: (c) 2010 by the Jinja Team.
     :license: BSD.
 """
-from os import path, listdir
+from os import path, listdir, getpid
+import os
 import sys
+import errno
 import marshal
 import tempfile
+import threading
+from time import time
 import cPickle as pickle
 import fnmatch
 try:
@@ -299,3 +303,142 @@ class MemcachedBytecodeCache(BytecodeCache):
         if self.timeout is not None:
             args += (self.timeout,)
         self.client.set(*args)
+
+
+class SQLiteBytecodeCache(BytecodeCache):
+    """A bytecode cache that stores bytecode in a single SQLite database,
+    which can be shared by many processes (for example the workers of a
+    preforking server), so that each template is compiled only once.
+
+    `filename` is the path of the database file, by default a file in a
+    directory of the system temporary items folder that is created for the
+    current user and is only accessible by this user.  If `max_size` is given, the least
+    recently used templates are evicted when the total size of the cached
+    bytecode exceeds this number of bytes.  `timeout` is the number of
+    seconds to wait for a lock held by another process::
+
+        bcc = SQLiteBytecodeCache('/var/cache/jinja2.db', max_size=1 << 24)
+
+    Writes are atomic transactions, and the database uses write-ahead
+    logging when available so that readers are not blocked by writers.
+    The access time used for eviction is only updated if it is older than
+    `touch_interval` seconds, to avoid a write for each read.
+
+    This bytecode cache supports clearing of the cache using the clear
+    method, and :meth:`recent_templates` which is used by
+    :meth:`Environment.warm_cache`.
+
+    .. versionadded:: 2.7
+    """
+
+    def __init__(self, filename=None, max_size=None, timeout=30,
+                 touch_interval=60):
+        import sqlite3
+        self._sqlite3 = sqlite3
+        if filename is None:
+            directory = path.join(tempfile.gettempdir(),
+                                  '_jinja2_bytecode_cache')
+            if hasattr(os, 'getuid'):
+                directory += '_%d' % os.getuid()
+            try:
+                os.makedirs(directory, 0700)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+            if hasattr(os, 'getuid') and \
+               os.stat(directory).st_uid != os.getuid():
+                # the cached bytecode is executed, so it must not be
+                # writable by other users
+                raise RuntimeError('Bytecode cache directory %s is not '
+                                   'owned by the current user' % directory)
+            filename = path.join(directory, 'bytecode_cache.db')
+        self.filename = filename
+        self.max_size = max_size
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        db = self._get_connection()
+        db.execute('create table if not exists bytecode ('
+                   'key text primary key, name text, data blob, '
+                   'size integer, atime real)')
+        db.execute('create index if not exists bytecode_atime '
+                   'on bytecode (atime)')
+
+    def _get_connection(self):
+        # connections can neither be shared by threads nor inherited by
+        # forked processes
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != getpid():
+            db = self._sqlite3.connect(self.filename, timeout=self.timeout,
+                                       isolation_level=None)
+            db.text_factory = str
+            try:
+                db.execute('pragma journal_mode = wal')
+            except self._sqlite3.DatabaseError:
+                pass
+            self._local.db = db
+            self._local.pid = getpid()
+        return db
+
+    def get_bucket(self, environment, name, filename, source):
+        key = self.get_cache_key(name, filename)
+        checksum = self.get_source_checksum(source)
+        bucket = Bucket(environment, key, checksum)
+        bucket.name = name
+        self.load_bytecode(bucket)
+        return bucket
+
+    def load_bytecode(self, bucket):
+        db = self._get_connection()
+        row = db.execute('select data, atime from bytecode where key = ?',
+                         (bucket.key,)).fetchone()
+        if row is None:
+            return
+        bucket.bytecode_from_string(str(row[0]))
+        now = time()
+        if now - row[1] > self.touch_interval:
+            db.execute('update bytecode set atime = ? where key = ?',
+                       (now, bucket.key))
+
+    def dump_bytecode(self, bucket):
+        data = bucket.bytecode_to_string()
+        db = self._get_connection()
+        db.execute('begin immediate')
+        try:
+            db.execute('insert or replace into bytecode values (?, ?, ?, ?, ?)',
+                       (bucket.key, getattr(bucket, 'name', None),
+                        self._sqlite3.Binary(data), len(data), time()))
+            if self.max_size is not None:
+                self._evict(db)
+        except:
+            db.execute('rollback')
+            raise
+        db.execute('commit')
+
+    def _evict(self, db):
+        excess = db.execute('select sum(size) from bytecode').fetchone()[0] \
+            - self.max_size
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in db.execute('select key, size from bytecode '
+                                    'order by atime'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany('delete from bytecode where key = ?', keys)
+
+    def recent_templates(self, limit=None):
+        """Returns the names of the cached templates, most recently used
+        first.
+        """
+        query = 'select name from bytecode where name is not null ' \
+                'order by atime desc'
+        if limit is not None:
+            query += ' limit %d' % limit
+        return [row[0].decode('utf-8') for row in
+                self._get_connection().execute(query)]
+
+    def clear(self):
+        self._get_connection().execute('delete from bytecode')
@@ -100,6 +100,28 @@ def find_undeclared(nodes, names):
     return visitor.undeclared
 
 
+def find_rebound(node):
+    """Return the names that are assigned somewhere in the node, including
+    the targets and parameters of nested loops, macros and imports.
+    """
+    rv = set()
+    for child in node.find_all((nodes.Name, nodes.Macro, nodes.Import,
+                                nodes.FromImport)):
+        if isinstance(child, nodes.Name):
+            if child.ctx != 'load':
+                rv.add(child.name)
+        elif isinstance(child, nodes.Macro):
+            rv.add(child.name)
+        elif isinstance(child, nodes.Import):
+            rv.add(child.target)
+        else:
+            for name in child.names:
+                if isinstance(name, tuple):
+                    name = name[1]
+                rv.add(name)
+    return rv
+
+
 class Identifiers(object):
     """Tracks the status of identifiers in frames."""
 
@@ -168,6 +190,10 @@ class Frame(object):
         # a set of actually assigned names
         self.assigned_names = set()
 
+        # names that were resolved from the context into local variables
+        # of the current function which still hold the resolved value.
+        self.resolved_names = set()
+
         # the parent of this frame
         self.parent = parent
 
@@ -398,6 +424,9 @@ class CodeGenerator(NodeVisitor):
         self.tests = {}
         self.filters = {}
 
+        # the names assigned somewhere in the template
+        self.rebound_names = set()
+
         # the debug information
         self.debug_info = []
         self._write_debug_info = None
@@ -575,6 +604,10 @@ class CodeGenerator(NodeVisitor):
         """Pull all the references identifiers into the local scope."""
         for name in frame.identifiers.undeclared:
             self.writeline('l_%s = context.resolve(%r)' % (name, name))
+        frame.resolved_names = frame.resolved_names | (
+            frame.identifiers.undeclared -
+            frame.identifiers.declared_locally -
+            frame.identifiers.declared_parameter)
 
     def pull_dependencies(self, nodes):
         """Pull all the dependencies."""
@@ -759,6 +792,7 @@ class CodeGenerator(NodeVisitor):
     def visit_Template(self, node, frame=None):
         assert frame is None, 'no root frame allowed'
         eval_ctx = EvalContext(self.environment, self.name)
+        self.rebound_names = find_rebound(node)
 
         from jinja2.runtime import __all__ as exported
         self.writeline('from __future__ import division')
@@ -1074,6 +1108,15 @@ class CodeGenerator(NodeVisitor):
                 self.fail('Can\'t assign to special loop variable '
                           'in for-loop target', name.lineno)
 
+        # names the enclosing loops of the same function have resolved
+        # already are not resolved again for each iteration of them.  Names
+        # assigned anywhere in the template are resolved again because
+        # other loops may have overwritten the local variable, and nested
+        # loops only alias and restore the names their parent resolves.
+        if not node.recursive:
+            loop_frame.resolved_names = frame.resolved_names - \
+                self.rebound_names
+            loop_frame.identifiers.undeclared -= loop_frame.resolved_names
         self.pull_locals(loop_frame)
         if node.else_:
             iteration_indicator = self.temporary_identifier()
@@ -1256,8 +1299,8 @@ class CodeGenerator(NodeVisitor):
             else:
                 body.append([const])
 
-        # if we have less than 3 nodes or a buffer we yield or extend/append
-        if len(body) < 3 or frame.buffer is not None:
+        # if we have a single node or a buffer we yield or extend/append
+        if len(body) < 2 or frame.buffer is not None:
             if frame.buffer is not None:
                 # for one item we append, for more we extend
                 if len(body) == 1:
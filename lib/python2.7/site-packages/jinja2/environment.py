@@ -478,7 +478,7 @@ class Environment(object):
                 source_hint = source
                 source = self._parse(source, name, filename)
             if self.optimized:
-                source = optimize(source, self)
+                source = optimize(source, self, name)
             source = self._generate(source, name, filename,
                                     defer_init=defer_init)
             if raw:
@@ -620,6 +620,42 @@ class Environment(object):
 
         log_function('Finished compiling templates')
 
+    def warm_cache(self, names=None):
+        """Loads templates into the template cache, for example when a
+        process starts.  If a bytecode cache is configured, the templates are
+        loaded from it without being compiled.
+
+        If `names` is not given, the templates most recently used according
+        to the bytecode cache are loaded if it supports it (like
+        :class:`~jinja2.bccache.SQLiteBytecodeCache`), otherwise all the
+        templates of the loader.  No more templates than the size of the
+        template cache are loaded.  Templates which can't be loaded are
+        skipped.  Returns the number of loaded templates.
+
+        .. versionadded:: 2.7
+        """
+        if self.cache is None:
+            return 0
+        limit = getattr(self.cache, 'capacity', None)
+        if names is None:
+            recent_templates = getattr(self.bytecode_cache,
+                                       'recent_templates', None)
+            if recent_templates is not None:
+                names = recent_templates(limit)
+            else:
+                names = self.list_templates()
+        names = list(names)[:limit]
+        loaded = 0
+        # load the most important templates last so that they are the
+        # most recently used ones of the cache
+        for name in reversed(names):
+            try:
+                self.get_template(name)
+            except (TemplateNotFound, TemplateSyntaxError):
+                continue
+            loaded += 1
+        return loaded
+
     def list_templates(self, extensions=None, filter_func=None):
         """Returns a list of templates for this environment.  This requires
         that the loader supports the loader's
@@ -48,6 +48,18 @@ def environmentfilter(f):
     return f
 
 
+def volatilefilter(f):
+    """Decorator for marking filters that may return a different value
+    each time they are called with the same arguments.  Filters are
+    evaluated at compile time if all their arguments are constant, this
+    decorator prevents that.
+
+    .. versionadded:: 2.7
+    """
+    f.volatilefilter = True
+    return f
+
+
 def make_attrgetter(environment, attribute):
     """Returns a callable that looks up the given attribute from a
     passed object with the rules of the environment.  Dots are allowed
@@ -328,6 +340,7 @@ def do_last(environment, seq):
         return environment.undefined('No last item, sequence was empty.')
 
 
+@volatilefilter
 @environmentfilter
 def do_random(environment, seq):
     """Return a random item from the sequence."""
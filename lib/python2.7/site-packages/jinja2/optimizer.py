@@ -5,11 +5,16 @@
 
     The jinja optimizer is currently trying to constant fold a few expressions
     and modify the AST in place so that it should be easier to evaluate it.
+    Adjacent output nodes are merged so that the compiler can yield them
+    at once.
 
     Because the AST does not contain all the scoping information and the
     compiler has to find that out, we cannot do all the optimizations we
-    want.  For example loop unrolling doesn't work because unrolled loops would
-    have a different scoping.
+    want.  For example loops are only unrolled if they iterate over a small
+    constant sequence and their body does not depend on the scoping rules
+    of loops (no assignments to the loop variables, no `loop` variable, no
+    blocks, macros or imports, no names assigned elsewhere in the template
+    and no loop variables used outside of the loop).
 
     The solution would be a second syntax tree that has the scoping rules stored.
 
@@ -17,20 +22,40 @@
     :license: BSD.
 """
 from jinja2 import nodes
+from jinja2.compiler import find_rebound
 from jinja2.visitor import NodeTransformer
 
 
-def optimize(node, environment):
+def optimize(node, environment, name=None):
     """The context hint can be used to perform an static optimization
     based on the context given."""
-    optimizer = Optimizer(environment)
+    optimizer = Optimizer(environment, name)
     return optimizer.visit(node)
 
 
 class Optimizer(NodeTransformer):
 
-    def __init__(self, environment):
+    #: the maximum number of iterations of an unrolled loop
+    unroll_limit = 16
+
+    def __init__(self, environment, name=None):
         self.environment = environment
+        self.eval_ctx = nodes.EvalContext(environment, name)
+        # names assigned and names loaded in the template, see `visit_For`
+        self.rebound = None
+        self.loads = None
+
+    def visit_Template(self, node):
+        self.rebound = find_rebound(node)
+        self.loads = count_loads(node)
+        return self.generic_visit(node)
+
+    def generic_visit(self, node, *args, **kwargs):
+        node = NodeTransformer.generic_visit(self, node, *args, **kwargs)
+        for field, value in node.iter_fields():
+            if isinstance(value, list):
+                value[:] = merge_output(value)
+        return node
 
     def visit_If(self, node):
         """Eliminate dead code."""
@@ -39,13 +64,95 @@ class Optimizer(NodeTransformer):
         if node.find(nodes.Block) is not None:
             return self.generic_visit(node)
         try:
-            val = self.visit(node.test).as_const()
+            val = self.visit(node.test).as_const(self.eval_ctx)
         except nodes.Impossible:
             return self.generic_visit(node)
         if val:
             body = node.body
         else:
             body = node.else_
+        return self.visit_body(body)
+
+    def visit_EvalContextModifier(self, node):
+        """Track the eval context like the compiler does."""
+        node = self.generic_visit(node)
+        for keyword in node.options:
+            try:
+                val = keyword.value.as_const(self.eval_ctx)
+            except nodes.Impossible:
+                self.eval_ctx.volatile = True
+            else:
+                setattr(self.eval_ctx, keyword.key, val)
+        return node
+
+    def visit_ScopedEvalContextModifier(self, node):
+        saved_ctx = self.eval_ctx.save()
+        for keyword in node.options:
+            self.visit(keyword)
+        self.visit_EvalContextModifier(nodes.EvalContextModifier(
+            node.options, environment=self.environment))
+        node.body[:] = merge_output(self.visit_body(node.body))
+        self.eval_ctx.revert(saved_ctx)
+        return node
+
+    def visit_For(self, node):
+        """Unroll loops over small constant sequences."""
+        # the scoping of the names can only be checked for whole templates
+        if self.rebound is None:
+            return self.generic_visit(node)
+        loads = count_loads(node)
+        node = self.generic_visit(node)
+        if node.recursive or node.test is not None or node.else_:
+            return node
+        try:
+            seq = node.iter.as_const(self.eval_ctx)
+        except nodes.Impossible:
+            return node
+        if not isinstance(seq, (tuple, list)) or len(seq) > self.unroll_limit:
+            return node
+        if isinstance(node.target, nodes.Name):
+            targets = [node.target.name]
+            seq = [(item,) for item in seq]
+        elif isinstance(node.target, nodes.Tuple) and \
+             all(isinstance(x, nodes.Name) for x in node.target.items):
+            targets = [x.name for x in node.target.items]
+        else:
+            return node
+        # the names loaded by an unrolled body are resolved by the enclosing
+        # frame, which does not work if they are assigned in other frames.
+        # The loop variables must not be used outside of the loop either,
+        # they are not reset after an unrolled loop.
+        for name in targets:
+            if self.loads.get(name, 0) > loads.get(name, 0):
+                return node
+        for child in node.body:
+            for name in child.find_all(nodes.Name):
+                if name.name == 'loop' or \
+                   (name.ctx != 'load' and name.name in targets) or \
+                   (name.name in self.rebound and name.name not in targets):
+                    return node
+            if isinstance(child, _unroll_barriers) or \
+               child.find(_unroll_barriers) is not None:
+                return node
+        iterations = []
+        try:
+            for item in seq:
+                if not isinstance(item, (tuple, list)) or \
+                   len(item) != len(targets):
+                    return node
+                for value in item:
+                    nodes.Const.from_untrusted(value)
+                iterations.append(dict(zip(targets, item)))
+        except nodes.Impossible:
+            return node
+        result = []
+        for values in iterations:
+            result.extend(self.visit_body([substitute(child, values)
+                                           for child in node.body]))
+        return result
+
+    def visit_body(self, body):
+        """Visit a list of statements and return the new list."""
         result = []
         for node in body:
             result.extend(self.visit_list(node))
@@ -55,7 +162,7 @@ class Optimizer(NodeTransformer):
         """Do constant folding."""
         node = self.generic_visit(node)
         try:
-            return nodes.Const.from_untrusted(node.as_const(),
+            return nodes.Const.from_untrusted(node.as_const(self.eval_ctx),
                                               lineno=node.lineno,
                                               environment=self.environment)
         except nodes.Impossible:
@@ -66,3 +173,56 @@ class Optimizer(NodeTransformer):
     visit_Not = visit_Compare = visit_Getitem = visit_Getattr = visit_Call = \
     visit_Filter = visit_Test = visit_CondExpr = fold
     del fold
+
+
+#: nodes that prevent loops from being unrolled because they would be
+#: duplicated or depend on the local variables of the loop.
+_unroll_barriers = (nodes.Block, nodes.Extends, nodes.Macro, nodes.CallBlock,
+                    nodes.Include, nodes.Import, nodes.FromImport,
+                    nodes.Assign, nodes.Continue, nodes.Break)
+
+
+def substitute(node, values):
+    """Return a copy of `node` where the names loaded from the `values`
+    dict are replaced by constants.
+    """
+    if isinstance(node, nodes.Name) and node.ctx == 'load' and \
+       node.name in values:
+        return nodes.Const(values[node.name], lineno=node.lineno,
+                           environment=node.environment)
+    rv = object.__new__(node.__class__)
+    for attr in node.attributes:
+        setattr(rv, attr, getattr(node, attr))
+    for field, value in node.iter_fields():
+        if isinstance(value, list):
+            value = [isinstance(x, nodes.Node) and substitute(x, values) or x
+                     for x in value]
+        elif isinstance(value, nodes.Node):
+            value = substitute(value, values)
+        setattr(rv, field, value)
+    return rv
+
+
+def count_loads(node):
+    """Return a dict of the number of times each name is loaded in `node`."""
+    rv = {}
+    for name in node.find_all(nodes.Name):
+        if name.ctx == 'load':
+            rv[name.name] = rv.get(name.name, 0) + 1
+    return rv
+
+
+def merge_output(body):
+    """Merge adjacent :class:`~jinja2.nodes.Output` nodes of a list of
+    statements.
+    """
+    result = []
+    for node in body:
+        if isinstance(node, nodes.Output) and result and \
+           isinstance(result[-1], nodes.Output):
+            result[-1] = nodes.Output(result[-1].nodes + node.nodes,
+                                      lineno=result[-1].lineno,
+                                      environment=node.environment)
+        else:
+            result.append(node)
+    return result
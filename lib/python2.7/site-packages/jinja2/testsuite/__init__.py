@@ -71,7 +71,7 @@ class JinjaTestCase(unittest.TestCase):
 def suite():
     from jinja2.testsuite import ext, filters, tests, core_tags, \
          loader, inheritance, imports, lexnparse, security, api, \
-         regression, debug, utils, doctests
+         regression, debug, utils, bytecode_cache, optimizer, doctests
     suite = unittest.TestSuite()
     suite.addTest(ext.suite())
     suite.addTest(filters.suite())
@@ -86,6 +86,8 @@ def suite():
     suite.addTest(regression.suite())
     suite.addTest(debug.suite())
     suite.addTest(utils.suite())
+    suite.addTest(bytecode_cache.suite())
+    suite.addTest(optimizer.suite())
 
     # doctests will not run on python 3 currently.  Too many issues
     # with that, do not test that on that platform.
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+    jinja2.testsuite.bytecode_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the bytecode caches.
+
+    :copyright: (c) 2010 by the Jinja Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from jinja2.testsuite import JinjaTestCase
+
+from jinja2 import Environment, DictLoader, SQLiteBytecodeCache
+
+
+templates = {
+    'a.html': u'{% for item in seq %}[{{ item }}]{% endfor %}',
+    'b.html': u'{% extends "a.html" %}',
+    'c.html': u'{{ foo|upper }}',
+    'broken.html': u'{% for %}'
+}
+
+
+class SQLiteBytecodeCacheTestCase(JinjaTestCase):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'cache.db')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_env(self, **options):
+        bcc = SQLiteBytecodeCache(self.filename, **options)
+        return Environment(loader=DictLoader(templates), bytecode_cache=bcc)
+
+    def test_round_trip(self):
+        env = self.make_env()
+        assert env.get_template('a.html').render(seq=[1, 2]) == '[1][2]'
+        # a second environment loads the code from the database
+        env = self.make_env()
+        env.compile = None
+        assert env.get_template('a.html').render(seq=[1, 2]) == '[1][2]'
+
+    def test_changed_source(self):
+        env = self.make_env()
+        env.get_template('c.html')
+        env = Environment(loader=DictLoader({'c.html': u'{{ foo }}'}),
+                          bytecode_cache=SQLiteBytecodeCache(self.filename))
+        assert env.get_template('c.html').render(foo='x') == 'x'
+
+    def test_eviction(self):
+        env = self.make_env()
+        bcc = env.bytecode_cache
+        for name in 'a.html', 'c.html', 'b.html':
+            env.get_template(name)
+        size = bcc._get_connection().execute(
+            'select sum(size) from bytecode').fetchone()[0]
+        bcc.clear()
+        env = self.make_env(max_size=size - 1)
+        for name in 'a.html', 'c.html', 'b.html':
+            env.get_template(name)
+        # the least recently used template was evicted
+        assert env.bytecode_cache.recent_templates() == ['b.html', 'c.html']
+
+    def test_clear(self):
+        env = self.make_env()
+        env.get_template('a.html')
+        env.bytecode_cache.clear()
+        assert env.bytecode_cache.recent_templates() == []
+
+    def test_warm_cache(self):
+        env = self.make_env()
+        for name in 'a.html', 'c.html':
+            env.get_template(name)
+        env = self.make_env()
+        assert env.warm_cache() == 2
+        assert sorted(env.cache.keys()) == ['a.html', 'c.html']
+
+    def test_default_filename(self):
+        old_tempdir = tempfile.tempdir
+        tempfile.tempdir = self.tmpdir
+        try:
+            bcc = SQLiteBytecodeCache()
+            directory = os.path.dirname(bcc.filename)
+            assert os.path.dirname(directory) == self.tmpdir
+            assert os.stat(directory).st_mode & 0777 == 0700
+            if hasattr(os, 'getuid') and os.getuid() == 0:
+                # a directory created by another user is not used
+                os.chown(directory, 12345, -1)
+                self.assert_raises(RuntimeError, SQLiteBytecodeCache)
+        finally:
+            tempfile.tempdir = old_tempdir
+
+    def test_warm_cache_names(self):
+        env = Environment(loader=DictLoader(templates), cache_size=2)
+        assert env.warm_cache() == 2
+        assert len(env.cache) == 2
+        env = Environment(loader=DictLoader(templates), cache_size=0)
+        assert env.warm_cache() == 0
+        env = Environment(loader=DictLoader(templates))
+        assert env.warm_cache(['broken.html', 'c.html', 'missing.html']) == 1
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SQLiteBytecodeCacheTestCase))
+    return suite
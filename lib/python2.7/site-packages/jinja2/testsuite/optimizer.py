@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    jinja2.testsuite.optimizer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Tests the optimizer and the code it makes the compiler generate.
+
+    :copyright: (c) 2010 by the Jinja Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+
+from jinja2.testsuite import JinjaTestCase
+
+from jinja2 import Environment
+
+
+env = Environment()
+
+
+class OptimizerTestCase(JinjaTestCase):
+
+    def test_unroll_loop(self):
+        source = ('{% for a, b in [(1, "x"), (2, "y")] %}'
+                  '{{ a }}{{ b|upper }}{{ foo }}{% endfor %}')
+        assert 'for ' not in env.compile(source, raw=True)
+        tmpl = env.from_string(source)
+        assert tmpl.render(foo='-') == '1X-2Y-'
+
+    def test_unroll_loop_limits(self):
+        for source in (
+            '{% for item in [1, 2] %}{{ loop.index }}{% endfor %}',
+            '{% for item in [1, 2] %}{% set x = item %}{{ x }}{% endfor %}',
+            '{% for item in [1, 2] %}{% for item in seq %}{% endfor %}'
+            '{% endfor %}',
+            '{% for item in [1, 2] %}{% include "foo" %}{% endfor %}',
+            '{% for item in [1, 2] %}{% endfor %}{{ item }}',
+            '{% for item in [1, 2] if item %}{% endfor %}',
+            '{% for item in range(2) %}{% endfor %}',
+            '{% for item in "abc" %}{% endfor %}'
+        ):
+            assert 'for l_item' in env.compile(source, raw=True)
+
+    def test_unroll_loop_rebound(self):
+        source = ('{% for i in [1, 2] %}<li>{{ user }}</li>{% endfor %}'
+                  '{% macro row() %}{% for user in seq %}{{ user }}'
+                  '{% endfor %}{% endmacro %}{{ row() }}')
+        assert 'for l_i' in env.compile(source, raw=True)
+        tmpl = env.from_string(source)
+        assert tmpl.render(seq=[1, 2], user='U') == \
+            '<li>U</li><li>U</li>12'
+
+    def test_merge_output(self):
+        code = env.compile('{{ foo }}{% if true %}<{{ bar }}>{% endif %}',
+                           raw=True)
+        assert code.count('yield u') == 1
+        tmpl = env.from_string('{{ foo }}{% if true %}<{{ bar }}>{% endif %}')
+        assert tmpl.render(foo=1, bar=2) == '1<2>'
+
+    def test_fold_filters(self):
+        code = env.compile('{{ [3, 1, 2]|sort|join("-") }}', raw=True)
+        assert "u'1-2-3'" in code
+        # volatile filters are not folded
+        code = env.compile('{{ [1, 2]|random }}', raw=True)
+        assert "filters['random']" in code
+
+    def test_nested_loop_resolve(self):
+        source = ('{% for row in rows %}{% for col in row %}'
+                  '{{ title }}{{ col }}{% endfor %}{% endfor %}')
+        code = env.compile(source, raw=True)
+        assert code.count("context.resolve('title')") == 1
+        tmpl = env.from_string(source)
+        assert tmpl.render(rows=[[1], [2, 3]], title='-') == '-1-2-3'
+
+    def test_nested_loop_shadowing(self):
+        tmpl = env.from_string('{% for g in groups %}{% for user in g %}'
+                               '{% endfor %}{{ user }}{% endfor %}{{ user }}')
+        assert tmpl.render(groups=[[1], [2]], user='U') == 'UUU'
+        tmpl = env.from_string('{% for i in seq %}{% for x in seq %}'
+                               '{% endfor %}{{ x }}{% endfor %}'
+                               '{% set k = x %}{{ k }}')
+        assert tmpl.render(seq=[1, 2], x='X') == 'XXX'
+        tmpl = env.from_string('{% for b in [1, 2] %}{% for a, b in seq %}'
+                               '{% endfor %}{% endfor %}{% for b in seq %}'
+                               '{{ a }}{% endfor %}{{ a }}')
+        assert tmpl.render(seq=[(1, 2)], a='A') == 'AA'
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(OptimizerTestCase))
+    return suite
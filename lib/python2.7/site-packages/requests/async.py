@@ -5,25 +5,26 @@ requests.async
 ~~~~~~~~~~~~~~
 
 This module contains an asynchronous replica of ``requests.api``, powered
-by gevent. All API methods return a ``Request`` instance (as opposed to
-``Response``). A list of requests can be sent with ``map()``.
+by a pool of threads. All API methods return a ``Request`` instance (as
+opposed to ``Response``). A list of requests can be sent with ``map()``,
+or with ``imap()`` to get the responses as they complete.
 """
 
-try:
-    import gevent
-    from gevent import monkey as curious_george
-    from gevent.pool import Pool
-except ImportError:
-    raise RuntimeError('Gevent is required for requests.async.')
-
-# Monkey-patch.
-curious_george.patch_all(thread=False)
+import socket
+import threading
+import time
+from collections import deque
+from Queue import Queue, Empty
+from urlparse import urlparse
 
 from . import api
+from .defaults import defaults
+from .exceptions import Timeout
+from .packages.urllib3.poolmanager import PoolManager
 
 
 __all__ = (
-    'map',
+    'map', 'imap',
     'get', 'options', 'head', 'post', 'put', 'patch', 'delete', 'request'
 )
 
@@ -41,13 +42,21 @@ def patched(f):
     return wrapped
 
 
-def send(r, pools=None):
+def send(r, pools=None, prefetch=False):
     """Sends a given Request object."""
 
     if pools:
-        r._pools = pools
-
-    r.send()
+        r._poolmanager = pools
+
+    # Errors are reported by the Response, so that a worker is never lost.
+    try:
+        r.send()
+        if prefetch:
+            r.response.content
+    except socket.timeout:
+        r.response.error = Timeout('Request timed out.')
+    except Exception, e:
+        r.response.error = e
 
     return r.response
 
@@ -63,29 +72,130 @@ delete = patched(api.delete)
 request = patched(api.request)
 
 
-def map(requests, prefetch=True, size=None):
-    """Concurrently converts a list of Requests to Responses.
+def _work(jobs, done):
+    """Sends the Requests of the jobs queue until a None job is found."""
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        r, pools, prefetch = job
+        send(r, pools, prefetch)
+        done.put(r)
+
+
+def imap(requests, prefetch=True, size=None, per_host=None, timeout=None,
+         session=None):
+    """Concurrently converts a list of Requests to Responses, and yields the
+    Responses in completion order.
 
     :param requests: a collection of Request objects.
     :param prefetch: If False, the content will not be downloaded immediately.
-    :param size: Specifies the number of requests to make at a time. If None, no throttling occurs.
+    :param size: Specifies the number of requests to make at a time. If None, the ``pool_connections`` default is used.
+    :param per_host: (optional) Maximum number of requests to make at a time to a same host.
+    :param timeout: (optional) Float describing the total time allowed. Requests which are not completed by then are not yielded, and the ones not sent yet are dropped.
+    :param session: (optional) A :class:`Session` object whose connection pools are used for all the requests.
     """
 
     requests = list(requests)
+    if not requests:
+        return
 
-    if size:
-        pool = Pool(size)
-        pool.map(send, requests)
-        pool.join()
-    else:
-        jobs = [gevent.spawn(send, r) for r in requests]
-        gevent.joinall(jobs)
-
-    if prefetch:
-        [r.response.content for r in requests]
+    hosts = [urlparse(r.url).netloc.lower() for r in requests]
+    size = min(size or defaults['pool_connections'], len(requests))
 
-    return [r.response for r in requests]
+    # Share connections between the requests to a same host.
+    if session is not None:
+        pools = session.poolmanager
+    else:
+        pools = PoolManager(
+            num_pools=max(len(set(hosts)), defaults['pool_connections']),
+            maxsize=per_host or size
+        )
+
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + timeout
+
+    jobs = Queue()
+    done = Queue()
+    for i in range(size):
+        worker = threading.Thread(target=_work, args=(jobs, done))
+        worker.daemon = True
+        worker.start()
+
+    pending = deque(zip(hosts, requests))
+    running = {}
+    active = {}
+
+    try:
+        while pending or running:
+
+            # Start the pending requests, in order, as long as their host
+            # is below its limit.
+            i = 0
+            while len(running) < size and i < len(pending):
+                host, r = pending[i]
+                if per_host and active.get(host, 0) >= per_host:
+                    i += 1
+                    continue
+                del pending[i]
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return
+                    if r.timeout is None or r.timeout > remaining:
+                        r.timeout = remaining
+                running[r] = host
+                active[host] = active.get(host, 0) + 1
+                # Create the connection pool of the host here rather than
+                # concurrently in the workers. A URL it can't handle only
+                # fails its own request.
+                try:
+                    pools.connection_from_url(r.url)
+                except Exception, e:
+                    r.response.error = e
+                    done.put(r)
+                else:
+                    jobs.put((r, pools, prefetch))
+
+            try:
+                if deadline is None:
+                    # A get() without timeout can't be interrupted by
+                    # KeyboardInterrupt.
+                    r = done.get(True, 3600 * 24 * 365)
+                else:
+                    r = done.get(True, max(deadline - time.time(), 0))
+            except Empty:
+                return
+
+            host = running.pop(r)
+            active[host] -= 1
+
+            yield r.response
+
+    finally:
+        # Stop the workers once they are done with their current request.
+        for i in range(size):
+            jobs.put(None)
+
+
+def map(requests, prefetch=True, size=None, per_host=None, timeout=None,
+        session=None):
+    """Concurrently converts a list of Requests to Responses.
 
+    :param requests: a collection of Request objects.
+    :param prefetch: If False, the content will not be downloaded immediately.
+    :param size: Specifies the number of requests to make at a time. If None, the ``pool_connections`` default is used.
+    :param per_host: (optional) Maximum number of requests to make at a time to a same host.
+    :param timeout: (optional) Float describing the total time allowed. The Responses of the requests which are not completed by then have no status code.
+    :param session: (optional) A :class:`Session` object whose connection pools are used for all the requests.
+    """
 
+    requests = list(requests)
 
+    for response in imap(requests, prefetch, size, per_host, timeout,
+                         session):
+        pass
 
+    return [r.response for r in requests]
@@ -99,8 +99,8 @@ Using simplejson.tool from the shell to validate and pretty-print::
 """
 __version__ = '2.2.1'
 __all__ = [
-    'dump', 'dumps', 'load', 'loads',
-    'JSONDecoder', 'JSONDecodeError', 'JSONEncoder',
+    'dump', 'dumps', 'load', 'loads', 'iterload',
+    'JSONDecoder', 'JSONDecodeError', 'JSONEncoder', 'JSONStreamDecoder',
     'OrderedDict',
 ]
 
@@ -108,7 +108,7 @@ __author__ = 'Bob Ippolito <bob@redivi.com>'
 
 from decimal import Decimal
 
-from decoder import JSONDecoder, JSONDecodeError
+from decoder import JSONDecoder, JSONDecodeError, JSONStreamDecoder
 from encoder import JSONEncoder
 def _import_OrderedDict():
     import collections
@@ -144,7 +144,7 @@ def dump(obj, fp, skipkeys=False, ensure_ascii=True, check_circular=True,
         allow_nan=True, cls=None, indent=None, separators=None,
         encoding='utf-8', default=None, use_decimal=True,
         namedtuple_as_object=True, tuple_as_array=True,
-        **kw):
+        block_size=65536, **kw):
     """Serialize ``obj`` as a JSON formatted stream to ``fp`` (a
     ``.write()``-supporting file-like object).
 
@@ -193,6 +193,9 @@ def dump(obj, fp, skipkeys=False, ensure_ascii=True, check_circular=True,
     If *tuple_as_array* is true (default: ``True``),
     :class:`tuple` (and subclasses) will be encoded as JSON arrays.
 
+    The output is written to ``fp`` in blocks of at least *block_size*
+    characters (default: ``65536``).
+
     To use a custom ``JSONEncoder`` subclass (e.g. one that overrides the
     ``.default()`` method to serialize additional types), specify it with
     the ``cls`` kwarg.
@@ -204,21 +207,19 @@ def dump(obj, fp, skipkeys=False, ensure_ascii=True, check_circular=True,
         cls is None and indent is None and separators is None and
         encoding == 'utf-8' and default is None and use_decimal
         and namedtuple_as_object and tuple_as_array and not kw):
-        iterable = _default_encoder.iterencode(obj)
+        encoder = _default_encoder
     else:
         if cls is None:
             cls = JSONEncoder
-        iterable = cls(skipkeys=skipkeys, ensure_ascii=ensure_ascii,
+        encoder = cls(skipkeys=skipkeys, ensure_ascii=ensure_ascii,
             check_circular=check_circular, allow_nan=allow_nan, indent=indent,
             separators=separators, encoding=encoding,
             default=default, use_decimal=use_decimal,
             namedtuple_as_object=namedtuple_as_object,
             tuple_as_array=tuple_as_array,
-            **kw).iterencode(obj)
-    # could accelerate with writelines in some versions of Python, at
-    # a debuggability cost
-    for chunk in iterable:
-        fp.write(chunk)
+            **kw)
+    for block in encoder.iterencode_blocks(obj, block_size):
+        fp.write(block)
 
 
 def dumps(obj, skipkeys=False, ensure_ascii=True, check_circular=True,
@@ -430,6 +431,45 @@ def loads(s, encoding=None, cls=None, object_hook=None, parse_float=None,
     return cls(encoding=encoding, **kw).decode(s)
 
 
+def iterload(fp, path=(None,), chunk_size=65536, cls=None, use_decimal=False,
+        **kw):
+    """Incrementally deserialize the values at ``path`` of the JSON
+    documents read from ``fp`` (a ``.read()``-supporting file-like object)
+    and yield them as ``(path, value)`` tuples.
+
+    ``fp`` is read in chunks of ``chunk_size`` bytes and only the values
+    at ``path`` are decoded, so that documents larger than the available
+    memory can be processed as long as these values fit in memory.  The
+    default ``path`` yields each element of a top-level array::
+
+        for (index,), row in iterload(open('export.json')):
+            process(row)
+
+    See :class:`JSONStreamDecoder` for the syntax of ``path``.  The other
+    arguments are the same as for :func:`load`.
+
+    """
+    if cls is None and not use_decimal and not kw:
+        decoder = _default_decoder
+    else:
+        if cls is None:
+            cls = JSONDecoder
+        if use_decimal:
+            if kw.get('parse_float') is not None:
+                raise TypeError("use_decimal=True implies parse_float=Decimal")
+            kw['parse_float'] = Decimal
+        decoder = cls(**kw)
+    stream = JSONStreamDecoder(path, decoder)
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        for item in stream.feed(chunk):
+            yield item
+    for item in stream.close():
+        yield item
+
+
 def _toggle_speedups(enabled):
     import simplejson.decoder as dec
     import simplejson.encoder as enc
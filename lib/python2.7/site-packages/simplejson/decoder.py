@@ -13,7 +13,7 @@ def _import_c_scanstring():
         return None
 c_scanstring = _import_c_scanstring()
 
-__all__ = ['JSONDecoder']
+__all__ = ['JSONDecoder', 'JSONStreamDecoder']
 
 FLAGS = re.VERBOSE | re.MULTILINE | re.DOTALL
 
@@ -419,3 +419,287 @@ class JSONDecoder(object):
         except StopIteration:
             raise JSONDecodeError("No JSON object could be decoded", s, idx)
         return obj, end
+
+
+# Parser states of JSONStreamDecoder
+(_ST_VALUE, _ST_FIRST_VALUE, _ST_KEY, _ST_FIRST_KEY, _ST_COLON,
+    _ST_NEXT, _ST_SKIP) = range(7)
+
+_STATE_ERRORS = {
+    _ST_VALUE: "Expecting object",
+    _ST_FIRST_VALUE: "Expecting object",
+    _ST_KEY: "Expecting property name",
+    _ST_FIRST_KEY: "Expecting property name",
+    _ST_COLON: "Expecting : delimiter",
+    _ST_NEXT: "Expecting , delimiter",
+    _ST_SKIP: "Expecting , delimiter",
+}
+
+STREAM_TOKEN = re.compile(r'[][{}"]')
+STREAM_STRING_END = re.compile(r'["\\]')
+STREAM_SCALAR_END = re.compile(r'[,\]} \t\n\r]')
+
+
+class JSONStreamDecoder(object):
+    """Incremental JSON decoder
+
+    Data is passed in chunks of any size to :meth:`feed`, which returns
+    the values found so far at *path* as a list of ``(path, value)``
+    tuples.  Only these values are decoded, with the scanner of
+    *decoder*, and the data before them is discarded, so the memory used
+    is bounded by the size of the largest of them.  Values which are not
+    at *path* are skipped without being decoded, and their data is
+    discarded as it is scanned.
+
+    *path* is a sequence of object keys, array indexes or ``None`` which
+    matches any key or index.  The default ``(None,)`` matches each
+    element of a top-level array (or each value of a top-level object),
+    ``()`` matches top-level documents.  A stream may contain several
+    concatenated documents, for example one per line.
+
+    *decoder* is the :class:`JSONDecoder` used to decode the values.
+
+    The positions of :class:`JSONDecodeError` exceptions are relative to
+    the data which was not discarded yet.
+
+    """
+
+    def __init__(self, path=(None,), decoder=None):
+        if decoder is None:
+            decoder = JSONDecoder()
+        self.path = tuple(path)
+        self.decoder = decoder
+        self._buf = ''
+        self._stack = []
+        self._state = _ST_VALUE
+        self._documents = 0
+        # resumable state of _value_end: (offset, depth, in_string)
+        self._scan = (0, 0, False)
+        # state of the skipped value in progress: (depth, in_string)
+        self._skip = (0, False)
+
+    def feed(self, data):
+        """Decode a chunk of data, a ``str`` or ``unicode`` instance, and
+        return the list of ``(path, value)`` tuples completed by it.
+
+        """
+        self._buf += data
+        return self._parse(False)
+
+    def close(self):
+        """Decode the remaining data and return the last ``(path, value)``
+        tuples.  Raises :class:`JSONDecodeError` if the data ends in the
+        middle of a document.
+
+        """
+        items = self._parse(True)
+        if self._stack or self._state != _ST_VALUE or self._buf:
+            raise JSONDecodeError(_STATE_ERRORS[self._state], self._buf,
+                                  len(self._buf))
+        if not self._documents:
+            raise JSONDecodeError("No JSON object could be decoded",
+                                  self._buf, 0)
+        return items
+
+    def _matches(self, path, kind=None):
+        """Check if path matches the target path, or only its beginning
+        if the container *kind* (``'['`` or ``'{'``) starts at path.
+
+        """
+        target = self.path
+        if kind is None:
+            if len(path) != len(target):
+                return False
+        else:
+            if len(path) >= len(target):
+                return False
+            component = target[len(path)]
+            if component is not None and \
+                    isinstance(component, basestring) != (kind == '{'):
+                return False
+        for key, component in zip(path, target):
+            if component is not None and key != component:
+                return False
+        return True
+
+    def _value_end(self, buf, start, final):
+        """Return the end of the value starting at buf[start], or None if
+        more data is needed to know it.
+
+        """
+        if buf[start] not in '[{"':
+            m = STREAM_SCALAR_END.search(buf, start)
+            if m is not None:
+                return m.start()
+            if final:
+                return len(buf)
+            return None
+        offset, depth, in_string = self._scan
+        pos, depth, in_string = self._scan_container(buf, start + offset,
+                                                     depth, in_string)
+        if depth or in_string:
+            self._scan = (pos - start, depth, in_string)
+            if final:
+                # truncated data, let the scanner raise an error
+                return len(buf)
+            return None
+        self._scan = (0, 0, False)
+        return pos
+
+    def _scan_container(self, buf, pos, depth, in_string):
+        """Scan buf from *pos*, inside *depth* containers and a string if
+        *in_string*, up to the end of the outermost container or string.
+        Return ``(pos, depth, in_string)``: if depth or in_string, the end
+        was not found and the scan can be resumed from pos.
+
+        """
+        while True:
+            if in_string:
+                m = STREAM_STRING_END.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                pos = m.end()
+                if m.group() == '\\':
+                    if pos == len(buf):
+                        # the escaped character is not there yet
+                        pos -= 1
+                        break
+                    pos += 1
+                    continue
+                in_string = False
+                if not depth:
+                    break
+            else:
+                m = STREAM_TOKEN.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                pos = m.end()
+                c = m.group()
+                if c == '"':
+                    in_string = True
+                elif c in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if not depth:
+                        break
+        return pos, depth, in_string
+
+    def _scan_value(self, buf, pos):
+        try:
+            return self.decoder.scan_once(buf, pos)
+        except StopIteration:
+            raise JSONDecodeError("Expecting object", buf, pos)
+
+    def _parse(self, final, _w=WHITESPACE.match):
+        buf = self._buf
+        stack = self._stack
+        state = self._state
+        items = []
+        pos = 0
+        while True:
+            if state == _ST_SKIP:
+                depth, in_string = self._skip
+                pos, depth, in_string = self._scan_container(buf, pos, depth,
+                                                             in_string)
+                if depth or in_string:
+                    self._skip = (depth, in_string)
+                    break
+                self._skip = (0, False)
+                state = _ST_NEXT
+            pos = _w(buf, pos).end()
+            if pos == len(buf):
+                break
+            nextchar = buf[pos]
+            if state == _ST_VALUE or state == _ST_FIRST_VALUE:
+                if state == _ST_FIRST_VALUE and nextchar == ']':
+                    stack.pop()
+                    pos += 1
+                    state = _ST_NEXT
+                    continue
+                path = tuple([frame[1] for frame in stack])
+                if nextchar in '[{' and self._matches(path, nextchar):
+                    if nextchar == '[':
+                        stack.append([False, 0])
+                        state = _ST_FIRST_VALUE
+                    else:
+                        stack.append([True, None])
+                        state = _ST_FIRST_KEY
+                    pos += 1
+                    continue
+                if self._matches(path):
+                    if nextchar in '[{"' and not self._scan[0]:
+                        # try to decode first, this is faster than
+                        # finding the end of the value beforehand
+                        try:
+                            value, end = self.decoder.scan_once(buf, pos)
+                        except (StopIteration, JSONDecodeError):
+                            end = None
+                        if end is not None:
+                            items.append((path, value))
+                            pos = end
+                            state = _ST_NEXT
+                            continue
+                    if self._value_end(buf, pos, final) is None:
+                        break
+                    value, pos = self._scan_value(buf, pos)
+                    items.append((path, value))
+                    state = _ST_NEXT
+                    continue
+                if nextchar in '[{"':
+                    # skipped without being decoded, the data scanned so
+                    # far is discarded if the end is not there yet
+                    self._skip = (nextchar != '"' and 1 or 0,
+                                  nextchar == '"')
+                    state = _ST_SKIP
+                    pos += 1
+                    continue
+                end = self._value_end(buf, pos, final)
+                if end is None:
+                    break
+                value, pos = self._scan_value(buf, pos)
+                state = _ST_NEXT
+            elif state == _ST_KEY or state == _ST_FIRST_KEY:
+                if state == _ST_FIRST_KEY and nextchar == '}':
+                    stack.pop()
+                    pos += 1
+                    state = _ST_NEXT
+                    continue
+                if nextchar != '"':
+                    raise JSONDecodeError("Expecting property name", buf, pos)
+                if self._value_end(buf, pos, final) is None:
+                    break
+                stack[-1][1], pos = self.decoder.parse_string(
+                    buf, pos + 1, self.decoder.encoding, self.decoder.strict)
+                state = _ST_COLON
+            elif state == _ST_COLON:
+                if nextchar != ':':
+                    raise JSONDecodeError("Expecting : delimiter", buf, pos)
+                pos += 1
+                state = _ST_VALUE
+            elif not stack:
+                # end of a top-level document
+                self._documents += 1
+                state = _ST_VALUE
+            else:
+                is_object = stack[-1][0]
+                if nextchar == ',':
+                    if is_object:
+                        state = _ST_KEY
+                    else:
+                        stack[-1][1] += 1
+                        state = _ST_VALUE
+                elif nextchar == (is_object and '}' or ']'):
+                    stack.pop()
+                    state = _ST_NEXT
+                else:
+                    raise JSONDecodeError("Expecting , delimiter", buf, pos)
+                pos += 1
+        if final and state == _ST_NEXT and not stack:
+            self._documents += 1
+            state = _ST_VALUE
+        self._buf = buf[pos:]
+        self._state = state
+        return items
@@ -297,6 +297,41 @@ class JSONEncoder(object):
         finally:
             key_memo.clear()
 
+    def iterencode_blocks(self, o, block_size=65536):
+        """Encode the given object and yield its string representation in
+        blocks of at least ``block_size`` characters (except the last one).
+
+        This writes large documents to files or sockets with few system
+        calls.  Blocks are only encoded when they are requested, so that
+        the writer controls the memory used by waiting for the previous
+        block to be sent before requesting the next one.  For example with
+        a non-blocking stream that calls ``callback`` once its data is
+        written::
+
+            blocks = JSONEncoder().iterencode_blocks(bigobject)
+            def write_next():
+                for block in blocks:
+                    stream.write(block, callback=write_next)
+                    break
+            write_next()
+
+        """
+        if self.ensure_ascii:
+            join = ''.join
+        else:
+            join = u''.join
+        chunks = []
+        size = 0
+        for chunk in self.iterencode(o):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= block_size:
+                yield join(chunks)
+                del chunks[:]
+                size = 0
+        if chunks:
+            yield join(chunks)
+
 
 class JSONEncoderForHTML(JSONEncoder):
     """An encoder that produces JSON safe to embed in HTML.
@@ -343,7 +378,10 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
         long=long,
         str=str,
         tuple=tuple,
+        _buffer_items=1024,
+        _key_memo_size=4096,
     ):
+    key_memo = {}
 
     def _iterencode_list(lst, _current_indent_level):
         if not lst:
@@ -354,12 +392,13 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
             if markerid in markers:
                 raise ValueError("Circular reference detected")
             markers[markerid] = lst
-        buf = '['
+        # scalars are collected in buf and yielded at once
+        buf = ['[']
         if _indent is not None:
             _current_indent_level += 1
             newline_indent = '\n' + (_indent * _current_indent_level)
             separator = _item_separator + newline_indent
-            buf += newline_indent
+            buf.append(newline_indent)
         else:
             newline_indent = None
             separator = _item_separator
@@ -368,23 +407,24 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
             if first:
                 first = False
             else:
-                buf = separator
+                buf.append(separator)
             if isinstance(value, basestring):
-                yield buf + _encoder(value)
+                buf.append(_encoder(value))
             elif value is None:
-                yield buf + 'null'
+                buf.append('null')
             elif value is True:
-                yield buf + 'true'
+                buf.append('true')
             elif value is False:
-                yield buf + 'false'
+                buf.append('false')
             elif isinstance(value, (int, long)):
-                yield buf + str(value)
+                buf.append(str(value))
             elif isinstance(value, float):
-                yield buf + _floatstr(value)
+                buf.append(_floatstr(value))
             elif _use_decimal and isinstance(value, Decimal):
-                yield buf + str(value)
+                buf.append(str(value))
             else:
-                yield buf
+                yield ''.join(buf)
+                buf = []
                 if isinstance(value, list):
                     chunks = _iterencode_list(value, _current_indent_level)
                 elif (_namedtuple_as_object and isinstance(value, tuple) and
@@ -399,10 +439,15 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                     chunks = _iterencode(value, _current_indent_level)
                 for chunk in chunks:
                     yield chunk
+                continue
+            if len(buf) >= _buffer_items:
+                yield ''.join(buf)
+                buf = []
         if newline_indent is not None:
             _current_indent_level -= 1
-            yield '\n' + (_indent * _current_indent_level)
-        yield ']'
+            buf.append('\n' + (_indent * _current_indent_level))
+        buf.append(']')
+        yield ''.join(buf)
         if markers is not None:
             del markers[markerid]
 
@@ -415,12 +460,14 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
             if markerid in markers:
                 raise ValueError("Circular reference detected")
             markers[markerid] = dct
-        yield '{'
+        # scalars are collected in buf, so that objects without nested
+        # containers (such as the rows of a table) are yielded at once
+        buf = ['{']
         if _indent is not None:
             _current_indent_level += 1
             newline_indent = '\n' + (_indent * _current_indent_level)
             item_separator = _item_separator + newline_indent
-            yield newline_indent
+            buf.append(newline_indent)
         else:
             newline_indent = None
             item_separator = _item_separator
@@ -431,8 +478,15 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
         else:
             items = dct.iteritems()
         for key, value in items:
+            encoded_key = None
             if isinstance(key, basestring):
-                pass
+                # keys are usually shared by many objects, encode them once
+                try:
+                    encoded_key = key_memo[key]
+                except KeyError:
+                    encoded_key = _encoder(key) + _key_separator
+                    if len(key_memo) < _key_memo_size:
+                        key_memo[key] = encoded_key
             # JavaScript is weakly typed for these, so it makes sense to
             # also allow them.  Many encoders seem to do something like this.
             elif isinstance(key, float):
@@ -449,27 +503,30 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                 continue
             else:
                 raise TypeError("key " + repr(key) + " is not a string")
+            if encoded_key is None:
+                encoded_key = _encoder(key) + _key_separator
             if first:
                 first = False
             else:
-                yield item_separator
-            yield _encoder(key)
-            yield _key_separator
+                buf.append(item_separator)
+            buf.append(encoded_key)
             if isinstance(value, basestring):
-                yield _encoder(value)
+                buf.append(_encoder(value))
             elif value is None:
-                yield 'null'
+                buf.append('null')
             elif value is True:
-                yield 'true'
+                buf.append('true')
             elif value is False:
-                yield 'false'
+                buf.append('false')
             elif isinstance(value, (int, long)):
-                yield str(value)
+                buf.append(str(value))
             elif isinstance(value, float):
-                yield _floatstr(value)
+                buf.append(_floatstr(value))
             elif _use_decimal and isinstance(value, Decimal):
-                yield str(value)
+                buf.append(str(value))
             else:
+                yield ''.join(buf)
+                buf = []
                 if isinstance(value, list):
                     chunks = _iterencode_list(value, _current_indent_level)
                 elif (_namedtuple_as_object and isinstance(value, tuple) and
@@ -486,8 +543,9 @@ def _make_iterencode(markers, _default, _encoder, _indent, _floatstr,
                     yield chunk
         if newline_indent is not None:
             _current_indent_level -= 1
-            yield '\n' + (_indent * _current_indent_level)
-        yield '}'
+            buf.append('\n' + (_indent * _current_indent_level))
+        buf.append('}')
+        yield ''.join(buf)
         if markers is not None:
             del markers[markerid]
 
@@ -24,4 +24,31 @@ class TestDump(TestCase):
         # http://bugs.python.org/issue6105
         items = [('one', 1), ('two', 2), ('three', 3), ('four', 4), ('five', 5)]
         s = json.dumps(json.OrderedDict(items))
-        self.assertEqual(s, '{"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}')
\ No newline at end of file
+        self.assertEqual(s, '{"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}')
+    def test_dump_blocks(self):
+        writes = []
+        class Writer(object):
+            def write(self, data):
+                writes.append(data)
+        obj = [{'key': i, 'value': [i] * 10} for i in range(1000)]
+        json.dump(obj, Writer(), block_size=4096)
+        self.assertEqual(''.join(writes), json.dumps(obj))
+        self.assertTrue(len(writes) < 30)
+        for data in writes[:-1]:
+            self.assertTrue(len(data) >= 4096)
+
+    def test_iterencode_blocks(self):
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        blocks = list(encoder.iterencode_blocks([u'\xe9'] * 100, 10))
+        self.assertEqual(u''.join(blocks), json.dumps([u'\xe9'] * 100,
+                                                      ensure_ascii=False))
+        self.assertTrue(all(isinstance(b, unicode) for b in blocks))
+        self.assertEqual(list(encoder.iterencode_blocks({}, 10)), ['{}'])
+
+    def test_shared_keys(self):
+        # keys are encoded once, but equal keys of other types are not
+        # mixed up with strings
+        obj = [{'1': 1}, {1.0: 2}, {True: 3}, {'true': 4}, {u'1': 5}]
+        self.assertEqual(json.dumps(obj),
+                         '[{"1": 1}, {"1.0": 2}, {"true": 3}, {"true": 4}, '
+                         '{"1": 5}]')
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import decimal
+from unittest import TestCase
+from StringIO import StringIO
+
+import simplejson as json
+from simplejson import JSONDecodeError, JSONStreamDecoder, OrderedDict
+from simplejson.tests.test_pass1 import JSON
+
+
+def feed_all(data, path=(None,), size=1):
+    stream = JSONStreamDecoder(path)
+    items = []
+    for i in range(0, len(data), size):
+        items.extend(stream.feed(data[i:i + size]))
+    items.extend(stream.close())
+    return items
+
+
+class TestStream(TestCase):
+    def test_array_elements(self):
+        expected = [((i,), value) for i, value in enumerate(json.loads(JSON))]
+        for size in (1, 2, 7, 100, len(JSON)):
+            self.assertEquals(feed_all(JSON, size=size), expected)
+
+    def test_unicode(self):
+        data = u'["\\u00e9t\\u00e9", "été", {"é": 1}]'
+        self.assertEquals([v for p, v in feed_all(data)],
+                          json.loads(data))
+        self.assertEquals([v for p, v in feed_all(data.encode('utf-8'))],
+                          json.loads(data))
+
+    def test_path(self):
+        data = ('{"skip": ["]}", {"\\"": "\\\\"}], "rows": [[1, 2], {}],'
+                ' "count": 2, "rows2": [3]}')
+        self.assertEquals(feed_all(data, ('rows', None)),
+                          [(('rows', 0), [1, 2]), (('rows', 1), {})])
+        self.assertEquals(feed_all(data, ('rows', 1)), [(('rows', 1), {})])
+        self.assertEquals(feed_all(data, (None, 0)),
+                          [(('skip', 0), ']}'), (('rows', 0), [1, 2]),
+                           (('rows2', 0), 3)])
+        self.assertEquals(feed_all(data, (None,)),
+                          [((k,), v) for k, v in json.loads(
+                              data, object_pairs_hook=OrderedDict).items()])
+
+    def test_documents(self):
+        data = '{"a": 1}\n[2]\n3\n"4" null'
+        self.assertEquals([v for p, v in feed_all(data, ())],
+                          [{'a': 1}, [2], 3, '4', None])
+        self.assertEquals(feed_all(data, (0,)), [((0,), 2)])
+
+    def test_empty(self):
+        self.assertEquals(feed_all('[]'), [])
+        self.assertEquals(feed_all(' { } '), [])
+        self.assertRaises(JSONDecodeError, feed_all, '')
+        self.assertRaises(JSONDecodeError, feed_all, '  ')
+
+    def test_errors(self):
+        for data in ('[1, 2', '[1, 2,', '[1 2]', '{"a" 1}', '{"a": 1,}',
+                     '[1, {"a": [}]', '{1: 2}', '["abc]', '[tru]', '[1,]',
+                     '[1]]'):
+            for size in (1, len(data)):
+                self.assertRaises(JSONDecodeError, feed_all, data,
+                                  size=size)
+
+    def test_memory(self):
+        stream = JSONStreamDecoder()
+        stream.feed('[')
+        for i in range(1000):
+            items = stream.feed('{"index": %d, "name": "row"}, ' % i)
+            self.assertEquals(items, [((i,), {'index': i, 'name': 'row'})])
+            self.assertEquals(stream._buf, '')
+
+    def test_skip_memory(self):
+        stream = JSONStreamDecoder(('rows', None))
+        stream.feed('{"skip": [')
+        for i in range(1000):
+            stream.feed('{"index": %d, "name": "\\"row\\""}, ' % i)
+            self.assertTrue(len(stream._buf) <= 1)
+        items = stream.feed('null], "rows": [1]}')
+        self.assertEquals(items + stream.close(), [(('rows', 0), 1)])
+        for size in (1, 5, 100):
+            self.assertRaises(JSONDecodeError, feed_all,
+                              '{"skip": [1, "2]"', ('rows',), size)
+
+    def test_iterload(self):
+        fp = StringIO('{"values": [1.5, 2.5]}')
+        self.assertEquals(list(json.iterload(fp, ('values', None), 3,
+                                             use_decimal=True)),
+                          [(('values', 0), decimal.Decimal('1.5')),
+                           (('values', 1), decimal.Decimal('2.5'))])
@@ -16,14 +16,24 @@
 
 """A lightweight wrapper around MySQLdb."""
 
+from __future__ import with_statement
+
 import copy
 import MySQLdb.constants
 import MySQLdb.converters
 import MySQLdb.cursors
+import Queue
+import contextlib
+import functools
 import itertools
 import logging
+import sys
+import threading
 import time
 
+from tornado import stack_context
+from tornado.ioloop import IOLoop
+
 class Connection(object):
     """A lightweight wrapper around MySQLdb DB-API connections.
 
@@ -41,10 +51,11 @@ class Connection(object):
     UTF-8 on all connections to avoid time zone and encoding errors.
     """
     def __init__(self, host, database, user=None, password=None,
-                 max_idle_time=7*3600):
+                 max_idle_time=7*3600, stats=None):
         self.host = host
         self.database = database
         self.max_idle_time = max_idle_time
+        self.stats = stats
 
         args = dict(conv=CONVERSIONS, use_unicode=True, charset="utf8",
                     db=database, init_command='SET time_zone = "+0:00"',
@@ -91,6 +102,16 @@ class Connection(object):
         self._db = MySQLdb.connect(**self._db_args)
         self._db.autocommit(True)
 
+    def ping(self):
+        """Checks that the connection is alive, re-opening it if needed."""
+        if self._db is not None:
+            try:
+                self._db.ping()
+                return
+            except OperationalError:
+                logging.warning("Lost connection to MySQL on %s", self.host)
+        self.reconnect()
+
     def iter(self, query, *parameters):
         """Returns an iterator for the given query and parameters."""
         self._ensure_connected()
@@ -161,7 +182,7 @@ class Connection(object):
         """
         cursor = self._cursor()
         try:
-            cursor.executemany(query, parameters)
+            self._executemany(cursor, query, parameters)
             return cursor.lastrowid
         finally:
             cursor.close()
@@ -173,7 +194,7 @@ class Connection(object):
         """
         cursor = self._cursor()
         try:
-            cursor.executemany(query, parameters)
+            self._executemany(cursor, query, parameters)
             return cursor.rowcount
         finally:
             cursor.close()
@@ -194,12 +215,342 @@ class Connection(object):
         return self._db.cursor()
 
     def _execute(self, cursor, query, parameters):
+        return self._timed(cursor.execute, query, parameters)
+
+    def _executemany(self, cursor, query, parameters):
+        return self._timed(cursor.executemany, query, parameters)
+
+    def _timed(self, method, query, parameters):
+        start = time.time()
+        error = True
         try:
-            return cursor.execute(query, parameters)
+            result = method(query, parameters)
+            error = False
+            return result
         except OperationalError:
             logging.error("Error connecting to MySQL on %s", self.host)
             self.close()
             raise
+        finally:
+            if self.stats is not None:
+                self.stats.record(query, time.time() - start, error)
+
+
+class QueryStats(object):
+    """Per-query timing statistics, shared by several connections.
+
+    Queries are identified by their text, before parameters are
+    substituted.  Queries taking more than ``slow_query_time`` seconds
+    are logged as warnings.
+    """
+    def __init__(self, slow_query_time=None):
+        self.slow_query_time = slow_query_time
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, query, elapsed, error=False):
+        """Records an execution of query which took elapsed seconds."""
+        with self._lock:
+            stats = self._stats.get(query)
+            if stats is None:
+                stats = self._stats[query] = [0, 0, 0.0, 0.0]
+            stats[0] += 1
+            if error:
+                stats[1] += 1
+            stats[2] += elapsed
+            stats[3] = max(stats[3], elapsed)
+        if self.slow_query_time is not None and \
+                elapsed >= self.slow_query_time:
+            logging.warning("Slow query (%.2fms): %s", 1000.0 * elapsed,
+                            query)
+
+    def get(self):
+        """Returns a dict mapping queries to their statistics.
+
+        Each value is a dict with the ``count``, ``errors``,
+        ``total_time``, ``mean_time`` and ``max_time`` keys (times are
+        in seconds).
+        """
+        with self._lock:
+            return dict((query, dict(count=count, errors=errors,
+                                     total_time=total, mean_time=total / count,
+                                     max_time=max_time))
+                        for query, (count, errors, total, max_time)
+                        in self._stats.iteritems())
+
+    def reset(self):
+        """Clears all statistics."""
+        with self._lock:
+            self._stats.clear()
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection of a `ConnectionPool` became available
+    in time."""
+
+
+def _pooled(name):
+    def method(self, *args):
+        with self.connection() as db:
+            return getattr(db, name)(*args)
+    method.__name__ = name
+    method.__doc__ = getattr(Connection, name).__doc__
+    return method
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of database `Connection` objects.
+
+    The pool has the same query methods as `Connection`, each of them
+    running on a connection taken from the pool for the duration of the
+    call::
+
+        db = database.ConnectionPool("localhost", "mydatabase",
+                                     max_size=10)
+        for article in db.query("SELECT * FROM articles"):
+            print article.title
+
+    ``min_size`` connections are opened immediately and kept open.  Up
+    to ``max_size`` connections are opened on demand; when they are all
+    in use, callers wait up to ``acquire_timeout`` seconds (forever if
+    None) before `PoolTimeoutError` is raised.  Connections idle for
+    more than ``idle_timeout`` seconds are closed, and connections idle
+    for more than ``ping_interval`` seconds are checked with a ping
+    before being used.
+
+    Timing statistics of all queries are available in `stats`, a
+    `QueryStats` instance.
+    """
+    def __init__(self, host, database, user=None, password=None,
+                 min_size=1, max_size=10, max_idle_time=7*3600,
+                 idle_timeout=300, ping_interval=60, acquire_timeout=None,
+                 slow_query_time=None):
+        assert 0 <= min_size <= max_size and max_size > 0
+        self.host = host
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.acquire_timeout = acquire_timeout
+        self.stats = QueryStats(slow_query_time)
+        self._connection_args = dict(host=host, database=database,
+                                     user=user, password=password,
+                                     max_idle_time=max_idle_time,
+                                     stats=self.stats)
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, release time), most recent last
+        self._size = 0  # number of connections, idle or in use
+        self._closed = False
+        now = time.time()
+        for i in range(min_size):
+            self._idle.append((Connection(**self._connection_args), now))
+            self._size += 1
+
+    def acquire(self):
+        """Takes a connection from the pool.
+
+        The connection must be given back with `release` (see also
+        `connection`).
+        """
+        with self._cond:
+            deadline = None
+            if self.acquire_timeout is not None:
+                deadline = time.time() + self.acquire_timeout
+            while not self._idle and self._size >= self.max_size:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            "No MySQL connection to %s available after %ss" %
+                            (self.host, self.acquire_timeout))
+                    self._cond.wait(remaining)
+            if self._idle:
+                db, released = self._idle.pop()
+            else:
+                db = None
+                self._size += 1
+        if db is None:
+            try:
+                return Connection(**self._connection_args)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        if time.time() - released > self.ping_interval:
+            try:
+                db.ping()
+            except Exception:
+                logging.error("Cannot connect to MySQL on %s", self.host,
+                              exc_info=True)
+        return db
+
+    def release(self, db):
+        """Gives back a connection taken with `acquire`."""
+        now = time.time()
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                reaped = [db]
+            else:
+                self._idle.append((db, now))
+                reaped = self._reap(now)
+            self._cond.notify()
+        for db in reaped:
+            db.close()
+
+    def _reap(self, now):
+        # The least recently used connections are at the start of the
+        # idle list
+        reaped = []
+        while (self._idle and self._size > self.min_size and
+               now - self._idle[0][1] > self.idle_timeout):
+            reaped.append(self._idle.pop(0)[0])
+            self._size -= 1
+        return reaped
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Returns a context manager holding a connection of the pool::
+
+            with db.connection() as conn:
+                conn.execute("UPDATE ...")
+        """
+        db = self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    def close(self):
+        """Closes the idle connections, and the others when released."""
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+        for db, released in idle:
+            db.close()
+
+    def iter(self, query, *parameters):
+        """Returns an iterator for the given query and parameters.
+
+        The connection is held until the iterator is exhausted or
+        closed.
+        """
+        with self.connection() as db:
+            for row in db.iter(query, *parameters):
+                yield row
+
+    query = _pooled("query")
+    get = _pooled("get")
+    execute = _pooled("execute")
+    execute_lastrowid = _pooled("execute_lastrowid")
+    execute_rowcount = _pooled("execute_rowcount")
+    executemany = _pooled("executemany")
+    executemany_lastrowid = _pooled("executemany_lastrowid")
+    executemany_rowcount = _pooled("executemany_rowcount")
+
+
+def _async(name):
+    def method(self, *args, **kwargs):
+        self._submit(name, args, kwargs.get("callback"))
+    method.__name__ = name
+    method.__doc__ = ("Asynchronous version of `ConnectionPool.%s`, "
+                      "passing the result to callback." % name)
+    return method
+
+
+class AsyncConnectionPool(object):
+    """Runs the queries of a `ConnectionPool` in a pool of threads.
+
+    Query methods take the same arguments as the `ConnectionPool` ones
+    and a ``callback`` keyword argument, which is run on the `IOLoop`
+    with the query result, so that queries do not block the IOLoop::
+
+        db = database.AsyncConnectionPool(
+            database.ConnectionPool("localhost", "mydatabase"))
+
+        class ArticlesHandler(RequestHandler):
+            @asynchronous
+            @gen.engine
+            def get(self):
+                articles = yield gen.Task(
+                    db.query, "SELECT * FROM articles")
+                self.render("articles.html", articles=articles)
+
+    Exceptions raised by a query are re-raised on the IOLoop, in the
+    stack context of the caller (so a `RequestHandler` sends an error
+    page as for synchronous queries).
+
+    At most ``max_workers`` queries run at the same time, by default
+    the maximum size of the connection pool.
+    """
+    def __init__(self, pool, io_loop=None, max_workers=None):
+        self.pool = pool
+        self.io_loop = io_loop or IOLoop.instance()
+        self.max_workers = max_workers or pool.max_size
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._busy = 0
+
+    def _submit(self, name, args, callback):
+        deliver = stack_context.wrap(functools.partial(self._deliver,
+                                                       callback))
+        with self._lock:
+            self._busy += 1
+            if self._busy > len(self._workers) and \
+                    len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        self._queue.put((name, args, deliver))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            name, args, deliver = item
+            try:
+                result = getattr(self.pool, name)(*args)
+                exc_info = None
+            except Exception:
+                result = None
+                exc_info = sys.exc_info()
+            with self._lock:
+                self._busy -= 1
+            self.io_loop.add_callback(functools.partial(deliver, result,
+                                                        exc_info))
+            del item, deliver, exc_info
+
+    def _deliver(self, callback, result, exc_info):
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if callback is not None:
+            callback(result)
+
+    def close(self):
+        """Stops the worker threads once queued queries are done."""
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+        for worker in workers:
+            self._queue.put(None)
+
+    query = _async("query")
+    get = _async("get")
+    execute = _async("execute")
+    execute_lastrowid = _async("execute_lastrowid")
+    execute_rowcount = _async("execute_rowcount")
+    executemany = _async("executemany")
+    executemany_lastrowid = _async("executemany_lastrowid")
+    executemany_rowcount = _async("executemany_rowcount")
 
 
 class Row(dict):
@@ -31,6 +31,7 @@ from __future__ import with_statement
 import datetime
 import errno
 import heapq
+import operator
 import os
 import logging
 import select
@@ -112,7 +113,7 @@ class IOLoop(object):
         self._events = {}
         self._callbacks = []
         self._callback_lock = threading.Lock()
-        self._timeouts = []
+        self._timeouts = _TimerWheel()
         self._running = False
         self._stopped = False
         self._thread_ident = None
@@ -254,17 +255,18 @@ class IOLoop(object):
 
             if self._timeouts:
                 now = time.time()
-                while self._timeouts:
-                    if self._timeouts[0].callback is None:
-                        # the timeout was cancelled
-                        heapq.heappop(self._timeouts)
-                    elif self._timeouts[0].deadline <= now:
-                        timeout = heapq.heappop(self._timeouts)
-                        self._run_callback(timeout.callback)
+                for timeout in self._timeouts.pop_expired(now):
+                    # an expired timeout may be cancelled by a previous
+                    # callback of the same batch
+                    callback = timeout.callback
+                    if callback is not None:
+                        timeout.callback = None
+                        self._run_callback(callback)
                     else:
-                        milliseconds = self._timeouts[0].deadline - now
-                        poll_timeout = min(milliseconds, poll_timeout)
-                        break
+                        self._timeouts.forget(timeout)
+                deadline = self._timeouts.next_deadline(now)
+                if deadline is not None:
+                    poll_timeout = min(deadline - now, poll_timeout)
 
             if self._callbacks:
                 # If any callbacks or timeouts called add_callback,
@@ -355,7 +357,7 @@ class IOLoop(object):
         relative to the current time.
         """
         timeout = _Timeout(deadline, stack_context.wrap(callback))
-        heapq.heappush(self._timeouts, timeout)
+        self._timeouts.add(timeout)
         return timeout
 
     def remove_timeout(self, timeout):
@@ -363,12 +365,7 @@ class IOLoop(object):
 
         The argument is a handle as returned by add_timeout.
         """
-        # Removing from a heap is complicated, so just leave the defunct
-        # timeout object in the queue (see discussion in
-        # http://docs.python.org/library/heapq.html).
-        # If this turns out to be a problem, we could add a garbage
-        # collection pass whenever there are too many dead timeouts.
-        timeout.callback = None
+        self._timeouts.remove(timeout)
 
     def add_callback(self, callback):
         """Calls the given callback on the next I/O loop iteration.
@@ -443,6 +440,131 @@ class _Timeout(object):
                 (other.deadline, id(other)))
 
 
+class _TimerWheel(object):
+    """A hashed timer wheel holding the pending timeouts of an IOLoop.
+
+    Timeouts are hashed by deadline into buckets of ``resolution``
+    seconds, and a heap of bucket ticks gives the next bucket to expire,
+    so adding a timeout only touches the heap when it opens a new bucket
+    (a small integer comparison in C), and cancelling a timeout is O(1).
+    Cancelled timeouts are left in their bucket and skipped, until they
+    outnumber the pending ones and the wheel is compacted.  Compaction is
+    deferred to `next_deadline`, after the IOLoop ran the expired timeouts,
+    so that a timeout cancelled while it waits in a batch is not counted
+    twice.
+    """
+    # Don't bother compacting small wheels
+    _MIN_COMPACT = 512
+
+    def __init__(self, resolution=0.01):
+        self.resolution = resolution
+        self._buckets = {}
+        self._ticks = []
+        # number of timeouts in buckets (including cancelled ones), and
+        # number of cancellations since the last compaction
+        self._size = 0
+        self._cancelled = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, timeout):
+        tick = int(timeout.deadline / self.resolution)
+        bucket = self._buckets.get(tick)
+        if bucket is None:
+            self._buckets[tick] = [timeout]
+            heapq.heappush(self._ticks, tick)
+        else:
+            bucket.append(timeout)
+        self._size += 1
+
+    def remove(self, timeout):
+        if timeout.callback is not None:
+            timeout.callback = None
+            self._cancelled += 1
+
+    def forget(self, timeout):
+        """Accounts for an expired timeout cancelled after `pop_expired`
+        returned it, which is no longer in the wheel."""
+        self._cancelled -= 1
+
+    def compact(self):
+        """Drops cancelled timeouts and empty buckets."""
+        buckets = {}
+        size = 0
+        for tick, bucket in self._buckets.iteritems():
+            bucket = [t for t in bucket if t.callback is not None]
+            if bucket:
+                buckets[tick] = bucket
+                size += len(bucket)
+        self._buckets = buckets
+        self._ticks = buckets.keys()
+        heapq.heapify(self._ticks)
+        self._size = size
+        self._cancelled = 0
+
+    def pop_expired(self, now):
+        """Removes and returns the timeouts expired at ``now``, in deadline
+        order."""
+        expired = []
+        now_tick = int(now / self.resolution)
+        ticks = self._ticks
+        while ticks and ticks[0] <= now_tick:
+            tick = ticks[0]
+            bucket = self._buckets[tick]
+            if tick < now_tick:
+                # the whole bucket expired
+                heapq.heappop(ticks)
+                del self._buckets[tick]
+                self._size -= len(bucket)
+                pending = [t for t in bucket if t.callback is not None]
+                self._cancelled -= len(bucket) - len(pending)
+            else:
+                # current bucket: only part of it may have expired
+                pending = [t for t in bucket
+                           if t.callback is not None and t.deadline <= now]
+                if not pending:
+                    break
+                rest = [t for t in bucket
+                        if t.callback is not None and t.deadline > now]
+                self._size -= len(bucket) - len(rest)
+                self._cancelled -= len(bucket) - len(rest) - len(pending)
+                if rest:
+                    self._buckets[tick] = rest
+                else:
+                    heapq.heappop(ticks)
+                    del self._buckets[tick]
+            pending.sort(key=_deadline)
+            expired.extend(pending)
+        return expired
+
+    def next_deadline(self, now):
+        """Returns the time at which the next timeout expires, or a bit
+        earlier (at most ``resolution``), or None if there is none."""
+        if (self._cancelled > self._MIN_COMPACT and
+            self._cancelled * 2 > self._size):
+            self.compact()
+        ticks = self._ticks
+        while ticks:
+            tick = ticks[0]
+            start = tick * self.resolution
+            if start > now:
+                return start
+            deadlines = [t.deadline for t in self._buckets[tick]
+                         if t.callback is not None]
+            if deadlines:
+                return min(deadlines)
+            # only cancelled timeouts left in this bucket
+            heapq.heappop(ticks)
+            bucket = self._buckets.pop(tick)
+            self._size -= len(bucket)
+            self._cancelled -= len(bucket)
+        return None
+
+
+_deadline = operator.attrgetter("deadline")
+
+
 class PeriodicCallback(object):
     """Schedules the given callback to be called periodically.
 
@@ -18,12 +18,13 @@
 
 from __future__ import with_statement
 
-import collections
 import errno
 import logging
 import socket
-import sys
+import sre_constants
+import sre_parse
 import re
+import threading
 
 from tornado import ioloop
 from tornado import stack_context
@@ -83,10 +84,20 @@ class IOStream(object):
         self.io_loop = io_loop or ioloop.IOLoop.instance()
         self.max_buffer_size = max_buffer_size
         self.read_chunk_size = read_chunk_size
-        self._read_buffer = collections.deque()
-        self._write_buffer = collections.deque()
+        # Data is read into and written from bytearrays, consumed from
+        # a start offset.  Write data is queued aside while the buffer
+        # is frozen (see _handle_write).
+        self._read_buffer = bytearray()
+        self._read_buffer_pos = 0
         self._read_buffer_size = 0
-        self._write_buffer_frozen = False
+        self._write_buffer = bytearray()
+        self._write_buffer_pos = 0
+        self._write_buffer_frozen = None
+        self._write_queue = []
+        # Number of buffered bytes already searched by read_until and
+        # read_until_regex, and max length of a regex match
+        self._read_scanned = 0
+        self._read_regex_width = None
         self._read_delimiter = None
         self._read_regex = None
         self._read_bytes = None
@@ -138,6 +149,7 @@ class IOStream(object):
         """Call callback when we read the given regex pattern."""
         assert not self._read_callback, "Already reading"
         self._read_regex = re.compile(regex)
+        self._read_regex_width = _regex_max_width(self._read_regex)
         self._read_callback = stack_context.wrap(callback)
         while True:
             # See if we've already got the data from a previous read
@@ -211,10 +223,13 @@ class IOStream(object):
         """
         assert isinstance(data, bytes_type)
         self._check_closed()
-        self._write_buffer.append(data)
+        if self._write_buffer_frozen is None:
+            self._write_buffer += data
+        else:
+            self._write_queue.append(data)
         self._write_callback = stack_context.wrap(callback)
         self._handle_write()
-        if self._write_buffer:
+        if len(self._write_buffer) > self._write_buffer_pos:
             self._add_io_state(self.io_loop.WRITE)
         self._maybe_add_error_listener()
 
@@ -249,7 +264,7 @@ class IOStream(object):
 
     def writing(self):
         """Returns true if we are currently writing to the stream."""
-        return bool(self._write_buffer)
+        return len(self._write_buffer) > self._write_buffer_pos
 
     def closed(self):
         """Returns true if the stream has been closed."""
@@ -349,20 +364,22 @@ class IOStream(object):
     def _read_from_socket(self):
         """Attempts to read from the socket.
 
-        Returns the data read or None if there is nothing to read.
+        Returns the data read (a string or a buffer only valid until the
+        next read) or None if there is nothing to read.
         May be overridden in subclasses.
         """
+        chunk = _read_chunk.get(self.read_chunk_size)
         try:
-            chunk = self.socket.recv(self.read_chunk_size)
+            num_bytes = self.socket.recv_into(chunk, self.read_chunk_size)
         except socket.error, e:
             if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
                 return None
             else:
                 raise
-        if not chunk:
+        if not num_bytes:
             self.close()
             return None
-        return chunk
+        return chunk[:num_bytes]
 
     def _read_to_buffer(self):
         """Reads from the socket and appends the result to the read buffer.
@@ -381,7 +398,7 @@ class IOStream(object):
             raise
         if chunk is None:
             return 0
-        self._read_buffer.append(chunk)
+        self._read_buffer += chunk
         self._read_buffer_size += len(chunk)
         if self._read_buffer_size >= self.max_buffer_size:
             logging.error("Reached maximum read buffer size")
@@ -409,27 +426,40 @@ class IOStream(object):
                 self._run_callback(callback, self._consume(num_bytes))
                 return True
         elif self._read_delimiter is not None:
-            _merge_prefix(self._read_buffer, sys.maxint)
-            loc = self._read_buffer[0].find(self._read_delimiter)
+            # resume the search where the previous one stopped, minus
+            # a partially received delimiter
+            delimiter_len = len(self._read_delimiter)
+            start = self._read_buffer_pos + max(
+                0, self._read_scanned - delimiter_len + 1)
+            loc = self._read_buffer.find(self._read_delimiter, start)
             if loc != -1:
                 callback = self._read_callback
-                delimiter_len = len(self._read_delimiter)
                 self._read_callback = None
                 self._streaming_callback = None
                 self._read_delimiter = None
-                self._run_callback(callback,
-                                   self._consume(loc + delimiter_len))
+                self._read_scanned = 0
+                self._run_callback(callback, self._consume(
+                        loc - self._read_buffer_pos + delimiter_len))
                 return True
+            self._read_scanned = self._read_buffer_size
         elif self._read_regex is not None:
-            _merge_prefix(self._read_buffer, sys.maxint)
-            m = self._read_regex.search(self._read_buffer[0])
+            # search from the start of the buffer, so that anchors and
+            # lookbehinds behave as on a string of the buffered data
+            self._compact_read_buffer()
+            start = 0
+            if self._read_regex_width is not None:
+                start = max(0, self._read_scanned -
+                               self._read_regex_width + 1)
+            m = self._read_regex.search(self._read_buffer, start)
             if m:
                 callback = self._read_callback
                 self._read_callback = None
                 self._streaming_callback = None
                 self._read_regex = None
+                self._read_scanned = 0
                 self._run_callback(callback, self._consume(m.end()))
                 return True
+            self._read_scanned = self._read_buffer_size
         elif self._read_until_close:
             if self._streaming_callback is not None and self._read_buffer_size:
                 self._run_callback(self._streaming_callback,
@@ -454,40 +484,59 @@ class IOStream(object):
         self._connecting = False
 
     def _handle_write(self):
-        while self._write_buffer:
+        buf = self._write_buffer
+        while len(buf) > self._write_buffer_pos:
+            chunk = self._write_buffer_frozen
+            if chunk is None:
+                # On windows, socket.send blows up if given a
+                # write buffer that's too large, instead of just
+                # returning the number of bytes it was able to
+                # process.  Therefore we must not call socket.send
+                # with more than 128KB at a time.
+                pos = self._write_buffer_pos
+                if pos == 0 and len(buf) <= 128 * 1024:
+                    chunk = buf
+                else:
+                    chunk = memoryview(buf)[pos:pos + 128 * 1024]
             try:
-                if not self._write_buffer_frozen:
-                    # On windows, socket.send blows up if given a
-                    # write buffer that's too large, instead of just
-                    # returning the number of bytes it was able to
-                    # process.  Therefore we must not call socket.send
-                    # with more than 128KB at a time.
-                    _merge_prefix(self._write_buffer, 128 * 1024)
-                num_bytes = self.socket.send(self._write_buffer[0])
-                if num_bytes == 0:
-                    # With OpenSSL, if we couldn't write the entire buffer,
-                    # the very same string object must be used on the
-                    # next call to send.  Therefore we suppress
-                    # merging the write buffer after an incomplete send.
-                    # A cleaner solution would be to set
-                    # SSL_MODE_ACCEPT_MOVING_WRITE_BUFFER, but this is
-                    # not yet accessible from python
-                    # (http://bugs.python.org/issue8240)
-                    self._write_buffer_frozen = True
-                    break
-                self._write_buffer_frozen = False
-                _merge_prefix(self._write_buffer, num_bytes)
-                self._write_buffer.popleft()
+                num_bytes = self.socket.send(chunk)
             except socket.error, e:
                 if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
-                    self._write_buffer_frozen = True
-                    break
+                    num_bytes = 0
                 else:
                     logging.warning("Write error on %d: %s",
                                     self.socket.fileno(), e)
                     self.close()
                     return
-        if not self._write_buffer and self._write_callback:
+            if num_bytes == 0:
+                # With OpenSSL, if we couldn't write the entire buffer,
+                # the very same buffer must be used on the next call to
+                # send.  Therefore we keep the memoryview and freeze
+                # the write buffer (which cannot be resized while the
+                # memoryview exists) after an incomplete send: writes
+                # are queued aside until the next successful send.
+                # A cleaner solution would be to set
+                # SSL_MODE_ACCEPT_MOVING_WRITE_BUFFER, but this is
+                # not yet accessible from python
+                # (http://bugs.python.org/issue8240)
+                if chunk is buf:
+                    chunk = memoryview(buf)
+                self._write_buffer_frozen = chunk
+                break
+            del chunk
+            self._write_buffer_frozen = None
+            self._write_buffer_pos += num_bytes
+            if self._write_buffer_pos == len(buf):
+                del buf[:]
+                self._write_buffer_pos = 0
+            elif self._write_buffer_pos >= _COMPACT_THRESHOLD:
+                del buf[:self._write_buffer_pos]
+                self._write_buffer_pos = 0
+            if self._write_queue:
+                for data in self._write_queue:
+                    buf += data
+                self._write_queue = []
+        if len(buf) <= self._write_buffer_pos and self._write_callback:
             callback = self._write_callback
             self._write_callback = None
             self._run_callback(callback)
@@ -495,9 +544,23 @@ class IOStream(object):
     def _consume(self, loc):
         if loc == 0:
             return b("")
-        _merge_prefix(self._read_buffer, loc)
+        pos = self._read_buffer_pos
+        data = memoryview(self._read_buffer)[pos:pos + loc].tobytes()
+        self._read_buffer_pos += loc
         self._read_buffer_size -= loc
-        return self._read_buffer.popleft()
+        self._read_scanned = max(0, self._read_scanned - loc)
+        if self._read_buffer_pos >= _COMPACT_THRESHOLD:
+            self._compact_read_buffer()
+        return data
+
+    def _compact_read_buffer(self):
+        """Drops consumed data from the read buffer."""
+        if self._read_buffer_pos:
+            if self._read_buffer_size:
+                del self._read_buffer[:self._read_buffer_pos]
+            else:
+                del self._read_buffer[:]
+            self._read_buffer_pos = 0
 
     def _check_closed(self):
         if not self.socket:
@@ -650,42 +713,62 @@ class SSLIOStream(IOStream):
             return None
         return chunk
 
-def _merge_prefix(deque, size):
-    """Replace the first entries in a deque of strings with a single
-    string of up to size bytes.
-
-    >>> d = collections.deque(['abc', 'de', 'fghi', 'j'])
-    >>> _merge_prefix(d, 5); print d
-    deque(['abcde', 'fghi', 'j'])
-
-    Strings will be split as necessary to reach the desired size.
-    >>> _merge_prefix(d, 7); print d
-    deque(['abcdefg', 'hi', 'j'])
-
-    >>> _merge_prefix(d, 3); print d
-    deque(['abc', 'defg', 'hi', 'j'])
-
-    >>> _merge_prefix(d, 100); print d
-    deque(['abcdefghij'])
+# Consumed data is dropped from buffers once it reaches this size, so
+# that compaction costs are amortized over the data sent or received.
+_COMPACT_THRESHOLD = 64 * 1024
+
+class _ReadChunk(threading.local):
+    """Per-thread buffer receiving socket data before it is appended
+    to a stream read buffer, reused for all reads."""
+    def __init__(self):
+        self.size = 0
+        self.view = None
+
+    def get(self, size):
+        if size > self.size:
+            self.size = size
+            self.view = memoryview(bytearray(size))
+        return self.view
+
+_read_chunk = _ReadChunk()
+
+_ASSERTION_OPCODES = frozenset([sre_constants.ASSERT,
+                                sre_constants.ASSERT_NOT,
+                                sre_constants.AT,
+                                sre_constants.GROUPREF])
+
+def _regex_has_assertion(items):
+    for item in items:
+        if isinstance(item, tuple) and len(item) == 2 and \
+                item[0] in _ASSERTION_OPCODES:
+            return True
+        if isinstance(item, (tuple, list, sre_parse.SubPattern)) and \
+                _regex_has_assertion(item):
+            return True
+    return False
+
+def _regex_max_width(regex):
+    """Returns the maximum length of a match of a compiled regex, or
+    None if it is unbounded or if the regex contains assertions, which
+    may look beyond the match.
+
+    >>> _regex_max_width(re.compile("\\r?\\n\\r?\\n"))
+    4
+    >>> print _regex_max_width(re.compile("a+b"))
+    None
+    >>> print _regex_max_width(re.compile("ab$"))
+    None
     """
-    if len(deque) == 1 and len(deque[0]) <= size:
-        return
-    prefix = []
-    remaining = size
-    while deque and remaining > 0:
-        chunk = deque.popleft()
-        if len(chunk) > remaining:
-            deque.appendleft(chunk[remaining:])
-            chunk = chunk[:remaining]
-        prefix.append(chunk)
-        remaining -= len(chunk)
-    # This data structure normally just contains byte strings, but
-    # the unittest gets messy if it doesn't use the default str() type,
-    # so do the merge based on the type of data that's actually present.
-    if prefix:
-        deque.appendleft(type(prefix[0])().join(prefix))
-    if not deque:
-        deque.appendleft(b(""))
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+        if _regex_has_assertion(parsed.data):
+            return None
+        width = parsed.getwidth()[1]
+    except Exception:
+        return None
+    if width >= sre_constants.MAXREPEAT or width >= _COMPACT_THRESHOLD:
+        return None
+    return width
 
 def doctests():
     import doctest
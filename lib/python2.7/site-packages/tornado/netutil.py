@@ -19,11 +19,13 @@
 import errno
 import logging
 import os
+import signal
 import socket
 import stat
+import time
 
 from tornado import process
-from tornado.ioloop import IOLoop
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.iostream import IOStream, SSLIOStream
 from tornado.platform.auto import set_close_exec
 
@@ -67,6 +69,11 @@ class TCPServer(object):
        to the `TCPServer` constructor.  `start` will always start
        the server on the default singleton `IOLoop`.
 
+       With ``bind(8888, reuse_port=True)``, each sub-process binds
+       its own listening socket with ``SO_REUSEPORT`` and the kernel
+       balances incoming connections between them, instead of waking
+       up all the processes sharing a single socket.
+
     3. `add_sockets`: advanced multi-process::
 
             sockets = bind_sockets(8888)
@@ -87,7 +94,9 @@ class TCPServer(object):
         self.ssl_options = ssl_options
         self._sockets = {}  # fd -> socket object
         self._pending_sockets = []
+        self._pending_binds = []  # reuse_port binds done after forking
         self._started = False
+        self._stopping = False
 
     def listen(self, port, address=""):
         """Starts accepting connections on the given port.
@@ -121,7 +130,8 @@ class TCPServer(object):
         """Singular version of `add_sockets`.  Takes a single socket object."""
         self.add_sockets([socket])
 
-    def bind(self, port, address=None, family=socket.AF_UNSPEC, backlog=128):
+    def bind(self, port, address=None, family=socket.AF_UNSPEC, backlog=128,
+             reuse_port=False):
         """Binds this server to the given port on the given address.
 
         To start the server, call `start`. If you want to run this server
@@ -140,15 +150,24 @@ class TCPServer(object):
 
         This method may be called multiple times prior to `start` to listen
         on multiple ports or interfaces.
+
+        If ``reuse_port`` is true, the sockets are bound with
+        ``SO_REUSEPORT`` by `start`, after forking, so that each process
+        has its own accept queue.
         """
+        if reuse_port and not self._started:
+            self._pending_binds.append(dict(port=port, address=address,
+                                            family=family, backlog=backlog,
+                                            reuse_port=True))
+            return
         sockets = bind_sockets(port, address=address, family=family,
-                               backlog=backlog)
+                               backlog=backlog, reuse_port=reuse_port)
         if self._started:
             self.add_sockets(sockets)
         else:
             self._pending_sockets.extend(sockets)
 
-    def start(self, num_processes=1):
+    def start(self, num_processes=1, shutdown_timeout=5.0, **kwargs):
         """Starts this server in the IOLoop.
 
         By default, we run the server in this process and do not fork any
@@ -166,14 +185,42 @@ class TCPServer(object):
         module (or the ``debug=True`` option to `tornado.web.Application`).
         When using multiple processes, no IOLoops can be created or
         referenced until after the call to ``TCPServer.start(n)``.
+        Additional keyword arguments (``max_restarts``, ``stats_port``,
+        ``restart_delay``) are passed to `tornado.process.fork_processes`.
+
+        Sub-processes stop listening when they receive SIGTERM (as done
+        by the rolling restart of `tornado.process.fork_processes`) and
+        stop the `IOLoop` ``shutdown_timeout`` seconds later, leaving
+        time for requests in progress to complete.
         """
         assert not self._started
         self._started = True
         if num_processes != 1:
-            process.fork_processes(num_processes)
+            process.fork_processes(num_processes, **kwargs)
         sockets = self._pending_sockets
         self._pending_sockets = []
+        for bind_args in self._pending_binds:
+            sockets.extend(bind_sockets(**bind_args))
+        self._pending_binds = []
         self.add_sockets(sockets)
+        if num_processes != 1:
+            self._install_shutdown_handler(shutdown_timeout)
+
+    def _install_shutdown_handler(self, shutdown_timeout):
+        # The signal handler only sets a flag: IOLoop methods are not
+        # reentrant, so the flag is checked from a periodic callback.
+        def on_sigterm(signum, frame):
+            self._stopping = True
+        def check_stopping():
+            if self._stopping:
+                periodic.stop()
+                logging.info("Stopping server (pid %d)", os.getpid())
+                self.stop()
+                self.io_loop.add_timeout(time.time() + shutdown_timeout,
+                                         self.io_loop.stop)
+        periodic = PeriodicCallback(check_stopping, 100, io_loop=self.io_loop)
+        periodic.start()
+        signal.signal(signal.SIGTERM, on_sigterm)
 
     def stop(self):
         """Stops listening for new connections.
@@ -184,6 +231,7 @@ class TCPServer(object):
         for fd, sock in self._sockets.iteritems():
             self.io_loop.remove_handler(fd)
             sock.close()
+        self._sockets = {}
 
     def handle_stream(self, stream, address):
         """Override to handle a new `IOStream` from an incoming connection."""
@@ -217,7 +265,8 @@ class TCPServer(object):
             logging.error("Error in connection callback", exc_info=True)
 
 
-def bind_sockets(port, address=None, family=socket.AF_UNSPEC, backlog=128):
+def bind_sockets(port, address=None, family=socket.AF_UNSPEC, backlog=128,
+                 reuse_port=False):
     """Creates listening sockets bound to the given port and address.
 
     Returns a list of socket objects (multiple sockets are returned if
@@ -233,6 +282,10 @@ def bind_sockets(port, address=None, family=socket.AF_UNSPEC, backlog=128):
 
     The ``backlog`` argument has the same meaning as for 
     ``socket.listen()``.
+
+    If ``reuse_port`` is true, the sockets are bound with
+    ``SO_REUSEPORT`` (Linux 3.9+ and BSDs), so that several processes
+    can listen on the same port with their own accept queue.
     """
     sockets = []
     if address == "":
@@ -250,6 +303,8 @@ def bind_sockets(port, address=None, family=socket.AF_UNSPEC, backlog=128):
         sock = socket.socket(af, socktype, proto)
         set_close_exec(sock.fileno())
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, _SO_REUSEPORT, 1)
         if af == socket.AF_INET6:
             # On linux, ipv6 sockets accept ipv4 too by default,
             # but this makes it impossible to bind to both
@@ -267,6 +322,9 @@ def bind_sockets(port, address=None, family=socket.AF_UNSPEC, backlog=128):
         sockets.append(sock)
     return sockets
 
+# Python 2 does not define SO_REUSEPORT, use the linux value as fallback
+_SO_REUSEPORT = getattr(socket, "SO_REUSEPORT", 15)
+
 if hasattr(socket, 'AF_UNIX'):
     def bind_unix_socket(file, mode=0600, backlog=128):
         """Creates a listening unix socket.
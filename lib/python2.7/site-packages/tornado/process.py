@@ -16,15 +16,22 @@
 
 """Utilities for working with multiple processes."""
 
+import bisect
 import errno
 import logging
+import mmap
 import os
+import select
+import signal
+import socket
+import struct
 import sys
 import time
 
 from binascii import hexlify
 
 from tornado import ioloop
+from tornado.escape import json_encode
 
 try:
     import multiprocessing # Python 2.6+
@@ -59,9 +66,68 @@ def _reseed_random():
     random.seed(seed)
 
 
+# Upper bounds (in seconds) of the request latency histogram buckets,
+# the last bucket counting slower requests.
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+                   0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+class WorkerStats(object):
+    """Request counters and latency histograms of worker processes.
+
+    Counters are kept in an anonymous shared memory segment created by
+    the master before forking, with one slot per worker process.  A
+    worker only writes to its own slot, so no locking is needed, and
+    the master reads all of them to serve aggregated statistics (see
+    the ``stats_port`` argument of `fork_processes`).
+    """
+    # requests, server errors, total latency, histogram
+    _slot_format = struct.Struct("=qqd%dq" % (len(LATENCY_BUCKETS) + 1))
+
+    def __init__(self, num_slots):
+        self.num_slots = num_slots
+        self._mmap = mmap.mmap(-1, self._slot_format.size * num_slots)
+        self._slot = None
+
+    def set_slot(self, slot):
+        """Sets the slot written by `record` in this process."""
+        self._slot = slot
+
+    def record(self, status_code, request_time):
+        """Records a completed request in the slot of this process."""
+        if self._slot is None:
+            return
+        offset = self._slot * self._slot_format.size
+        values = list(self._slot_format.unpack_from(self._mmap, offset))
+        values[0] += 1
+        if status_code >= 500:
+            values[1] += 1
+        values[2] += request_time
+        values[3 + bisect.bisect_left(LATENCY_BUCKETS, request_time)] += 1
+        self._slot_format.pack_into(self._mmap, offset, *values)
+
+    def get(self, slots):
+        """Returns the sum of the counters of the given slots as a dict."""
+        requests, errors, latency = 0, 0, 0.0
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for slot in slots:
+            values = self._slot_format.unpack_from(
+                self._mmap, slot * self._slot_format.size)
+            requests += values[0]
+            errors += values[1]
+            latency += values[2]
+            for i, count in enumerate(values[3:]):
+                histogram[i] += count
+        return dict(requests=requests, errors=errors,
+                    mean_latency=latency / requests if requests else 0.0,
+                    histogram=histogram)
+
+
 _task_id = None
+_worker_stats = None
+_restart_requested = False
 
-def fork_processes(num_processes, max_restarts=100):
+def fork_processes(num_processes, max_restarts=100, stats_port=None,
+                   restart_delay=1.0):
     """Starts multiple worker processes.
 
     If ``num_processes`` is None or <= 0, we detect the number of cores
@@ -84,8 +150,23 @@ def fork_processes(num_processes, max_restarts=100):
     process, ``fork_processes`` returns None if all child processes
     have exited normally, but will otherwise only exit by throwing an
     exception.
+
+    Sending SIGHUP to the parent process restarts the child processes
+    one at a time: a new child is started with the same task id, and
+    the old one is sent SIGTERM ``restart_delay`` seconds later.
+    Servers started with ``TCPServer.start`` stop accepting connections
+    on SIGTERM and exit once in-flight requests had time to complete.
+    Combined with listening sockets bound in each child with
+    ``reuse_port=True`` (see `tornado.netutil.bind_sockets`), this
+    allows upgrading a server without refusing connections.
+
+    If ``stats_port`` is given, child processes record their requests
+    in a `WorkerStats` shared memory segment (`tornado.web.Application`
+    does it through `worker_stats`), and the parent process serves the
+    per-process and aggregated request counts and latency histograms
+    as JSON on http://127.0.0.1:stats_port/.
     """
-    global _task_id
+    global _task_id, _worker_stats, _restart_requested
     assert _task_id is None
     if num_processes is None or num_processes <= 0:
         num_processes = cpu_count()
@@ -94,14 +175,30 @@ def fork_processes(num_processes, max_restarts=100):
                            "has already been initialized. You cannot call "
                            "IOLoop.instance() before calling start_processes()")
     logging.info("Starting %d processes", num_processes)
+    stats = None
+    stats_sockets = []
+    if stats_port is not None:
+        # each task id alternates between two slots, so that a child
+        # replaced by a rolling restart does not share its slot with
+        # the new one
+        stats = WorkerStats(2 * num_processes)
+        stats_sockets.append(_bind_stats_socket(stats_port))
     children = {}
+    generations = {}
     def start_child(i):
+        generations[i] = generations.get(i, -1) + 1
         pid = os.fork()
         if pid == 0:
             # child process
             _reseed_random()
-            global _task_id
+            global _task_id, _worker_stats
             _task_id = i
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            for sock in stats_sockets:
+                sock.close()
+            if stats is not None:
+                stats.set_slot(_stats_slot(i, generations[i], num_processes))
+                _worker_stats = stats
             return i
         else:
             children[pid] = i
@@ -109,31 +206,122 @@ def fork_processes(num_processes, max_restarts=100):
     for i in range(num_processes):
         id = start_child(i)
         if id is not None: return id
+    def on_sighup(signum, frame):
+        global _restart_requested
+        _restart_requested = True
+    signal.signal(signal.SIGHUP, on_sighup)
     num_restarts = 0
+    restart_queue = []
+    retiring = set()  # old children of a rolling restart
+    retire = None  # (deadline, pid) of the next child to retire
     while children:
+        if _restart_requested:
+            _restart_requested = False
+            logging.info("Rolling restart of %d processes", num_processes)
+            restart_queue.extend(i for i in sorted(set(children.values()))
+                                 if i not in restart_queue)
+        now = time.time()
+        if retire is not None and now >= retire[0]:
+            try:
+                os.kill(retire[1], signal.SIGTERM)
+            except OSError, e:
+                if e.errno != errno.ESRCH:
+                    raise
+            retire = None
+        if retire is None and restart_queue:
+            id = restart_queue.pop(0)
+            old_pids = [pid for pid, i in children.iteritems()
+                        if i == id and pid not in retiring]
+            new_id = start_child(id)
+            if new_id is not None: return new_id
+            if old_pids:
+                retiring.add(old_pids[0])
+                retire = (now + restart_delay, old_pids[0])
         try:
-            pid, status = os.wait()
-        except OSError, e:
-            if e.errno == errno.EINTR:
+            readable = select.select(stats_sockets, [], [], 0.1)[0]
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
+            readable = []
+        for sock in readable:
+            _serve_stats(sock, stats, children, generations, num_processes,
+                         num_restarts)
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ECHILD:
+                    break
+                raise
+            if pid == 0:
+                break
+            if pid not in children:
                 continue
-            raise
-        if pid not in children:
-            continue
-        id = children.pop(pid)
-        if os.WIFSIGNALED(status):
-            logging.warning("child %d (pid %d) killed by signal %d, restarting",
-                            id, pid, os.WTERMSIG(status))
-        elif os.WEXITSTATUS(status) != 0:
-            logging.warning("child %d (pid %d) exited with status %d, restarting",
-                            id, pid, os.WEXITSTATUS(status))
-        else:
-            logging.info("child %d (pid %d) exited normally", id, pid)
-            continue
-        num_restarts += 1
-        if num_restarts > max_restarts:
-            raise RuntimeError("Too many child restarts, giving up")
-        new_id = start_child(id)
-        if new_id is not None: return new_id
+            id = children.pop(pid)
+            if pid in retiring:
+                retiring.discard(pid)
+                logging.info("child %d (pid %d) replaced", id, pid)
+                continue
+            if os.WIFSIGNALED(status):
+                logging.warning("child %d (pid %d) killed by signal %d, restarting",
+                                id, pid, os.WTERMSIG(status))
+            elif os.WEXITSTATUS(status) != 0:
+                logging.warning("child %d (pid %d) exited with status %d, restarting",
+                                id, pid, os.WEXITSTATUS(status))
+            else:
+                logging.info("child %d (pid %d) exited normally", id, pid)
+                continue
+            num_restarts += 1
+            if num_restarts > max_restarts:
+                raise RuntimeError("Too many child restarts, giving up")
+            new_id = start_child(id)
+            if new_id is not None: return new_id
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    for sock in stats_sockets:
+        sock.close()
+
+def _stats_slot(task_id, generation, num_processes):
+    return task_id + num_processes * (generation % 2)
+
+def _bind_stats_socket(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(16)
+    sock.setblocking(0)
+    return sock
+
+def _serve_stats(sock, stats, children, generations, num_processes,
+                 num_restarts):
+    """Answers a stats request on the parent process stats socket."""
+    try:
+        connection, address = sock.accept()
+    except socket.error, e:
+        if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+            return
+        raise
+    try:
+        connection.settimeout(1.0)
+        connection.recv(4096)
+        workers = []
+        for pid, id in sorted(children.iteritems(), key=lambda c: c[1]):
+            worker = stats.get([_stats_slot(id, g, num_processes)
+                                for g in range(min(generations[id] + 1, 2))])
+            worker.update(id=id, pid=pid)
+            workers.append(worker)
+        total = stats.get(range(stats.num_slots))
+        body = json_encode(dict(workers=workers, total=total,
+                                latency_buckets=LATENCY_BUCKETS,
+                                restarts=num_restarts))
+        connection.sendall("HTTP/1.0 200 OK\r\n"
+                           "Content-Type: application/json\r\n"
+                           "Content-Length: %d\r\n\r\n%s" % (len(body), body))
+    except socket.error, e:
+        logging.warning("Error serving stats: %s", e)
+    finally:
+        connection.close()
 
 def task_id():
     """Returns the current task id, if any.
@@ -142,3 +330,11 @@ def task_id():
     """
     global _task_id
     return _task_id
+
+def worker_stats():
+    """Returns the `WorkerStats` of the current process.
+
+    Returns None if this process was not created by `fork_processes`
+    with a ``stats_port``.
+    """
+    return _worker_stats
@@ -51,9 +51,9 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
     replace tornado.httpclient.AsyncHTTPClient.
 
     Some features found in the curl-based AsyncHTTPClient are not yet
-    supported.  In particular, proxies are not supported, connections
-    are not reused, and callers cannot select the network interface to be 
-    used.
+    supported.  In particular, proxies are not supported, and callers
+    cannot select the network interface to be used.  Connections are
+    only reused if the keep-alive pool is enabled (see `initialize`).
 
     Python 2.6 or higher is required for HTTPS support.  Users of Python 2.5
     should use the curl-based AsyncHTTPClient if HTTPS support is required.
@@ -61,7 +61,9 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
     """
     def initialize(self, io_loop=None, max_clients=10,
                    max_simultaneous_connections=None,
-                   hostname_mapping=None, max_buffer_size=104857600):
+                   hostname_mapping=None, max_buffer_size=104857600,
+                   max_idle_per_host=0, idle_timeout=60.0,
+                   dns_cache_ttl=0):
         """Creates a AsyncHTTPClient.
 
         Only a single AsyncHTTPClient instance exists per IOLoop
@@ -81,6 +83,17 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
 
         max_buffer_size is the number of bytes that can be read by IOStream. It
         defaults to 100mb.
+
+        max_idle_per_host enables the keep-alive connection pool: after
+        a complete response, up to this many connections per (scheme,
+        host, port) are kept open for reuse by later requests, and closed
+        after idle_timeout seconds without use.  Requests are never
+        pipelined: a connection is only reused once the previous response
+        has been read.  A GET or HEAD request whose reused connection is
+        closed by the server before any response is retried once on a
+        new connection.  dns_cache_ttl is the number of seconds to cache
+        getaddrinfo results for.  Both are disabled by default; hits and
+        misses are counted in the pool_stats dictionary.
         """
         self.io_loop = io_loop
         self.max_clients = max_clients
@@ -88,6 +101,25 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
         self.active = {}
         self.hostname_mapping = hostname_mapping
         self.max_buffer_size = max_buffer_size
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        # pool key -> deque of (stream, idle timeout handle)
+        self._idle_streams = {}
+        # (host, port, family) -> (expiration time, addrinfo)
+        self._dns_cache = {}
+        self.pool_stats = dict(hits=0, misses=0, retries=0,
+                               dns_hits=0, dns_misses=0)
+
+    def close(self):
+        for idle in self._idle_streams.values():
+            while idle:
+                stream, timeout = idle.pop()
+                self.io_loop.remove_timeout(timeout)
+                stream.set_close_callback(None)
+                stream.close()
+        self._idle_streams.clear()
+        super(SimpleAsyncHTTPClient, self).close()
 
     def fetch(self, request, callback, **kwargs):
         if not isinstance(request, HTTPRequest):
@@ -117,6 +149,71 @@ class SimpleAsyncHTTPClient(AsyncHTTPClient):
         del self.active[key]
         self._process_queue()
 
+    def _resolve(self, host, port, af):
+        """Returns the first getaddrinfo result, cached for dns_cache_ttl."""
+        if self.dns_cache_ttl > 0:
+            key = (host, port, af)
+            now = time.time()
+            cached = self._dns_cache.get(key)
+            if cached is not None and cached[0] > now:
+                self.pool_stats["dns_hits"] += 1
+                return cached[1]
+            self.pool_stats["dns_misses"] += 1
+        addrinfo = socket.getaddrinfo(host, port, af, socket.SOCK_STREAM,
+                                      0, 0)[0]
+        if self.dns_cache_ttl > 0:
+            self._dns_cache[key] = (now + self.dns_cache_ttl, addrinfo)
+        return addrinfo
+
+    def _get_idle_stream(self, key):
+        """Returns an idle connection to reuse for key, or None."""
+        if self.max_idle_per_host <= 0:
+            return None
+        idle = self._idle_streams.get(key)
+        while idle:
+            # most recently used first, the least likely to be stale
+            stream, timeout = idle.pop()
+            self.io_loop.remove_timeout(timeout)
+            if not stream.closed():
+                if not idle:
+                    del self._idle_streams[key]
+                self.pool_stats["hits"] += 1
+                return stream
+        self._idle_streams.pop(key, None)
+        self.pool_stats["misses"] += 1
+        return None
+
+    def _put_idle_stream(self, key, stream):
+        """Keeps a connection for reuse, or closes it if the pool is full."""
+        idle = self._idle_streams.setdefault(key, collections.deque())
+        if len(idle) >= self.max_idle_per_host:
+            stream.close()
+            return
+        with stack_context.NullContext():
+            timeout = self.io_loop.add_timeout(
+                time.time() + self.idle_timeout,
+                functools.partial(self._close_idle_stream, key, stream))
+            stream.set_close_callback(
+                functools.partial(self._discard_idle_stream, key, stream))
+        idle.append((stream, timeout))
+
+    def _close_idle_stream(self, key, stream):
+        self._discard_idle_stream(key, stream, remove_timeout=False)
+        stream.close()
+
+    def _discard_idle_stream(self, key, stream, remove_timeout=True):
+        idle = self._idle_streams.get(key)
+        if not idle:
+            return
+        for entry in idle:
+            if entry[0] is stream:
+                idle.remove(entry)
+                if remove_timeout:
+                    self.io_loop.remove_timeout(entry[1])
+                break
+        if not idle:
+            del self._idle_streams[key]
+
 
 
 class _HTTPConnection(object):
@@ -134,6 +231,12 @@ class _HTTPConnection(object):
         self.headers = None
         self.chunks = None
         self._decompressor = None
+        self.max_buffer_size = max_buffer_size
+        # Keep-alive pool key, and whether the stream came from the pool
+        self._pool_key = None
+        self._reused = False
+        # Whether the response allows reusing the connection
+        self._keep_alive = False
         # Timeout handle returned by IOLoop.add_timeout
         self._timeout = None
         with stack_context.StackContext(self.cleanup):
@@ -161,46 +264,57 @@ class _HTTPConnection(object):
                 host = host[1:-1]
             if self.client.hostname_mapping is not None:
                 host = self.client.hostname_mapping.get(host, host)
-
-            if request.allow_ipv6:
-                af = socket.AF_UNSPEC
+            self._pool_key = (parsed.scheme, host, port, request.allow_ipv6,
+                              request.validate_cert, request.ca_certs,
+                              request.client_key, request.client_cert)
+            self.stream = self.client._get_idle_stream(self._pool_key)
+            if self.stream is not None:
+                self._reused = True
+                self.stream.set_close_callback(self._on_close)
+                self._on_connect(parsed)
             else:
-                # We only try the first IP we get from getaddrinfo,
-                # so restrict to ipv4 by default.
-                af = socket.AF_INET
-
-            addrinfo = socket.getaddrinfo(host, port, af, socket.SOCK_STREAM,
-                                          0, 0)
-            af, socktype, proto, canonname, sockaddr = addrinfo[0]
-
-            if parsed.scheme == "https":
-                ssl_options = {}
-                if request.validate_cert:
-                    ssl_options["cert_reqs"] = ssl.CERT_REQUIRED
-                if request.ca_certs is not None:
-                    ssl_options["ca_certs"] = request.ca_certs
-                else:
-                    ssl_options["ca_certs"] = _DEFAULT_CA_CERTS
-                if request.client_key is not None:
-                    ssl_options["keyfile"] = request.client_key
-                if request.client_cert is not None:
-                    ssl_options["certfile"] = request.client_cert
-                self.stream = SSLIOStream(socket.socket(af, socktype, proto),
-                                          io_loop=self.io_loop,
-                                          ssl_options=ssl_options,
-                                          max_buffer_size=max_buffer_size)
+                self._connect(parsed, host, port)
+
+    def _connect(self, parsed, host, port):
+        request = self.request
+        if request.allow_ipv6:
+            af = socket.AF_UNSPEC
+        else:
+            # We only try the first IP we get from getaddrinfo,
+            # so restrict to ipv4 by default.
+            af = socket.AF_INET
+
+        addrinfo = self.client._resolve(host, port, af)
+        af, socktype, proto, canonname, sockaddr = addrinfo
+
+        if parsed.scheme == "https":
+            ssl_options = {}
+            if request.validate_cert:
+                ssl_options["cert_reqs"] = ssl.CERT_REQUIRED
+            if request.ca_certs is not None:
+                ssl_options["ca_certs"] = request.ca_certs
             else:
-                self.stream = IOStream(socket.socket(af, socktype, proto),
-                                       io_loop=self.io_loop,
-                                       max_buffer_size=max_buffer_size)
-            timeout = min(request.connect_timeout, request.request_timeout)
-            if timeout:
-                self._timeout = self.io_loop.add_timeout(
-                    self.start_time + timeout,
-                    self._on_timeout)
-            self.stream.set_close_callback(self._on_close)
-            self.stream.connect(sockaddr,
-                                functools.partial(self._on_connect, parsed))
+                ssl_options["ca_certs"] = _DEFAULT_CA_CERTS
+            if request.client_key is not None:
+                ssl_options["keyfile"] = request.client_key
+            if request.client_cert is not None:
+                ssl_options["certfile"] = request.client_cert
+            self.stream = SSLIOStream(socket.socket(af, socktype, proto),
+                                      io_loop=self.io_loop,
+                                      ssl_options=ssl_options,
+                                      max_buffer_size=self.max_buffer_size)
+        else:
+            self.stream = IOStream(socket.socket(af, socktype, proto),
+                                   io_loop=self.io_loop,
+                                   max_buffer_size=self.max_buffer_size)
+        timeout = min(request.connect_timeout, request.request_timeout)
+        if timeout:
+            self._timeout = self.io_loop.add_timeout(
+                self.start_time + timeout,
+                self._on_timeout)
+        self.stream.set_close_callback(self._on_close)
+        self.stream.connect(sockaddr,
+                            functools.partial(self._on_connect, parsed))
 
     def _on_timeout(self):
         self._timeout = None
@@ -294,6 +408,20 @@ class _HTTPConnection(object):
                                 ))
 
     def _on_close(self):
+        if (self._reused and self.code is None and
+            self.final_callback is not None and
+            self.request.method in ("GET", "HEAD")):
+            # the server closed the idle connection we reused before
+            # it got our request: retry once on a new connection
+            self._reused = False
+            self.client.pool_stats["retries"] += 1
+            if self._timeout is not None:
+                self.io_loop.remove_timeout(self._timeout)
+                self._timeout = None
+            with stack_context.StackContext(self.cleanup):
+                parsed = urlparse.urlsplit(_unicode(self.request.url))
+                self._connect(parsed, self._pool_key[1], self._pool_key[2])
+            return
         self._run_callback(HTTPResponse(
                 self.request, 599,
                 request_time=time.time() - self.start_time,
@@ -306,6 +434,12 @@ class _HTTPConnection(object):
         assert match
         self.code = int(match.group(1))
         self.headers = HTTPHeaders.parse(header_data)
+        if self.client.max_idle_per_host > 0:
+            connection = self.headers.get("Connection", "").lower()
+            if first_line.startswith("HTTP/1.1"):
+                self._keep_alive = connection != "close"
+            else:
+                self._keep_alive = connection == "keep-alive"
         if self.request.header_callback is not None:
             for k, v in self.headers.get_all():
                 self.request.header_callback("%s: %s\r\n" % (k, v))
@@ -314,7 +448,11 @@ class _HTTPConnection(object):
             # Magic parameter makes zlib module understand gzip header
             # http://stackoverflow.com/questions/1838699/how-can-i-decompress-a-gzip-stream-with-zlib
             self._decompressor = zlib.decompressobj(16+zlib.MAX_WBITS)
-        if self.headers.get("Transfer-Encoding") == "chunked":
+        if self.request.method == "HEAD" or self.code in (204, 304):
+            # These responses have no body, even if they have a
+            # Content-Length or Transfer-Encoding header
+            self._on_body(b(""))
+        elif self.headers.get("Transfer-Encoding") == "chunked":
             self.chunks = []
             self.stream.read_until(b("\r\n"), self._on_chunk_length)
         elif "Content-Length" in self.headers:
@@ -330,6 +468,7 @@ class _HTTPConnection(object):
             self.stream.read_bytes(int(self.headers["Content-Length"]),
                                    self._on_body)
         else:
+            self._keep_alive = False
             self.stream.read_until_close(self._on_body)
 
     def _on_body(self, data):
@@ -359,17 +498,27 @@ class _HTTPConnection(object):
             new_request.original_request = original_request
             final_callback = self.final_callback
             self.final_callback = None
+            self._release_stream()
             self._release()
             self.client.fetch(new_request, final_callback)
-            self.stream.close()
             return
         response = HTTPResponse(original_request,
                                 self.code, headers=self.headers,
                                 request_time=time.time() - self.start_time,
                                 buffer=buffer,
                                 effective_url=self.request.url)
+        # pool the connection first, so that it may be reused by the
+        # requests started from the release and final callbacks
+        self._release_stream()
         self._run_callback(response)
-        self.stream.close()
+
+    def _release_stream(self):
+        """Returns the connection to the pool if possible, or closes it."""
+        if self._keep_alive and not self.stream.closed():
+            self._keep_alive = False
+            self.client._put_idle_stream(self._pool_key, self.stream)
+        else:
+            self.stream.close()
 
     def _on_chunk_length(self, data):
         # TODO: "chunk extensions" http://tools.ietf.org/html/rfc2616#section-3.6.1
@@ -378,11 +527,22 @@ class _HTTPConnection(object):
             # all the data has been decompressed, so we don't need to
             # decompress again in _on_body
             self._decompressor = None
-            self._on_body(b('').join(self.chunks))
+            if self._keep_alive:
+                # consume trailers up to the final empty line before
+                # reusing the connection
+                self.stream.read_until(b("\r\n"), self._on_chunk_trailer)
+            else:
+                self._on_body(b('').join(self.chunks))
         else:
             self.stream.read_bytes(length + 2,  # chunk ends with \r\n
                               self._on_chunk_data)
 
+    def _on_chunk_trailer(self, data):
+        if data == b("\r\n"):
+            self._on_body(b('').join(self.chunks))
+        else:
+            self.stream.read_until(b("\r\n"), self._on_chunk_trailer)
+
     def _on_chunk_data(self, data):
         assert data[-2:] == b("\r\n")
         chunk = data[:-2]
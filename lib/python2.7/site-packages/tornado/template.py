@@ -27,6 +27,12 @@ the compiled templates::
     loader = template.Loader("/home/btaylor")
     print loader.load("test.html").generate(myvalue="XXX")
 
+Compiled templates can also be kept across process restarts in a
+`BytecodeCache`, so that they are not parsed and compiled again::
+
+    loader = template.Loader("/home/btaylor",
+        bytecode_cache=template.FileSystemBytecodeCache("/var/cache/tpl"))
+
 We compile all templates to raw Python. Error-reporting is currently... uh,
 interesting. Syntax for the templates::
 
@@ -171,15 +177,21 @@ and ``{%!`` if you need to include a literal ``{{`` or ``{%`` in the output.
 
 from __future__ import with_statement
 
+import ast
 import cStringIO
 import datetime
+import errno
+import hashlib
+import imp
 import logging
+import marshal
 import os.path
 import posixpath
 import re
+import tempfile
 
 from tornado import escape
-from tornado.util import bytes_type
+from tornado.util import b, bytes_type
 
 _DEFAULT_AUTOESCAPE = "xhtml_escape"
 _UNSET = object()
@@ -203,9 +215,28 @@ class Template(object):
         else:
             self.autoescape = _DEFAULT_AUTOESCAPE
         self.namespace = loader.namespace if loader else {}
-        reader = _TemplateReader(name, escape.native_str(template_string))
-        self.file = _File(_parse(reader, self))
-        self.code = self._generate_python(loader, compress_whitespace)
+        self._source = escape.native_str(template_string)
+        self._file = None
+        self.checksum = hashlib.sha1(escape.utf8(self._source)).hexdigest()
+
+        bytecode_cache = loader.bytecode_cache if loader else None
+        if bytecode_cache is not None:
+            cache_key = hashlib.sha1(b("\0").join([escape.utf8(part) for part in
+                _BYTECODE_MAGIC, name, self.checksum,
+                repr(compress_whitespace), repr(self.autoescape)])).hexdigest()
+            if self._load_bytecode(loader, bytecode_cache, cache_key):
+                return
+
+        if loader:
+            # record the templates the generated code depends on
+            dependencies = []
+            saved_dependencies = loader._dependencies
+            loader._dependencies = dependencies
+        try:
+            self.code = self._generate_python(loader, compress_whitespace)
+        finally:
+            if loader:
+                loader._dependencies = saved_dependencies
         try:
             self.compiled = compile(escape.to_unicode(self.code),
                                     "<template %s>" % self.name,
@@ -215,6 +246,44 @@ class Template(object):
             logging.error("%s code:\n%s", self.name, formatted_code)
             raise
 
+        if bytecode_cache is not None:
+            checksums = []
+            for dependency in sorted(set(dependencies)):
+                if dependency != name:
+                    checksums.append(
+                        (dependency, loader.load(dependency).checksum))
+            bytecode_cache.dump(cache_key, marshal.dumps(
+                    (checksums, self.autoescape, self.code, self.compiled)))
+
+    @property
+    def file(self):
+        """The parsed template, parsed lazily for cached templates."""
+        if self._file is None:
+            reader = _TemplateReader(self.name, self._source)
+            self._file = _File(_parse(reader, self))
+        return self._file
+
+    def _load_bytecode(self, loader, bytecode_cache, cache_key):
+        data = bytecode_cache.load(cache_key)
+        if data is None:
+            return False
+        try:
+            checksums, autoescape, code, compiled = marshal.loads(data)
+        except Exception:
+            return False
+        # The code of a template includes the code of the templates it
+        # extends or includes, which must not have been modified
+        for dependency, checksum in checksums:
+            try:
+                if loader.load(dependency).checksum != checksum:
+                    return False
+            except Exception:
+                return False
+        self.autoescape = autoescape
+        self.code = code
+        self.compiled = compiled
+        return True
+
     def generate(self, **kwargs):
         """Generate this template with the given arguments."""
         namespace = {
@@ -270,7 +339,8 @@ class Template(object):
 
 class BaseLoader(object):
     """Base class for template loaders."""
-    def __init__(self, autoescape=_DEFAULT_AUTOESCAPE, namespace=None):
+    def __init__(self, autoescape=_DEFAULT_AUTOESCAPE, namespace=None,
+                 bytecode_cache=None):
         """Creates a template loader.
 
         root_directory may be the empty string if this loader does not
@@ -278,10 +348,15 @@ class BaseLoader(object):
 
         autoescape must be either None or a string naming a function
         in the template namespace, such as "xhtml_escape".
+
+        bytecode_cache may be a `BytecodeCache` storing the compiled
+        templates across processes.
         """
         self.autoescape = autoescape
         self.namespace = namespace or {}
+        self.bytecode_cache = bytecode_cache
         self.templates = {}
+        self._dependencies = None
 
     def reset(self):
         """Resets the cache of compiled templates."""
@@ -294,6 +369,8 @@ class BaseLoader(object):
     def load(self, name, parent_path=None):
         """Loads a template."""
         name = self.resolve_path(name, parent_path=parent_path)
+        if self._dependencies is not None:
+            self._dependencies.append(name)
         if name not in self.templates:
             self.templates[name] = self._create_template(name)
         return self.templates[name]
@@ -349,10 +426,103 @@ class DictLoader(BaseLoader):
         return Template(self.dict[name], name=name, loader=self)
 
 
+# Changes whenever the format of cached templates or the generated
+# code changes
+_BYTECODE_MAGIC = "tornado-template-1" + imp.get_magic()
+
+class BytecodeCache(object):
+    """Base class of persistent caches of compiled templates.
+
+    Subclasses implement `load` and `dump` to store the data of
+    compiled templates, identified by a key which depends on the
+    template name, source and options.  Templates which extend or
+    include other templates are checked against the current source of
+    these templates before being used.
+    """
+    def load(self, key):
+        """Returns the data stored for key, or None."""
+        raise NotImplementedError()
+
+    def dump(self, key, data):
+        """Stores the data (a byte string) of a compiled template."""
+        raise NotImplementedError()
+
+    def clear(self):
+        """Removes all the cached templates."""
+        raise NotImplementedError()
+
+
+class FileSystemBytecodeCache(BytecodeCache):
+    """Stores compiled templates in files of a directory.
+
+    By default, a directory of the system temporary directory is used.
+    Cache files are written atomically, so a directory may be shared by
+    several processes.
+    """
+    def __init__(self, directory=None, pattern="__tornado_%s.cache"):
+        default = directory is None
+        if default:
+            directory = os.path.join(tempfile.gettempdir(),
+                                     "_tornado_template_cache")
+            if hasattr(os, "getuid"):
+                directory += "_%d" % os.getuid()
+        try:
+            os.makedirs(directory, 0700)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        if default and hasattr(os, "getuid") and \
+                os.stat(directory).st_uid != os.getuid():
+            # cached templates are executed, so they must not be
+            # writable by other users
+            raise RuntimeError("Template cache directory %s is not owned "
+                               "by the current user" % directory)
+        self.directory = directory
+        self.pattern = pattern
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, self.pattern % key)
+
+    def load(self, key):
+        try:
+            f = open(self._get_path(key), "rb")
+        except IOError:
+            return None
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def dump(self, key, data):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.rename(tmp_path, self._get_path(key))
+        except (IOError, OSError):
+            logging.warning("Could not write template cache %s", key,
+                            exc_info=True)
+
+    def clear(self):
+        prefix, suffix = self.pattern.split("%s")
+        for filename in os.listdir(self.directory):
+            if filename.startswith(prefix) and filename.endswith(suffix):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+
 class _Node(object):
     def each_child(self):
         return ()
 
+    def constant_value(self, writer):
+        """Returns the output of this node if it is a constant string."""
+        return None
+
     def generate(self, writer):
         raise NotImplementedError()
 
@@ -383,8 +553,19 @@ class _ChunkList(_Node):
         self.chunks = chunks
 
     def generate(self, writer):
+        # Adjacent constant chunks are output with a single append
+        constants = []
         for chunk in self.chunks:
+            value = chunk.constant_value(writer)
+            if value is not None:
+                constants.append(value)
+                continue
+            if constants:
+                _write_constant(writer, constants)
+                constants = []
             chunk.generate(writer)
+        if constants:
+            _write_constant(writer, constants)
 
     def each_child(self):
         return self.chunks
@@ -489,6 +670,19 @@ class _Expression(_Node):
         self.expression = expression
         self.raw = raw
 
+    def constant_value(self, writer):
+        # Literal expressions are evaluated when compiling the template,
+        # unless they are escaped by a function of the namespace
+        if not self.raw and writer.current_template.autoescape is not None:
+            return None
+        try:
+            value = ast.literal_eval(self.expression)
+        except (ValueError, SyntaxError):
+            return None
+        if not isinstance(value, (unicode, bytes_type)):
+            value = str(value)
+        return escape.utf8(value)
+
     def generate(self, writer):
         writer.write_line("_tmp = %s" % self.expression)
         writer.write_line("if isinstance(_tmp, _string_types):"
@@ -510,7 +704,7 @@ class _Text(_Node):
     def __init__(self, value):
         self.value = value
 
-    def generate(self, writer):
+    def constant_value(self, writer):
         value = self.value
 
         # Compress lots of white space to a single character. If the whitespace
@@ -520,8 +714,16 @@ class _Text(_Node):
             value = re.sub(r"([\t ]+)", " ", value)
             value = re.sub(r"(\s*\n\s*)", "\n", value)
 
-        if value:
-            writer.write_line('_append(%r)' % escape.utf8(value))
+        return escape.utf8(value)
+
+    def generate(self, writer):
+        _write_constant(writer, [self.constant_value(writer)])
+
+
+def _write_constant(writer, values):
+    value = b("").join(values)
+    if value:
+        writer.write_line('_append(%r)' % value)
 
 
 class ParseError(Exception):
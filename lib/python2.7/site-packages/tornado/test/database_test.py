@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+from __future__ import with_statement
+
+import sys
+import time
+import types
+import unittest
+
+from tornado.stack_context import ExceptionStackContext
+from tornado.testing import AsyncTestCase, LogTrapTestCase
+
+
+class FakeMySQLdb(object):
+    """A stand-in for the MySQLdb modules, recording the connections."""
+    class Error(Exception):
+        pass
+
+    class OperationalError(Error):
+        pass
+
+    class IntegrityError(Error):
+        pass
+
+    def __init__(self):
+        self.connections = []
+
+    def modules(self):
+        fake = self
+        mysqldb = types.ModuleType("MySQLdb")
+        mysqldb.OperationalError = self.OperationalError
+        mysqldb.IntegrityError = self.IntegrityError
+        mysqldb.connect = self.connect
+        constants = types.ModuleType("MySQLdb.constants")
+        constants.FIELD_TYPE = types.ModuleType("FIELD_TYPE")
+        constants.FIELD_TYPE.__dict__.update(
+            BLOB=252, STRING=254, VAR_STRING=253, VARCHAR=15)
+        constants.FLAG = types.ModuleType("FLAG")
+        constants.FLAG.BINARY = 128
+        converters = types.ModuleType("MySQLdb.converters")
+        converters.conversions = {252: [], 254: [], 253: [], 15: []}
+        cursors = types.ModuleType("MySQLdb.cursors")
+        cursors.SSCursor = lambda db: db.cursor()
+        mysqldb.constants = constants
+        mysqldb.converters = converters
+        mysqldb.cursors = cursors
+        return {"MySQLdb": mysqldb, "MySQLdb.constants": constants,
+                "MySQLdb.converters": converters, "MySQLdb.cursors": cursors}
+
+    def connect(self, **kwargs):
+        db = FakeConnection(self)
+        self.connections.append(db)
+        return db
+
+
+class FakeConnection(object):
+    def __init__(self, mysqldb):
+        self.mysqldb = mysqldb
+        self.alive = True
+        self.closed = False
+
+    def autocommit(self, value):
+        pass
+
+    def ping(self):
+        if not self.alive:
+            raise self.mysqldb.OperationalError(2006, "gone away")
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor(object):
+    """Runs the fake queries "SELECT" (returns its parameters as rows of
+    a "value" column), "LOST" and "DUPLICATE" (raise errors)."""
+    def __init__(self, db):
+        self.db = db
+        self.description = None
+        self.rows = []
+        self.lastrowid = self.rowcount = 0
+
+    def execute(self, query, parameters):
+        if not self.db.alive or query == "LOST":
+            raise self.db.mysqldb.OperationalError(2013, "lost connection")
+        if query == "DUPLICATE":
+            raise self.db.mysqldb.IntegrityError(1062, "duplicate entry")
+        self.description = [("value",)]
+        self.rows = [(p,) for p in parameters]
+        self.lastrowid = self.rowcount = len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+def import_database(fake):
+    """Imports a tornado.database module using the fake MySQLdb, leaving
+    sys.modules as it was."""
+    modules = fake.modules()
+    names = list(modules) + ["tornado.database"]
+    saved = dict((name, sys.modules.get(name)) for name in names)
+    sys.modules.update(modules)
+    sys.modules.pop("tornado.database", None)
+    try:
+        __import__("tornado.database")
+        return sys.modules["tornado.database"]
+    finally:
+        for name, module in saved.iteritems():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+fake_mysqldb = FakeMySQLdb()
+database = import_database(fake_mysqldb)
+
+
+class ConnectionPoolTest(LogTrapTestCase):
+    def setUp(self):
+        super(ConnectionPoolTest, self).setUp()
+        fake_mysqldb.connections = []
+
+    def make_pool(self, **kwargs):
+        return database.ConnectionPool("localhost", "test", **kwargs)
+
+    def test_query(self):
+        pool = self.make_pool()
+        self.assertEqual(pool.query("SELECT", 1, 2),
+                         [{"value": 1}, {"value": 2}])
+        self.assertEqual(pool.get("SELECT", 3).value, 3)
+        self.assertEqual(pool.execute_rowcount("SELECT", 1, 2), 2)
+        self.assertEqual(len(fake_mysqldb.connections), 1)
+
+    def test_acquire_timeout(self):
+        pool = self.make_pool(min_size=0, max_size=1, acquire_timeout=0.05)
+        db = pool.acquire()
+        start = time.time()
+        self.assertRaises(database.PoolTimeoutError, pool.acquire)
+        self.assertTrue(time.time() - start >= 0.05)
+        pool.release(db)
+        self.assertTrue(pool.acquire() is db)
+
+    def test_max_size(self):
+        pool = self.make_pool(min_size=0, max_size=2, acquire_timeout=0)
+        dbs = [pool.acquire(), pool.acquire()]
+        self.assertRaises(database.PoolTimeoutError, pool.acquire)
+        self.assertEqual(len(fake_mysqldb.connections), 2)
+        for db in dbs:
+            pool.release(db)
+
+    def test_reap_idle(self):
+        pool = self.make_pool(min_size=1, max_size=3, idle_timeout=0.01)
+        dbs = [pool.acquire() for i in range(3)]
+        for db in dbs:
+            pool.release(db)
+        self.assertEqual(pool._size, 3)
+        time.sleep(0.05)
+        # the connections idle for too long are closed when another one
+        # is released, down to min_size
+        pool.release(pool.acquire())
+        self.assertEqual(pool._size, 1)
+        self.assertEqual(len(pool._idle), 1)
+        self.assertEqual([db.closed for db in fake_mysqldb.connections],
+                         [True, True, False])
+
+    def test_ping_reconnect(self):
+        pool = self.make_pool(min_size=1, ping_interval=0)
+        fake_mysqldb.connections[0].alive = False
+        time.sleep(0.01)
+        self.assertEqual(pool.query("SELECT", 1), [{"value": 1}])
+        self.assertEqual(len(fake_mysqldb.connections), 2)
+        self.assertTrue(fake_mysqldb.connections[0].closed)
+
+    def test_lost_connection(self):
+        pool = self.make_pool(min_size=1)
+        self.assertRaises(database.OperationalError, pool.query, "LOST")
+        # the connection is re-opened by the next query
+        self.assertEqual(pool.query("SELECT", 1), [{"value": 1}])
+        self.assertEqual(len(fake_mysqldb.connections), 2)
+
+    def test_close(self):
+        pool = self.make_pool(min_size=2)
+        db = pool.acquire()
+        pool.close()
+        self.assertEqual([c.closed for c in fake_mysqldb.connections],
+                         [True, False])
+        pool.release(db)
+        self.assertTrue(fake_mysqldb.connections[1].closed)
+        self.assertEqual(pool._size, 0)
+
+    def test_stats(self):
+        pool = self.make_pool()
+        pool.query("SELECT", 1)
+        pool.query("SELECT", 2)
+        self.assertRaises(database.IntegrityError, pool.execute, "DUPLICATE")
+        stats = pool.stats.get()
+        self.assertEqual(stats["SELECT"]["count"], 2)
+        self.assertEqual(stats["SELECT"]["errors"], 0)
+        self.assertEqual(stats["DUPLICATE"]["count"], 1)
+        self.assertEqual(stats["DUPLICATE"]["errors"], 1)
+        self.assertTrue(stats["SELECT"]["max_time"] <=
+                        stats["SELECT"]["total_time"])
+        pool.stats.reset()
+        self.assertEqual(pool.stats.get(), {})
+
+
+class QueryStatsTest(LogTrapTestCase):
+    def test_record(self):
+        stats = database.QueryStats(slow_query_time=0.5)
+        stats.record("q", 0.25)
+        stats.record("q", 0.75, error=True)
+        self.assertEqual(stats.get(), {"q": dict(count=2, errors=1,
+                                                 total_time=1.0,
+                                                 mean_time=0.5,
+                                                 max_time=0.75)})
+
+
+class AsyncConnectionPoolTest(AsyncTestCase, LogTrapTestCase):
+    def setUp(self):
+        super(AsyncConnectionPoolTest, self).setUp()
+        self.pool = database.AsyncConnectionPool(
+            database.ConnectionPool("localhost", "test", max_size=2),
+            io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.pool.close()
+        super(AsyncConnectionPoolTest, self).tearDown()
+
+    def test_query(self):
+        self.pool.query("SELECT", 1, 2, callback=self.stop)
+        self.assertEqual(self.wait(), [{"value": 1}, {"value": 2}])
+
+    def test_concurrent_queries(self):
+        results = []
+        def callback(result):
+            results.append(result)
+            if len(results) == 5:
+                self.stop()
+        for i in range(5):
+            self.pool.get("SELECT", i, callback=callback)
+        self.wait()
+        self.assertEqual(sorted(row.value for row in results), range(5))
+        self.assertTrue(len(self.pool._workers) <= 2)
+
+    def test_error(self):
+        # the error is raised in the stack context of the caller
+        def handle_exception(typ, value, tb):
+            self.stop(typ)
+            return True
+        with ExceptionStackContext(handle_exception):
+            self.pool.execute("DUPLICATE", callback=self.stop)
+        self.assertTrue(self.wait() is database.IntegrityError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -28,5 +28,90 @@ class TestIOLoop(AsyncTestCase, LogTrapTestCase):
         self.io_loop.add_timeout(datetime.timedelta(microseconds=1), self.stop)
         self.wait()
 
+    def test_remove_timeout(self):
+        calls = []
+        self.io_loop.add_timeout(time.time() + 0.01, lambda: calls.append(1))
+        timeout = self.io_loop.add_timeout(time.time() + 0.01,
+                                           lambda: calls.append(2))
+        self.io_loop.remove_timeout(timeout)
+        self.io_loop.add_timeout(time.time() + 0.02, self.stop)
+        self.wait()
+        self.assertEqual(calls, [1])
+        # removing an expired timeout has no effect
+        self.io_loop.remove_timeout(timeout)
+
+    def test_remove_timeout_from_callback(self):
+        # timeouts expiring together may cancel each other
+        calls = []
+        deadline = time.time()
+        def first():
+            calls.append(1)
+            self.io_loop.remove_timeout(second)
+        self.io_loop.add_timeout(deadline, first)
+        second = self.io_loop.add_timeout(deadline, lambda: calls.append(2))
+        self.io_loop.add_timeout(deadline + 0.01, self.stop)
+        self.wait()
+        self.assertEqual(calls, [1])
+        self.assertEqual(self.io_loop._timeouts._cancelled, 0)
+
+    def test_cancelled_timeouts_count(self):
+        # cancelled timeouts are uncounted when dropped
+        now = time.time()
+        for i in range(10):
+            timeout = self.io_loop.add_timeout(now + i * 0.001, lambda: None)
+            self.io_loop.remove_timeout(timeout)
+        self.io_loop.add_timeout(now + 0.02, self.stop)
+        self.wait()
+        self.assertEqual(self.io_loop._timeouts._cancelled, 0)
+
+    def test_cancelled_timeouts_count_compaction(self):
+        # a timeout of the running batch cancelled by a callback which
+        # triggers a compaction is not uncounted twice
+        now = time.time()
+        timeouts = [self.io_loop.add_timeout(now + 3600 + i, lambda: None)
+                    for i in range(1100)]
+        def first():
+            self.io_loop.remove_timeout(second)
+        self.io_loop.add_timeout(now - 1, first)
+        second = self.io_loop.add_timeout(now - 1, lambda: None)
+        for timeout in timeouts[:551]:
+            self.io_loop.remove_timeout(timeout)
+        self.io_loop.add_callback(self.stop)
+        self.wait()
+        self.assertEqual(self.io_loop._timeouts._cancelled, 0)
+        # and the timeout of wait()
+        self.assertEqual(len(self.io_loop._timeouts), 549 + 1)
+
+    def test_timeout_order(self):
+        calls = []
+        now = time.time()
+        for delay in (0.03, 0.001, 0.02, 0.0015, 0.01):
+            self.io_loop.add_timeout(now + delay,
+                                     lambda delay=delay: calls.append(delay))
+        self.io_loop.add_timeout(now + 0.04, self.stop)
+        self.wait()
+        self.assertEqual(calls, [0.001, 0.0015, 0.01, 0.02, 0.03])
+
+    def test_timeout_not_early(self):
+        deadline = time.time() + 0.05
+        self.io_loop.add_timeout(deadline, lambda: self.stop(time.time()))
+        self.assertTrue(self.wait() >= deadline)
+
+    def test_cancelled_timeouts_compaction(self):
+        now = time.time()
+        timeouts = [self.io_loop.add_timeout(now + 3600 + i, lambda: None)
+                    for i in range(2000)]
+        for timeout in timeouts[:1500]:
+            self.io_loop.remove_timeout(timeout)
+        # the wheel is compacted by the next iteration of the loop
+        self.io_loop.add_callback(self.stop)
+        self.wait()
+        self.assertTrue(len(self.io_loop._timeouts) < 1500)
+        for timeout in timeouts[1500:]:
+            self.io_loop.remove_timeout(timeout)
+        self.io_loop._timeouts.compact()
+        # only the timeout of wait() is left
+        self.assertEqual(len(self.io_loop._timeouts), 1)
+
 if __name__ == "__main__":
     unittest.main()
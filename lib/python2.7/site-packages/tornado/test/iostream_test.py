@@ -190,3 +190,51 @@ class TestIOStream(AsyncHTTPTestCase, LogTrapTestCase):
         finally:
             server.close()
             client.close()
+
+    def test_large_write_and_late_delimiter(self):
+        server, client = self.make_iostream_pair()
+        try:
+            # many small writes, with the delimiter in the last one
+            for i in range(10000):
+                server.write(b("0123456789"))
+            server.write(b("\r\n\r\nrest"))
+            client.read_until(b("\r\n\r\n"), self.stop)
+            data = self.wait()
+            self.assertEqual(data, b("0123456789") * 10000 + b("\r\n\r\n"))
+            client.read_bytes(4, self.stop)
+            self.assertEqual(self.wait(), b("rest"))
+        finally:
+            server.close()
+            client.close()
+
+    def test_delimiter_split_across_reads(self):
+        server, client = self.make_iostream_pair(read_chunk_size=3)
+        try:
+            client.read_until(b("\r\n\r\n"), self.stop)
+            server.write(b("abcd\r\n"))
+            self.io_loop.add_timeout(time.time() + 0.01, self.stop)
+            self.wait()
+            server.write(b("\r\nefgh"))
+            self.assertEqual(self.wait(), b("abcd\r\n\r\n"))
+            client.read_until_regex(b("\r?\n\r?\n"), self.stop)
+            server.write(b("ijkl\n"))
+            self.io_loop.add_timeout(time.time() + 0.01, self.stop)
+            self.wait()
+            server.write(b("\r\n"))
+            self.assertEqual(self.wait(), b("efghijkl\n\r\n"))
+        finally:
+            server.close()
+            client.close()
+
+    def test_read_until_regex_anchor(self):
+        # anchors match at the start of the data left in the buffer
+        server, client = self.make_iostream_pair()
+        try:
+            server.write(b("abab"))
+            client.read_bytes(2, self.stop)
+            self.assertEqual(self.wait(), b("ab"))
+            client.read_until_regex(b("^ab"), self.stop)
+            self.assertEqual(self.wait(), b("ab"))
+        finally:
+            server.close()
+            client.close()
@@ -4,6 +4,8 @@ import logging
 import os
 import signal
 import sys
+import time
+from tornado.escape import json_decode
 from tornado.httpclient import HTTPClient, HTTPError
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
@@ -108,7 +110,71 @@ class ProcessTest(LogTrapTestCase):
         except Exception:
             logging.error("exception in child process %d", id, exc_info=True)
             raise
-            
+
+    def test_reuse_port_stats(self):
+        self.assertFalse(IOLoop.initialized())
+        port = get_unused_port()
+        stats_port = get_unused_port()
+        def get_url(path, port=port):
+            return "http://127.0.0.1:%d%s" % (port, path)
+        signal.alarm(5)  # master process
+        id = fork_processes(3, max_restarts=0, stats_port=stats_port)
+        if id is None:
+            self.assertTrue(task_id() is None)
+            signal.alarm(0)
+            return
+        signal.alarm(5)  # child process
+        try:
+            if id in (0, 1):
+                # each worker binds its own socket to the same port
+                sockets = bind_sockets(port, "127.0.0.1", reuse_port=True)
+                server = HTTPServer(self.get_app())
+                server.add_sockets(sockets)
+                IOLoop.instance().start()
+            elif id == 2:
+                client = HTTPClient()
+
+                def fetch(url, fail_ok=False):
+                    while True:
+                        try:
+                            return client.fetch(url)
+                        except HTTPError, e:
+                            if fail_ok and e.code == 599:
+                                return
+                            if e.code != 599:
+                                raise
+                            # workers are not listening yet
+                            time.sleep(0.05)
+
+                for i in range(10):
+                    fetch(get_url("/"))
+                # requests are recorded after the response is sent
+                for i in range(20):
+                    stats = json_decode(
+                        fetch(get_url("/", port=stats_port)).body)
+                    if stats["total"]["requests"] == 10:
+                        break
+                    time.sleep(0.05)
+                self.assertEqual(stats["total"]["requests"], 10)
+                self.assertEqual(sum(stats["total"]["histogram"]), 10)
+                workers = dict((w["id"], w) for w in stats["workers"])
+                self.assertEqual(sorted(workers), [0, 1, 2])
+                self.assertEqual(workers[0]["requests"] +
+                                 workers[1]["requests"], 10)
+                self.assertEqual(workers[2]["requests"], 0)
+
+                # stop both workers; a request may reach the socket of
+                # a worker which is exiting, so check the stats
+                while len(stats["workers"]) > 1:
+                    fetch(get_url("/?exit=0"), fail_ok=True)
+                    time.sleep(0.05)
+                    stats = json_decode(
+                        fetch(get_url("/", port=stats_port)).body)
+                os._exit(0)
+        except Exception:
+            logging.error("exception in child process %d", id, exc_info=True)
+            raise
+
 
 if os.name != 'posix' or sys.platform == 'cygwin':
     # All sorts of unixisms here
@@ -5,8 +5,10 @@ TEST_MODULES = [
     'tornado.httputil.doctests',
     'tornado.iostream.doctests',
     'tornado.util.doctests',
+    'tornado.web.doctests',
     'tornado.test.auth_test',
     'tornado.test.curl_httpclient_test',
+    'tornado.test.database_test',
     'tornado.test.escape_test',
     'tornado.test.gen_test',
     'tornado.test.httpclient_test',
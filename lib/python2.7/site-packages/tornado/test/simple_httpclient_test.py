@@ -4,6 +4,7 @@ import collections
 import gzip
 import logging
 import socket
+import time
 
 from tornado.ioloop import IOLoop
 from tornado.simple_httpclient import SimpleAsyncHTTPClient, _DEFAULT_CA_CERTS
@@ -19,6 +20,12 @@ class SimpleHTTPClientCommonTestCase(HTTPClientCommonTestCase):
         self.assertTrue(isinstance(client, SimpleAsyncHTTPClient))
         return client
 
+class KeepAliveHTTPClientCommonTestCase(HTTPClientCommonTestCase):
+    def get_http_client(self):
+        return SimpleAsyncHTTPClient(io_loop=self.io_loop,
+                                     force_instance=True,
+                                     max_idle_per_host=2, dns_cache_ttl=60)
+
 # Remove the base class from our namespace so the unittest module doesn't
 # try to run it again.
 del HTTPClientCommonTestCase
@@ -44,6 +51,72 @@ class ContentLengthHandler(RequestHandler):
         self.set_header("Content-Length", self.get_argument("value"))
         self.write("ok")
 
+class ClientPortHandler(RequestHandler):
+    def initialize(self, streams):
+        self.streams = streams
+
+    def get(self):
+        # the client port identifies the connection
+        self.streams.append(self.request.connection.stream)
+        self.write(str(self.request.connection.address[1]))
+
+class KeepAliveTestCase(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.streams = []
+        return Application([
+            url("/port", ClientPortHandler, dict(streams=self.streams)),
+            url("/hello", HelloWorldHandler),
+            ])
+
+    def setUp(self):
+        super(KeepAliveTestCase, self).setUp()
+        self.http_client = SimpleAsyncHTTPClient(self.io_loop,
+                                                 force_instance=True,
+                                                 max_idle_per_host=1,
+                                                 dns_cache_ttl=60)
+
+    def test_reuse(self):
+        ports = [self.fetch("/port").body for i in range(3)]
+        self.assertEqual(len(set(ports)), 1)
+        stats = self.http_client.pool_stats
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertEqual((stats["dns_hits"], stats["dns_misses"]), (0, 1))
+
+    def test_no_reuse_on_connection_close(self):
+        ports = [self.fetch("/port", headers={"Connection": "close"}).body
+                 for i in range(2)]
+        self.assertEqual(len(set(ports)), 2)
+        self.assertEqual(self.http_client.pool_stats["hits"], 0)
+
+    def test_max_idle_per_host(self):
+        # two concurrent requests need two connections, only one is kept
+        responses = []
+        for i in range(2):
+            self.http_client.fetch(self.get_url("/port"),
+                                   lambda r: (responses.append(r),
+                                              self.stop()))
+        self.wait(condition=lambda: len(responses) == 2)
+        ports = set(r.body for r in responses)
+        self.assertEqual(len(ports), 2)
+        self.assertTrue(self.fetch("/port").body in ports)
+        self.assertEqual(self.http_client.pool_stats["hits"], 1)
+
+    def test_idle_timeout(self):
+        self.http_client.idle_timeout = 0.01
+        port = self.fetch("/port").body
+        self.io_loop.add_timeout(time.time() + 0.05, self.stop)
+        self.wait()
+        self.assertNotEqual(self.fetch("/port").body, port)
+        self.assertEqual(self.http_client.pool_stats["hits"], 0)
+
+    def test_server_close(self):
+        port = self.fetch("/port").body
+        self.streams[0].close()
+        # the stale connection is reused before being detected as
+        # closed, so the request is retried on a new connection
+        self.assertNotEqual(self.fetch("/port").body, port)
+        self.assertEqual(self.http_client.pool_stats["retries"], 1)
+
 class SimpleHTTPClientTestCase(AsyncHTTPTestCase, LogTrapTestCase):
     def get_app(self):
         # callable objects to finish pending /trigger requests
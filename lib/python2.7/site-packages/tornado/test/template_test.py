@@ -1,5 +1,8 @@
+import shutil
+import tempfile
+
 from tornado.escape import utf8, native_str
-from tornado.template import Template, DictLoader, ParseError
+from tornado.template import Template, DictLoader, ParseError, FileSystemBytecodeCache
 from tornado.testing import LogTrapTestCase
 from tornado.util import b, bytes_type
 
@@ -94,6 +97,50 @@ class TemplateTest(LogTrapTestCase):
         self.assertEqual(template.generate(), b("foo"))
 
 
+    def test_merge_constants(self):
+        template = Template(utf8("a{% comment x %}b{{! c {% raw 'd' %}"
+                                 "{{ x }}{% raw 1 %}e"))
+        self.assertEqual(template.generate(x="<"), b("ab{{ c d&lt;1e"))
+        self.assertEqual(template.code.count("_append("), 3)
+
+
+class BytecodeCacheTest(LogTrapTestCase):
+    def setUp(self):
+        super(BytecodeCacheTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.templates = {
+            "base.html": "<b>{% block body %}{% end %}</b>",
+            "page.html": ('{% extends "base.html" %}'
+                          '{% block body %}{% include "item.html" %}{% end %}'),
+            "item.html": "{{ name }}",
+            }
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        super(BytecodeCacheTest, self).tearDown()
+
+    def load(self, template_name, **kwargs):
+        loader = DictLoader(self.templates, bytecode_cache=
+                            FileSystemBytecodeCache(self.cache_dir))
+        return loader.load(template_name).generate(**kwargs), loader
+
+    def test_cached(self):
+        result, loader = self.load("page.html", name="<x>")
+        self.assertEqual(result, b("<b>&lt;x&gt;</b>"))
+        self.assertTrue(loader.templates["page.html"]._file is not None)
+        result, loader = self.load("page.html", name="<x>")
+        self.assertEqual(result, b("<b>&lt;x&gt;</b>"))
+        # loaded from the cache without being parsed again
+        self.assertTrue(loader.templates["page.html"]._file is None)
+
+    def test_dependency_modified(self):
+        self.load("page.html", name="x")
+        self.templates["item.html"] = "[{{ name }}]"
+        result, loader = self.load("page.html", name="x")
+        self.assertEqual(result, b("<b>[x]</b>"))
+        self.assertTrue(loader.templates["page.html"]._file is not None)
+
+
 class AutoEscapeTest(LogTrapTestCase):
     def setUp(self):
         self.templates = {
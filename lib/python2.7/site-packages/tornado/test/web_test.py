@@ -3,14 +3,22 @@ from tornado.iostream import IOStream
 from tornado.template import DictLoader
 from tornado.testing import LogTrapTestCase, AsyncHTTPTestCase
 from tornado.util import b, bytes_type, ObjectDict
-from tornado.web import RequestHandler, authenticated, Application, asynchronous, url, HTTPError, StaticFileHandler, _create_signature
+from tornado.web import RequestHandler, authenticated, Application, asynchronous, url, HTTPError, StaticFileHandler, _create_signature, _Router
 
 import binascii
+import gzip
 import logging
 import os
 import re
+import shutil
 import socket
 import sys
+import tempfile
+
+try:
+    from io import BytesIO  # python 3
+except ImportError:
+    from cStringIO import StringIO as BytesIO  # python 2
 
 class CookieTestRequestHandler(RequestHandler):
     # stub out enough methods to make the secure_cookie functions work
@@ -545,6 +553,112 @@ class StaticFileTest(AsyncHTTPTestCase, LogTrapTestCase):
         self.assertEqual(response.body,
                          utf8(self.get_url("/") + "static/robots.txt?v=f71d2"))
 
+class StaticFileStreamTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.big = b("").join(utf8("%06d\n" % i) for i in range(10000))
+        f = open(os.path.join(self.static_dir, "big.txt"), "wb")
+        f.write(self.big)
+        f.close()
+        f = open(os.path.join(self.static_dir, "small.js"), "wb")
+        f.write(b("var small;"))
+        f.close()
+        f = gzip.open(os.path.join(self.static_dir, "small.js.gz"), "wb")
+        f.write(b("var small;"))
+        f.close()
+
+        class SmallCacheStaticFileHandler(StaticFileHandler):
+            CACHE_MAX_FILE_SIZE = 1024
+            STREAM_CHUNK_SIZE = 4096
+
+        return Application(static_path=self.static_dir,
+                           static_handler_class=SmallCacheStaticFileHandler)
+
+    def tearDown(self):
+        shutil.rmtree(self.static_dir)
+        super(StaticFileStreamTest, self).tearDown()
+
+    def test_stream(self):
+        response = self.fetch("/static/big.txt")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, self.big)
+        self.assertEqual(response.headers["Content-Length"],
+                         str(len(self.big)))
+
+    def test_range(self):
+        response = self.fetch("/static/big.txt",
+                              headers={"Range": "bytes=7-20"})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, self.big[7:21])
+        self.assertEqual(response.headers["Content-Range"],
+                         "bytes 7-20/%d" % len(self.big))
+        response = self.fetch("/static/big.txt",
+                              headers={"Range": "bytes=-10000"})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, self.big[-10000:])
+        response = self.fetch("/static/small.js",
+                              headers={"Range": "bytes=4-"})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.body, b("small;"))
+        response = self.fetch("/static/small.js",
+                              headers={"Range": "bytes=100-"})
+        self.assertEqual(response.code, 416)
+        self.assertEqual(response.headers["Content-Range"], "bytes */10")
+
+    def test_etag(self):
+        response = self.fetch("/static/small.js")
+        etag = response.headers["Etag"]
+        response = self.fetch("/static/small.js",
+                              headers={"If-None-Match": etag})
+        self.assertEqual(response.code, 304)
+
+    def test_gzip_variant(self):
+        response = self.fetch("/static/small.js", use_gzip=False,
+                              headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(response.body)).read(),
+                         b("var small;"))
+        response = self.fetch("/static/small.js", use_gzip=False)
+        self.assertEqual(response.body, b("var small;"))
+
+class StaticFileGzipTest(AsyncHTTPTestCase, LogTrapTestCase):
+    def get_app(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.css = b("").join(utf8("a.c%02d { color: red }\n" % i)
+                              for i in range(20))
+        f = open(os.path.join(self.static_dir, "a.css"), "wb")
+        f.write(self.css)
+        f.close()
+        return Application(static_path=self.static_dir, gzip=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.static_dir)
+        super(StaticFileGzipTest, self).tearDown()
+
+    def test_gzip(self):
+        response = self.fetch("/static/a.css")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, self.css)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_range(self):
+        response = self.fetch("/static/a.css",
+                              headers={"Range": "bytes=0-99"})
+        self.assertEqual(response.code, 206)
+        self.assertEqual(response.headers["Content-Range"],
+                         "bytes 0-99/%d" % len(self.css))
+        self.assertEqual(response.headers["Content-Length"], "100")
+        self.assertTrue("Content-Encoding" not in response.headers)
+        self.assertEqual(response.body, self.css[:100])
+
+    def test_head(self):
+        response = self.fetch("/static/a.css", method="HEAD")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Length"],
+                         str(len(self.css)))
+        self.assertEqual(response.body, b(""))
+
 class CustomStaticFileTest(AsyncHTTPTestCase, LogTrapTestCase):
     def get_app(self):
         class MyStaticFileHandler(StaticFileHandler):
@@ -571,3 +685,48 @@ class CustomStaticFileTest(AsyncHTTPTestCase, LogTrapTestCase):
     def test_static_url(self):
         response = self.fetch("/static_url/foo.txt")
         self.assertEqual(response.body, b("/static/foo.txt?v=42"))
+
+class RouterTest(LogTrapTestCase):
+    def assert_matches(self, specs, path):
+        expected = None
+        for spec in specs:
+            match = spec.regex.match(path)
+            if match:
+                expected = (spec, match.groups())
+                break
+        spec, match = _Router(specs).match(path)
+        result = (spec, match.groups()) if spec is not None else None
+        self.assertEqual(result, expected)
+
+    def test_first_match(self):
+        specs = [url("/(.*)/edit", RequestHandler),
+                 url("/article/edit", RequestHandler),
+                 url("/article/(?P<id>[0-9]+)", RequestHandler),
+                 url("/article/1", RequestHandler),
+                 url("/article/", RequestHandler),
+                 url("/(?i)ARTICLE/([a-z]+)", RequestHandler),
+                 url(r"/(\w+)/\1", RequestHandler),
+                 url("/[]/]article", RequestHandler),
+                 url("/.*", RequestHandler)]
+        for path in ["/article/edit", "/article/1", "/article/12",
+                     "/article/", "/article/abc", "/Article/abc",
+                     "/x/x", "/]article", "/", "/article/1\n", ""]:
+            self.assert_matches(specs, path)
+            self.assert_matches(specs[::-1], path)
+
+    def test_many_routes(self):
+        # more routes than fit in a single alternation
+        specs = [url("/api/(%d)/([a-z]+)" % i, RequestHandler)
+                 for i in range(200)]
+        specs.append(url("/api/([0-9]+)/([a-z0-9]+)", RequestHandler))
+        for path in ["/api/0/a", "/api/150/b", "/api/199/c1", "/api/200/d"]:
+            self.assert_matches(specs, path)
+
+    def test_cache(self):
+        router = _Router([url("/(.*)", RequestHandler)])
+        spec, match = router.match("/foo")
+        self.assertTrue(router.match("/foo")[1] is match)
+        router.CACHE_SIZE = 1
+        router.match("/bar")
+        self.assertEqual(router.match("/foo")[1].groups(), ("foo",))
+        self.assertEqual(len(router._cache), 1)
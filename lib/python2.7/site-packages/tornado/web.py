@@ -55,6 +55,7 @@ import Cookie
 import base64
 import binascii
 import calendar
+import collections
 import datetime
 import email.utils
 import functools
@@ -67,6 +68,8 @@ import logging
 import mimetypes
 import os.path
 import re
+import sre_constants
+import sre_parse
 import stat
 import sys
 import time
@@ -79,6 +82,7 @@ import uuid
 
 from tornado import escape
 from tornado import locale
+from tornado import process
 from tornado import stack_context
 from tornado import template
 from tornado.escape import utf8, _unicode
@@ -566,6 +570,8 @@ class RequestHandler(object):
             # autoescape=None means "no escaping", so we have to be sure
             # to only pass this kwarg if the user asked for it.
             kwargs["autoescape"] = settings["autoescape"]
+        if "template_bytecode_cache" in settings:
+            kwargs["bytecode_cache"] = settings["template_bytecode_cache"]
         return template.Loader(template_path, **kwargs)
 
 
@@ -1143,6 +1149,7 @@ class Application(object):
             self.transforms = transforms
         self.handlers = []
         self.named_handlers = {}
+        self._routers = {}  # id(host handlers) -> _Router
         self.default_host = default_host
         self.settings = settings
         self.ui_modules = {'linkify': _linkify,
@@ -1212,6 +1219,7 @@ class Application(object):
             self.handlers.insert(-1, (re.compile(host_pattern), handlers))
         else:
             self.handlers.append((re.compile(host_pattern), handlers))
+        self._routers = {}
 
         for spec in host_handlers:
             if type(spec) is type(()):
@@ -1253,6 +1261,12 @@ class Application(object):
                     return handlers
         return None
 
+    def _get_router(self, handlers):
+        router = self._routers.get(id(handlers))
+        if router is None or router.size != len(handlers):
+            router = self._routers[id(handlers)] = _Router(handlers)
+        return router
+
     def _load_ui_methods(self, methods):
         if type(methods) is types.ModuleType:
             self._load_ui_methods(dict((n, getattr(methods, n))
@@ -1291,39 +1305,37 @@ class Application(object):
             handler = RedirectHandler(
                 self, request, url="http://" + self.default_host + "/")
         else:
-            for spec in handlers:
-                match = spec.regex.match(request.path)
-                if match:
-                    handler = spec.handler_class(self, request, **spec.kwargs)
-                    if spec.regex.groups:
-                        # None-safe wrapper around url_unescape to handle
-                        # unmatched optional groups correctly
-                        def unquote(s):
-                            if s is None: return s
-                            return escape.url_unescape(s, encoding=None)
-                        # Pass matched groups to the handler.  Since
-                        # match.groups() includes both named and unnamed groups,
-                        # we want to use either groups or groupdict but not both.
-                        # Note that args are passed as bytes so the handler can
-                        # decide what encoding to use.
-
-                        if spec.regex.groupindex:
-                            kwargs = dict(
-                                (k, unquote(v))
-                                for (k, v) in match.groupdict().iteritems())
-                        else:
-                            args = [unquote(s) for s in match.groups()]
-                    break
+            spec, match = self._get_router(handlers).match(request.path)
+            if spec is not None:
+                handler = spec.handler_class(self, request, **spec.kwargs)
+                if spec.regex.groups:
+                    # None-safe wrapper around url_unescape to handle
+                    # unmatched optional groups correctly
+                    def unquote(s):
+                        if s is None: return s
+                        return escape.url_unescape(s, encoding=None)
+                    # Pass matched groups to the handler.  Since
+                    # match.groups() includes both named and unnamed groups,
+                    # we want to use either groups or groupdict but not both.
+                    # Note that args are passed as bytes so the handler can
+                    # decide what encoding to use.
+
+                    if spec.regex.groupindex:
+                        kwargs = dict(
+                            (k, unquote(v))
+                            for (k, v) in match.groupdict().iteritems())
+                    else:
+                        args = [unquote(s) for s in match.groups()]
             if not handler:
                 handler = ErrorHandler(self, request, status_code=404)
 
-        # In debug mode, re-compile templates and reload static files on every
-        # request so you don't need to restart to see changes
+        # In debug mode, re-compile templates on every request so you don't
+        # need to restart to see changes (static files are checked for
+        # modifications by StaticFileHandler)
         if self.settings.get("debug"):
             if getattr(RequestHandler, "_templates", None):
                 for loader in RequestHandler._templates.values():
                     loader.reset()
-            RequestHandler._static_hashes = {}
 
         handler._execute(transforms, *args, **kwargs)
         return handler
@@ -1344,7 +1356,14 @@ class Application(object):
         this behavior either subclass Application and override this method,
         or pass a function in the application settings dictionary as
         'log_function'.
+
+        In processes started by `tornado.process.fork_processes` with a
+        ``stats_port``, the request is also counted in the shared
+        worker statistics.
         """
+        stats = process.worker_stats()
+        if stats is not None:
+            stats.record(handler.get_status(), handler.request.request_time())
         if "log_function" in self.settings:
             self.settings["log_function"](handler)
             return
@@ -1420,10 +1439,22 @@ class StaticFileHandler(RequestHandler):
     want browsers to cache a file indefinitely, send them to, e.g.,
     /static/images/myimage.png?v=xxx. Override ``get_cache_time`` method for
     more fine-grained cache control.
+
+    File metadata is cached and revalidated with a single ``stat`` per
+    request.  Files up to ``CACHE_MAX_FILE_SIZE`` bytes are kept in a
+    memory cache of ``CACHE_MAX_SIZE`` bytes, the least recently used
+    files being evicted first; larger files are streamed in chunks of
+    ``STREAM_CHUNK_SIZE`` bytes.  Single byte ranges (``Range`` header)
+    are supported, and if a ``.gz`` file exists next to the requested
+    file, it is sent to clients accepting the gzip content encoding.
     """
     CACHE_MAX_AGE = 86400*365*10 #10 years
+    CACHE_MAX_FILE_SIZE = 128 * 1024
+    CACHE_MAX_SIZE = 16 * 1024 * 1024
+    STREAM_CHUNK_SIZE = 64 * 1024
 
     _static_hashes = {}
+    _file_info = {}
 
     def initialize(self, path, default_filename=None):
         self.root = os.path.abspath(path) + os.path.sep
@@ -1440,7 +1471,9 @@ class StaticFileHandler(RequestHandler):
         # it needs to be temporarily added back for requests to root/
         if not (abspath + os.path.sep).startswith(self.root):
             raise HTTPError(403, "%s is not in root static directory", path)
-        if os.path.isdir(abspath) and self.default_filename is not None:
+        stat_result = _stat(abspath)
+        if stat_result is not None and stat.S_ISDIR(stat_result.st_mode) \
+                and self.default_filename is not None:
             # need to look at the request.path here for when path is empty
             # but there is some prefix to the path that was already
             # trimmed by the routing
@@ -1448,17 +1481,16 @@ class StaticFileHandler(RequestHandler):
                 self.redirect(self.request.path + "/")
                 return
             abspath = os.path.join(abspath, self.default_filename)
-        if not os.path.exists(abspath):
+            stat_result = _stat(abspath)
+        if stat_result is None:
             raise HTTPError(404)
-        if not os.path.isfile(abspath):
+        if not stat.S_ISREG(stat_result.st_mode):
             raise HTTPError(403, "%s is not a file", path)
 
-        stat_result = os.stat(abspath)
-        modified = datetime.datetime.fromtimestamp(stat_result[stat.ST_MTIME])
-
+        info = self._get_file_info(abspath, stat_result)
+        modified = info["modified"]
+        mime_type = info["mime_type"]
         self.set_header("Last-Modified", modified)
-
-        mime_type, encoding = mimetypes.guess_type(abspath)
         if mime_type:
             self.set_header("Content-Type", mime_type)
 
@@ -1473,23 +1505,117 @@ class StaticFileHandler(RequestHandler):
 
         self.set_extra_headers(path)
 
-        # Check the If-Modified-Since, and don't send the result if the
-        # content has not been modified
+        # Send the precompressed variant if there is one, unless a
+        # range of the uncompressed file is requested
+        range_header = self.request.headers.get("Range")
+        gzip_result = _stat(abspath + ".gz")
+        if gzip_result is not None and stat.S_ISREG(gzip_result.st_mode):
+            self.set_header("Vary", "Accept-Encoding")
+            if range_header is None and \
+                    "gzip" in self.request.headers.get("Accept-Encoding", ""):
+                abspath += ".gz"
+                info = self._get_file_info(abspath, gzip_result)
+                self.set_header("Content-Encoding", "gzip")
+        self.set_header("Etag", info["etag"])
+        self.set_header("Accept-Ranges", "bytes")
+
+        # Check the If-None-Match and If-Modified-Since headers, and
+        # don't send the result if the content has not been modified
+        inm_value = self.request.headers.get("If-None-Match")
+        if inm_value is not None:
+            if inm_value.strip() == "*" or info["etag"] in inm_value:
+                self.set_status(304)
+                return
         ims_value = self.request.headers.get("If-Modified-Since")
-        if ims_value is not None:
+        if inm_value is None and ims_value is not None:
             date_tuple = email.utils.parsedate(ims_value)
             if_since = datetime.datetime.fromtimestamp(time.mktime(date_tuple))
             if if_since >= modified:
                 self.set_status(304)
                 return
 
+        size = info["size"]
+        start, end = 0, size
+        if_range = self.request.headers.get("If-Range")
+        if range_header is not None and \
+                if_range in (None, info["etag"], self._headers["Last-Modified"]):
+            byte_range = _parse_byte_range(range_header, size)
+            if byte_range is not None:
+                start, end = byte_range
+                if start >= end:
+                    self.set_status(416)
+                    self.set_header("Content-Range", "bytes */%d" % size)
+                    return
+                self.set_status(206)
+                self.set_header("Content-Range",
+                                "bytes %d-%d/%d" % (start, end - 1, size))
+        self.set_header("Content-Length", end - start)
+
         if not include_body:
             return
+        if size <= self.CACHE_MAX_FILE_SIZE:
+            content = self._get_content(abspath, info)
+            if end - start < size:
+                content = content[start:end]
+            self.write(content)
+            return
         file = open(abspath, "rb")
+        file.seek(start)
+        if self.application._wsgi:
+            try:
+                self.write(file.read(end - start))
+            finally:
+                file.close()
+            return
+        self._auto_finish = False
+        self._send_file_chunk(file, end - start)
+
+    def _send_file_chunk(self, file, remaining):
         try:
-            self.write(file.read())
-        finally:
+            chunk = file.read(min(self.STREAM_CHUNK_SIZE, remaining))
+        except Exception:
+            file.close()
+            raise
+        remaining -= len(chunk)
+        if remaining <= 0 or not chunk:
             file.close()
+            self.finish(chunk)
+        else:
+            self.write(chunk)
+            self.flush(callback=self.async_callback(
+                    self._send_file_chunk, file, remaining))
+
+    @classmethod
+    def _get_file_info(cls, abspath, stat_result):
+        """Returns the metadata of a file, cached until it is modified."""
+        info = cls._file_info.get(abspath)
+        mtime = stat_result[stat.ST_MTIME]
+        if info is None or info["mtime"] != mtime or \
+                info["size"] != stat_result.st_size:
+            mime_type, encoding = mimetypes.guess_type(abspath)
+            info = cls._file_info[abspath] = dict(
+                mtime=mtime, size=stat_result.st_size,
+                modified=datetime.datetime.fromtimestamp(mtime),
+                mime_type=mime_type,
+                etag='"%x-%x"' % (mtime, stat_result.st_size))
+        return info
+
+    @classmethod
+    def _get_content(cls, abspath, info):
+        """Returns the content of a small file from the memory cache."""
+        cache = cls.__dict__.get("_content_cache")
+        if cache is None:
+            cache = cls._content_cache = _LRUByteCache(cls.CACHE_MAX_SIZE)
+        version = (info["mtime"], info["size"])
+        content = cache.get(abspath, version)
+        if content is None:
+            file = open(abspath, "rb")
+            try:
+                content = file.read()
+            finally:
+                file.close()
+            cache.put(abspath, version, content)
+        return content
 
     def set_extra_headers(self, path):
         """For subclass to add extra headers to the response"""
@@ -1516,20 +1642,33 @@ class StaticFileHandler(RequestHandler):
         ``settings`` is the `Application.settings` dictionary.  ``path``
         is the static path being requested.  The url returned should be
         relative to the current host.
+
+        The version hash is computed once per file, or again whenever
+        the file is modified in debug mode.
         """
         hashes = cls._static_hashes
         abs_path = os.path.join(settings["static_path"], path)
-        if abs_path not in hashes:
+        version = None
+        if settings.get("debug"):
+            stat_result = _stat(abs_path)
+            if stat_result is not None:
+                version = (stat_result[stat.ST_MTIME], stat_result.st_size)
+        if abs_path not in hashes or hashes[abs_path][0] != version:
             try:
                 f = open(abs_path, "rb")
-                hashes[abs_path] = hashlib.md5(f.read()).hexdigest()
-                f.close()
+                try:
+                    md5 = hashlib.md5()
+                    for block in iter(lambda: f.read(65536), b("")):
+                        md5.update(block)
+                    hashes[abs_path] = (version, md5.hexdigest())
+                finally:
+                    f.close()
             except Exception:
                 logging.error("Could not open static file %r", path)
-                hashes[abs_path] = None
+                hashes[abs_path] = (version, None)
         static_url_prefix = settings.get('static_url_prefix', '/static/')
-        if hashes.get(abs_path):
-            return static_url_prefix + path + "?v=" + hashes[abs_path][:5]
+        if hashes[abs_path][1]:
+            return static_url_prefix + path + "?v=" + hashes[abs_path][1][:5]
         else:
             return static_url_prefix + path
 
@@ -1595,7 +1734,8 @@ class GZipContentEncoding(OutputTransform):
             self._gzipping = (ctype in self.CONTENT_TYPES) and \
                 (not finishing or len(chunk) >= self.MIN_LENGTH) and \
                 (finishing or "Content-Length" not in headers) and \
-                ("Content-Encoding" not in headers)
+                ("Content-Encoding" not in headers) and \
+                ("Content-Range" not in headers)
         if self._gzipping:
             headers["Content-Encoding"] = "gzip"
             self._gzip_value = BytesIO()
@@ -1861,6 +2001,290 @@ class URLSpec(object):
 url = URLSpec
 
 
+class _RouteNode(object):
+    """A node of the `_Router` trie, for one literal path prefix."""
+    __slots__ = ["children", "indexes", "literals", "first_dynamic",
+                 "matcher"]
+
+    def __init__(self, parent=None):
+        self.children = {}
+        # indexes of the specs with a literal prefix ending at this
+        # node or at one of its ancestors, and of the fully literal
+        # specs ending at this node
+        self.indexes = list(parent.indexes) if parent else []
+        self.literals = []
+        self.first_dynamic = parent.first_dynamic if parent else sys.maxint
+        self.matcher = None
+
+
+class _Router(object):
+    """Finds the first `URLSpec` of a host matching a request path.
+
+    This is equivalent to trying ``spec.regex.match(path)`` on each
+    spec in order, without matching every regex on every request:
+
+    * Specs are indexed in a trie by the complete path segments of
+      their literal prefix, so only the specs whose prefix matches the
+      path are candidates.
+    * Fully literal patterns (e.g. ``/about``) are found with a dict
+      lookup, unless a dynamic spec listed before them may also match.
+    * The candidates of a trie node are matched with a single regex,
+      the alternation of their patterns, which tells which spec matched
+      first.  The groups of the winner are then extracted with its
+      own regex.
+    * The results of the last `CACHE_SIZE` distinct paths are cached.
+    """
+    CACHE_SIZE = 1000
+    # Python 2 regexes are limited to 100 groups, and the alternation
+    # uses one group per spec
+    MAX_ALTERNATION = 90
+
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.size = len(self.specs)
+        self._exact = {}  # literal path -> index of the first spec
+        self._root = _RouteNode()
+        self._cache = {}
+        nodes = [(self._root, [])]
+        for index, spec in enumerate(self.specs):
+            literal, exact = _literal_prefix(spec.regex)
+            if exact:
+                self._exact.setdefault(literal, index)
+            segments = literal.split("/")[:-1]
+            node = self._root
+            for depth, segment in enumerate(segments):
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _RouteNode(node)
+                    nodes.append((child, segments[:depth + 1]))
+                node = child
+            if exact:
+                node.literals.append(index)
+                continue
+            for node, path in nodes:
+                # specs are added to a node and all its descendants
+                if path[:len(segments)] == segments:
+                    node.indexes.append(index)
+                    node.first_dynamic = min(node.first_dynamic, index)
+
+    def match(self, path):
+        """Returns ``(spec, match)`` for the first spec matching path.
+
+        Returns ``(None, None)`` if no spec matches.
+        """
+        result = self._cache.get(path)
+        if result is None:
+            result = self._match(path)
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[path] = result
+        return result
+
+    def _match(self, path):
+        node = self._root
+        for segment in path.split("/")[:-1]:
+            child = node.children.get(segment)
+            if child is None:
+                break
+            node = child
+        index = self._exact.get(path)
+        if index is not None and index < node.first_dynamic:
+            spec = self.specs[index]
+            return spec, spec.regex.match(path)
+        if node.matcher is None:
+            node.matcher = self._build_matcher(
+                sorted(node.indexes + node.literals))
+        for regex, index, indexes in node.matcher:
+            match = regex.match(path)
+            if match:
+                if indexes is not None:
+                    # alternation: find the spec from its marker group
+                    index = indexes[match.lastindex - 1]
+                    match = self.specs[index].regex.match(path)
+                return self.specs[index], match
+        return None, None
+
+    def _build_matcher(self, indexes):
+        """Returns a list of ``(regex, index, indexes)`` tuples.
+
+        Each regex is either the alternation of the specs listed in
+        ``indexes`` (and ``index`` is None), or the regex of the spec
+        ``index`` alone when it can not be part of an alternation.
+        """
+        matcher = []
+        alternatives = []
+        def flush():
+            if alternatives:
+                pattern = "|".join("(?:%s)()" % p for i, p in alternatives)
+                matcher.append((re.compile(pattern), None,
+                                [i for i, p in alternatives]))
+                del alternatives[:]
+        for index in indexes:
+            pattern = _noncapturing(self.specs[index].regex)
+            if pattern is None:
+                flush()
+                matcher.append((self.specs[index].regex, index, None))
+            else:
+                alternatives.append((index, pattern))
+                if len(alternatives) >= self.MAX_ALTERNATION:
+                    flush()
+        flush()
+        return matcher
+
+
+def _literal_prefix(regex):
+    """Returns ``(prefix, exact)`` for a compiled url regex.
+
+    ``prefix`` is the literal string any match starts with, and
+    ``exact`` is true if the regex only matches this string.
+    """
+    if regex.flags & ~re.UNICODE:
+        return "", False
+    items = list(sre_parse.parse(regex.pattern, regex.flags))
+    if items and items[0] == (sre_constants.AT, sre_constants.AT_BEGINNING):
+        items.pop(0)
+    prefix = []
+    for op, av in items:
+        if op != sre_constants.LITERAL or av > 127:
+            break
+        prefix.append(chr(av))
+    exact = (len(prefix) == len(items) - 1 and
+             items[-1] == (sre_constants.AT, sre_constants.AT_END))
+    return "".join(prefix), exact
+
+
+def _noncapturing(regex):
+    """Returns the pattern of a url regex with non-capturing groups.
+
+    Returns None if the regex can not be rewritten this way because it
+    uses flags or group references.
+    """
+    pattern = regex.pattern
+    if regex.flags & ~re.UNICODE or "(?P=" in pattern or "(?(" in pattern \
+            or re.search(r"\\[1-9]", pattern):
+        return None
+    pieces = []
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            pieces.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            # a "]" right after "[" or "[^" is a literal
+            start = i
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            pieces.append(pattern[start:i])
+            in_class = True
+            continue
+        elif c == "(":
+            if pattern.startswith("(?P<", i):
+                pieces.append("(?:")
+                i = pattern.index(">", i) + 1
+                continue
+            if not pattern.startswith("(?", i):
+                pieces.append("(?:")
+                i += 1
+                continue
+        pieces.append(c)
+        i += 1
+    pattern = "".join(pieces)
+    try:
+        if re.compile(pattern).groups:
+            return None
+    except re.error:
+        return None
+    return pattern
+
+
+def _stat(path):
+    """Returns the result of os.stat, or None if path does not exist."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _parse_byte_range(header, size):
+    """Parses a ``Range`` header for a file of the given size.
+
+    Returns ``(start, end)``, end being exclusive, or None if the
+    header is invalid or requests several ranges, in which case it
+    should be ignored.  An unsatisfiable range has ``start >= end``.
+
+    >>> _parse_byte_range("bytes=0-499", 1000)
+    (0, 500)
+    >>> _parse_byte_range("bytes=500-", 1000)
+    (500, 1000)
+    >>> _parse_byte_range("bytes=-100", 1000)
+    (900, 1000)
+    >>> _parse_byte_range("bytes=900-1999", 1000)
+    (900, 1000)
+    >>> _parse_byte_range("bytes=1000-", 1000)
+    (1000, 1000)
+    >>> _parse_byte_range("bytes=0-1,5-6", 1000) is None
+    True
+    """
+    unit, _, value = header.partition("=")
+    if unit.strip() != "bytes" or "," in value:
+        return None
+    first, sep, last = value.strip().partition("-")
+    try:
+        if not first:
+            # suffix range: the last bytes of the file
+            return (max(size - int(last), 0), size)
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if not sep or (last and end <= start):
+        return None
+    return (start, min(end, size))
+
+
+class _LRUByteCache(object):
+    """A least recently used cache of file contents.
+
+    Entries are versioned (e.g. by file modification time), and the
+    total size of the cached contents is limited to max_size bytes.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, version):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            self.size -= len(entry[1])
+            return None
+        self._entries[key] = entry
+        return entry[1]
+
+    def put(self, key, version, content):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        if len(content) > self.max_size:
+            return
+        self._entries[key] = (version, content)
+        self.size += len(content)
+        while self.size > self.max_size:
+            key, entry = self._entries.popitem(last=False)
+            self.size -= len(entry[1])
+
+
 def _time_independent_equals(a, b):
     if len(a) != len(b):
         return False
@@ -1911,3 +2335,7 @@ def _create_signature(secret, *parts):
     hash = hmac.new(utf8(secret), digestmod=hashlib.sha1)
     for part in parts: hash.update(utf8(part))
     return utf8(hash.hexdigest())
+
+def doctests():
+    import doctest
+    return doctest.DocTestSuite()
@@ -100,6 +100,135 @@ def safe_load_all(stream):
     """
     return load_all(stream, SafeLoader)
 
+def load_stream(stream, path=None, Loader=Loader, chunk_size=65536):
+    """
+    Parse all YAML documents in a stream read in chunks
+    and produce corresponding Python objects one at a time.
+    If `path` is given, produce (path, object) pairs for the nodes
+    at `path` in each document instead, the other nodes are skipped.
+    """
+    loader = Loader(stream)
+    loader.chunk_size = chunk_size
+    try:
+        if path is None:
+            while loader.check_data():
+                yield loader.get_data()
+        else:
+            while loader.check_node():
+                for node_path, node in loader.get_path_nodes(path):
+                    data = loader.construct_document(node)
+                    # Release the node graph before the object is used.
+                    node = None
+                    yield node_path, data
+    finally:
+        loader.dispose()
+
+def safe_load_stream(stream, path=None, chunk_size=65536):
+    """
+    Parse all YAML documents in a stream read in chunks
+    and produce corresponding Python objects one at a time.
+    If `path` is given, produce (path, object) pairs for the nodes
+    at `path` in each document instead, the other nodes are skipped.
+    Resolve only basic YAML tags.
+    """
+    return load_stream(stream, path, SafeLoader, chunk_size)
+
+# Cached documents: {key: (digest, pickled document)}.
+_safe_load_cache = {}
+_safe_load_cache_size = 64
+
+def safe_load_cached(stream, cache_dir=None):
+    """
+    Parse the first YAML document in a stream
+    and produce the corresponding Python object.
+    Resolve only basic YAML tags.
+    The document is cached by the hash of the stream content,
+    in memory and in `cache_dir` if given, so loading unchanged
+    content again returns a fresh copy without parsing it.
+    """
+    import os, hashlib
+    name = None
+    if hasattr(stream, 'read'):
+        name = getattr(stream, 'name', None)
+        stream = stream.read()
+    content = stream
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    digest = hashlib.sha1(__version__+'\0'+content).hexdigest()
+    # A file keeps a single entry, replaced when its content changes.
+    if isinstance(name, basestring):
+        key = hashlib.sha1(repr(os.path.abspath(name))).hexdigest()
+    else:
+        key = digest
+    entry = _safe_load_cache.get(key)
+    if entry is not None and entry[0] == digest:
+        return _safe_load_unpickle(entry[1])
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, key+'.cache')
+        try:
+            cache_file = open(path, 'rb')
+            try:
+                if cache_file.read(41) == digest+'\n':
+                    payload = cache_file.read()
+                    data = _safe_load_unpickle(payload)
+                    _safe_load_store(key, digest, payload)
+                    return data
+            finally:
+                cache_file.close()
+        except Exception:
+            # Missing or broken cache file, parse the stream again.
+            pass
+    data = safe_load(stream)
+    import cPickle
+    try:
+        payload = cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+        # Documents built by custom constructors are not cached.
+        _safe_load_unpickle(payload)
+    except (cPickle.PicklingError, cPickle.UnpicklingError, TypeError):
+        return data
+    _safe_load_store(key, digest, payload)
+    if path is not None:
+        import tempfile
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            cache_file = os.fdopen(fd, 'wb')
+            try:
+                cache_file.write(digest+'\n'+payload)
+            finally:
+                cache_file.close()
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    return data
+
+def _safe_load_store(key, digest, payload):
+    if key not in _safe_load_cache \
+            and len(_safe_load_cache) >= _safe_load_cache_size:
+        _safe_load_cache.clear()
+    _safe_load_cache[key] = (digest, payload)
+
+def _safe_load_unpickle(payload):
+    # Only the types produced by SafeConstructor may be unpickled, so that
+    # a tampered cache file cannot run code.
+    import cPickle, cStringIO, datetime
+    allowed = {
+        ('__builtin__', 'set'): set,
+        ('datetime', 'date'): datetime.date,
+        ('datetime', 'datetime'): datetime.datetime,
+    }
+    def find_global(module, name):
+        try:
+            return allowed[module, name]
+        except KeyError:
+            raise cPickle.UnpicklingError("%s.%s is not allowed"
+                    % (module, name))
+    unpickler = cPickle.Unpickler(cStringIO.StringIO(payload))
+    unpickler.find_global = find_global
+    return unpickler.load()
+
 def emit(events, stream=None, Dumper=Dumper,
         canonical=None, indent=None, width=None,
         allow_unicode=None, line_break=None):
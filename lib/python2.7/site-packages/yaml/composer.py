@@ -60,6 +60,109 @@ class Composer(object):
         self.anchors = {}
         return node
 
+    def get_path_nodes(self, path):
+        # Compose the nodes at `path` in the next document and generate them
+        # as (path, node) pairs.  `path` is a sequence of mapping keys
+        # (compared with the key scalars), sequence indexes, or None that
+        # matches any key or index.  The events of other nodes are dropped
+        # without composing them, so merge keys (`<<`) are not expanded in
+        # the mappings on the way to `path`.
+
+        # Drop the DOCUMENT-START event.
+        self.get_event()
+
+        for item in self.compose_path_nodes(tuple(path), ()):
+            yield item
+
+        # Drop the DOCUMENT-END event.
+        self.get_event()
+
+        self.anchors = {}
+
+    def compose_path_nodes(self, path, current):
+        event = self.peek_event()
+        if len(current) == len(path):
+            # The selected node is composed as a root node.
+            yield current, self.compose_node(None, None)
+        elif isinstance(event, AliasEvent) or event.anchor is not None:
+            # Anchored nodes are needed by the aliases that may follow.
+            node = self.compose_node(None, None)
+            for item in self.select_path_nodes(node, path, current):
+                yield item
+        elif isinstance(event, SequenceStartEvent):
+            self.get_event()
+            check = path[len(current)]
+            index = 0
+            while not self.check_event(SequenceEndEvent):
+                if check is None or check == index:
+                    for item in self.compose_path_nodes(path,
+                            current+(index,)):
+                        yield item
+                else:
+                    self.skip_node()
+                index += 1
+            self.get_event()
+        elif isinstance(event, MappingStartEvent):
+            self.get_event()
+            check = path[len(current)]
+            while not self.check_event(MappingEndEvent):
+                key_event = self.peek_event()
+                if isinstance(key_event, ScalarEvent)  \
+                        and key_event.anchor is None:
+                    self.get_event()
+                    key = key_event.value
+                else:
+                    key_node = self.compose_node(None, None)
+                    key = None
+                    if isinstance(key_node, ScalarNode):
+                        key = key_node.value
+                if key is not None and (check is None or check == key):
+                    for item in self.compose_path_nodes(path, current+(key,)):
+                        yield item
+                else:
+                    self.skip_node()
+            self.get_event()
+        else:
+            self.skip_node()
+
+    def select_path_nodes(self, node, path, current):
+        # Same as `compose_path_nodes` for an already composed node.
+        if len(current) == len(path):
+            yield current, node
+            return
+        check = path[len(current)]
+        if isinstance(node, SequenceNode):
+            for index, item_node in enumerate(node.value):
+                if check is None or check == index:
+                    for item in self.select_path_nodes(item_node, path,
+                            current+(index,)):
+                        yield item
+        elif isinstance(node, MappingNode):
+            for key_node, value_node in node.value:
+                if isinstance(key_node, ScalarNode)   \
+                        and (check is None or check == key_node.value):
+                    for item in self.select_path_nodes(value_node, path,
+                            current+(key_node.value,)):
+                        yield item
+
+    def skip_node(self):
+        # Drop the events of the next node.  Nodes with an anchor are
+        # composed anyway since aliases may refer to them.
+        depth = 0
+        while True:
+            event = self.peek_event()
+            if not isinstance(event, AliasEvent)    \
+                    and getattr(event, 'anchor', None) is not None:
+                self.compose_node(None, None)
+            else:
+                self.get_event()
+                if isinstance(event, CollectionStartEvent):
+                    depth += 1
+                elif isinstance(event, CollectionEndEvent):
+                    depth -= 1
+            if not depth:
+                break
+
     def compose_node(self, parent, index):
         if self.check_event(AliasEvent):
             event = self.get_event()
@@ -12,6 +12,8 @@
 # Reader provides the following methods and attributes:
 #   reader.peek(length=1) - return the next `length` characters
 #   reader.forward(length=1) - move the current position to `length` characters.
+#   reader.match(regex) - return the length of the `regex` match at the current
+#       position.
 #   reader.index - the number of the current character.
 #   reader.line, stream.column - the line and the column of the current character.
 
@@ -96,9 +98,27 @@ class Reader(object):
             self.update(length)
         return self.buffer[self.pointer:self.pointer+length]
 
+    def match(self, regex, lookahead=1):
+        # The buffer is extended until `lookahead` characters following the
+        # match are available, so the regex sees the same characters `peek`
+        # would.  `regex` must match at any position (e.g. `[^...]*`).
+        while True:
+            end = regex.match(self.buffer, self.pointer).end()
+            if self.raw_buffer is None or end+lookahead < len(self.buffer):
+                return end-self.pointer
+            self.update(end-self.pointer+lookahead+1)
+
+    NON_COLUMN = re.compile(u'[\r\n\x85\u2028\u2029\uFEFF]')
     def forward(self, length=1):
         if self.pointer+length+1 >= len(self.buffer):
             self.update(length+1)
+        end = self.pointer+length
+        if self.NON_COLUMN.search(self.buffer, self.pointer, end) is None:
+            # No line breaks, only the column changes.
+            self.pointer = end
+            self.index += length
+            self.column += length
+            return
         while length:
             ch = self.buffer[self.pointer]
             self.pointer += 1
@@ -174,7 +194,12 @@ class Reader(object):
                 self.raw_buffer = None
                 break
 
-    def update_raw(self, size=1024):
+    # The size of the chunks read from a file-like object.
+    chunk_size = 1024
+
+    def update_raw(self, size=None):
+        if size is None:
+            size = self.chunk_size
         data = self.stream.read(size)
         if data:
             self.raw_buffer += data
@@ -29,6 +29,8 @@ __all__ = ['Scanner', 'ScannerError']
 from error import MarkedYAMLError
 from tokens import *
 
+import re
+
 class ScannerError(MarkedYAMLError):
     pass
 
@@ -144,12 +146,17 @@ class Scanner(object):
             return False
         if not self.tokens:
             return True
+        if not self.possible_simple_keys:
+            return False
         # The current token may be a potential simple key, so we
         # need to look further.
         self.stale_possible_simple_keys()
         if self.next_possible_simple_key() == self.tokens_taken:
             return True
 
+    # Characters that start a token other than a plain scalar, or may do so.
+    INDICATORS = u'\0%-.[]{},?:*&!|>\'\"'
+
     def fetch_more_tokens(self):
 
         # Eat whitespaces and comments until we reach the next token.
@@ -169,6 +176,11 @@ class Scanner(object):
         if ch == u'\0':
             return self.fetch_stream_end()
 
+        # Plain scalars are the most common tokens, so check for them before
+        # going through the indicators.
+        if ch not in self.INDICATORS and self.check_plain():
+            return self.fetch_plain()
+
         # Is it a directive?
         if ch == u'%' and self.check_directive():
             return self.fetch_directive()
@@ -750,6 +762,13 @@ class Scanner(object):
 
     # Scanners.
 
+    # Runs of characters that are scanned in bulk.
+    SPACES = re.compile(u' *')
+    COMMENT = re.compile(u'[^\0\r\n\x85\u2028\u2029]*')
+    PLAIN_BLOCK = re.compile(u'(?:[^\0 \t\r\n\x85\u2028\u2029:]'
+            u'|:(?=[^\0 \t\r\n\x85\u2028\u2029]))*')
+    PLAIN_FLOW = re.compile(u'[^\0 \t\r\n\x85\u2028\u2029,:?\\[\\]{}]*')
+
     def scan_to_next_token(self):
         # We ignore spaces, line breaks and comments.
         # If we find a line break in the block context, we set the flag
@@ -774,11 +793,11 @@ class Scanner(object):
             self.forward()
         found = False
         while not found:
-            while self.peek() == u' ':
-                self.forward()
+            length = self.match(self.SPACES)
+            if length:
+                self.forward(length)
             if self.peek() == u'#':
-                while self.peek() not in u'\0\r\n\x85\u2028\u2029':
-                    self.forward()
+                self.forward(self.match(self.COMMENT))
             if self.scan_line_break():
                 if not self.flow_level:
                     self.allow_simple_key = True
@@ -1288,18 +1307,17 @@ class Scanner(object):
         #if indent == 0:
         #    indent = 1
         spaces = []
+        if self.flow_level:
+            plain = self.PLAIN_FLOW
+        else:
+            plain = self.PLAIN_BLOCK
         while True:
-            length = 0
             if self.peek() == u'#':
                 break
-            while True:
-                ch = self.peek(length)
-                if ch in u'\0 \t\r\n\x85\u2028\u2029'   \
-                        or (not self.flow_level and ch == u':' and
-                                self.peek(length+1) in u'\0 \t\r\n\x85\u2028\u2029') \
-                        or (self.flow_level and ch in u',:?[]{}'):
-                    break
-                length += 1
+            # The chunk ends with a space or a line break, with ': ' in the
+            # block context, or with a flow indicator in the flow context.
+            length = self.match(plain)
+            ch = self.peek(length)
             # It's not clear what we should do with ':' in the flow context.
             if (self.flow_level and ch == u':'
                     and self.peek(length+1) not in u'\0 \t\r\n\x85\u2028\u2029,[]{}'):
@@ -1325,9 +1343,7 @@ class Scanner(object):
         # The specification is really confusing about tabs in plain scalars.
         # We just forbid them completely. Do not use tabs in YAML!
         chunks = []
-        length = 0
-        while self.peek(length) in u' ':
-            length += 1
+        length = self.match(self.SPACES)
         whitespaces = self.prefix(length)
         self.forward(length)
         ch = self.peek()
@@ -1341,7 +1357,7 @@ class Scanner(object):
             breaks = []
             while self.peek() in u' \r\n\x85\u2028\u2029':
                 if self.peek() == ' ':
-                    self.forward()
+                    self.forward(self.match(self.SPACES))
                 else:
                     breaks.append(self.scan_line_break())
                     prefix = self.prefix(3)